@@ -0,0 +1,121 @@
+"""Per-user health context for chat prompts, cached between turns.
+
+The context is rendered once into compact grouped text (one line per
+biomarker series, medicine or log type rather than one JSON object per
+reading) and held in an in-process LRU keyed by user. Each entry remembers
+the user's data versions it was built from; any write to reports, logs or
+medicines bumps a version (services.version_service), so the next turn sees
+the mismatch and rebuilds.
+"""
+import os
+import threading
+from collections import OrderedDict
+from sqlalchemy.orm import Session
+from app.models.models import Biomarker, ManualLog, Medicine
+from app.services.version_service import get_data_versions
+
+CHAT_CONTEXT_CACHE_SIZE = int(os.getenv("CHAT_CONTEXT_CACHE_SIZE", "256"))
+CONTEXT_BIOMARKER_ROWS = 100
+CONTEXT_LOG_ROWS = 20
+
+
+def _num(value) -> str:
+    return f"{value:g}" if value is not None else "?"
+
+
+def _day(dt) -> str:
+    return dt.strftime("%Y-%m-%d") if dt else "?"
+
+
+def _flag(value, ref_min, ref_max) -> str:
+    if ref_min is not None and value < ref_min:
+        return " L"
+    if ref_max is not None and value > ref_max:
+        return " H"
+    return ""
+
+
+def format_health_context(biomarkers: list, medicines: list, logs: list) -> str:
+    """Render rows as grouped text. `biomarkers` and `logs` are expected latest first."""
+    lines = ["Biomarkers (name [unit, ref range]: date value, latest first; H/L = above/below range):"]
+    series = OrderedDict()
+    for b in biomarkers:
+        series.setdefault(b.name, []).append(b)
+    for name, rows in series.items():
+        head = rows[0]
+        ref = f"{_num(head.ref_min)}-{_num(head.ref_max)}" if head.ref_min is not None or head.ref_max is not None else "n/a"
+        points = "; ".join(f"{_day(b.recorded_at)} {_num(b.value)}{_flag(b.value, b.ref_min, b.ref_max)}" for b in rows)
+        lines.append(f"{name} [{head.unit or '-'}, {ref}]: {points}")
+    if not series:
+        lines.append("(none)")
+
+    lines.append("Medicines (drug | dosage | start - end):")
+    for m in medicines:
+        lines.append(f"{m.drug_name} | {m.dosage or '-'} | {m.start_date} - {m.end_date or 'ongoing'}")
+    if not medicines:
+        lines.append("(none)")
+
+    lines.append("Manual logs (type: date value, latest first):")
+    by_type = OrderedDict()
+    for log in logs:
+        reading = _num(log.value) + (f"/{_num(log.value2)}" if log.value2 is not None else "")
+        by_type.setdefault((log.log_type, log.unit), []).append(f"{_day(log.logged_at)} {reading}")
+    for (log_type, unit), readings in by_type.items():
+        lines.append(f"{log_type} [{unit or '-'}]: " + "; ".join(readings))
+    if not by_type:
+        lines.append("(none)")
+    return "\n".join(lines)
+
+
+def load_health_context(db: Session, user_id: int) -> str:
+    biomarkers = (
+        db.query(Biomarker)
+        .filter(Biomarker.user_id == user_id)
+        .order_by(Biomarker.recorded_at.desc(), Biomarker.id.desc())
+        .limit(CONTEXT_BIOMARKER_ROWS)
+        .all()
+    )
+    medicines = db.query(Medicine).filter(Medicine.user_id == user_id).order_by(Medicine.start_date.asc()).all()
+    logs = (
+        db.query(ManualLog)
+        .filter(ManualLog.user_id == user_id)
+        .order_by(ManualLog.logged_at.desc(), ManualLog.id.desc())
+        .limit(CONTEXT_LOG_ROWS)
+        .all()
+    )
+    return format_health_context(biomarkers, medicines, logs)
+
+
+class ContextCache:
+    def __init__(self, max_entries: int = CHAT_CONTEXT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # user_id -> (versions, context)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, db: Session, user_id: int) -> str:
+        versions = get_data_versions(db, user_id)
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] == versions:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        # Built outside the lock; the versions were read first, so a write
+        # racing with this build only makes the entry look stale, never fresh.
+        context = load_health_context(db, user_id)
+        with self._lock:
+            self._entries[user_id] = (versions, context)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return context
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "max_entries": self.max_entries, "hits": self.hits, "misses": self.misses}
+
+
+context_cache = ContextCache()
@@ -0,0 +1,184 @@
+import asyncio
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "./cache/llm_cache.sqlite3")
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+LLM_CACHE_MEMORY_ENTRIES = int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "256"))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_MB", "64")) * 1024 * 1024
+LLM_CACHE_BYPASS = os.getenv("LLM_CACHE_BYPASS", "").lower() in ("1", "true", "yes")
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace so layout-only differences share a cache entry."""
+    return _WHITESPACE.sub(" ", text or "").strip()
+
+
+def cache_key(model: str, template_version: str, normalized_input: str) -> str:
+    digest = hashlib.sha256()
+    for part in (model, template_version, normalized_input):
+        digest.update(part.encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class LLMCache:
+    """Two-tier cache for LLM responses: in-process LRU over a SQLite file.
+
+    Entries expire after `ttl` seconds. The disk tier is trimmed back to 90%
+    of `max_bytes`, least recently used first, whenever a write pushes it
+    over. Safe to share across threads. Async callers use aget()/aset(),
+    which answer memory hits on the event loop and run SQLite in a worker
+    thread; the memory tier has its own lock, so a slow disk read never
+    holds up a memory hit.
+    """
+
+    def __init__(self, path: str = LLM_CACHE_PATH, ttl: int = LLM_CACHE_TTL_SECONDS,
+                 memory_entries: int = LLM_CACHE_MEMORY_ENTRIES, max_bytes: int = LLM_CACHE_MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.memory_entries = memory_entries
+        self.max_bytes = max_bytes
+        self.memory = OrderedDict()  # key -> (value, created_at)
+        self.lock = threading.Lock()  # memory tier and counters
+        self.disk_lock = threading.Lock()  # SQLite connection and _disk_bytes; taken before `lock`
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0, "expired": 0, "evictions": 0}
+        self._conn = None
+        self._disk_bytes = 0
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_cache_accessed ON llm_cache (accessed_at)")
+            self._disk_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+        return self._conn
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        value = self._memory_get(key, now)
+        return value if value is not None else self._disk_get(key, now)
+
+    async def aget(self, key: str) -> Optional[str]:
+        now = time.time()
+        value = self._memory_get(key, now)
+        return value if value is not None else await asyncio.to_thread(self._disk_get, key, now)
+
+    def set(self, key: str, value: str):
+        now = time.time()
+        with self.lock:
+            self._remember(key, value, now)
+            self.counters["writes"] += 1
+        self._disk_set(key, value, now)
+
+    async def aset(self, key: str, value: str):
+        now = time.time()
+        with self.lock:
+            self._remember(key, value, now)
+            self.counters["writes"] += 1
+        await asyncio.to_thread(self._disk_set, key, value, now)
+
+    def _memory_get(self, key: str, now: float) -> Optional[str]:
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is None:
+                return None
+            value, created_at = entry
+            if now - created_at <= self.ttl:
+                self.memory.move_to_end(key)
+                self.counters["memory_hits"] += 1
+                return value
+            del self.memory[key]
+            return None
+
+    def _disk_get(self, key: str, now: float) -> Optional[str]:
+        with self.disk_lock:
+            db = self._db()
+            row = db.execute("SELECT value, size, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                with self.lock:
+                    self.counters["misses"] += 1
+                return None
+            value, size, created_at = row
+            if now - created_at > self.ttl:
+                db.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                db.commit()
+                self._disk_bytes -= size
+                with self.lock:
+                    self.counters["expired"] += 1
+                    self.counters["misses"] += 1
+                return None
+            db.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            db.commit()
+        with self.lock:
+            self._remember(key, value, created_at)
+            self.counters["disk_hits"] += 1
+        return value
+
+    def _disk_set(self, key: str, value: str, now: float):
+        size = len(value.encode())
+        with self.disk_lock:
+            db = self._db()
+            old = db.execute("SELECT size FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            db.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now),
+            )
+            self._disk_bytes += size - (old[0] if old else 0)
+            if self._disk_bytes > self.max_bytes:
+                self._evict(db, int(self.max_bytes * 0.9))
+            db.commit()
+
+    def clear(self):
+        with self.disk_lock:
+            with self.lock:
+                self.memory.clear()
+            db = self._db()
+            db.execute("DELETE FROM llm_cache")
+            db.commit()
+            self._disk_bytes = 0
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.counters["memory_hits"] + self.counters["disk_hits"] + self.counters["misses"]
+            hits = lookups - self.counters["misses"]
+            return {
+                **self.counters,
+                "hit_rate": round(hits / lookups, 4) if lookups else None,
+                "memory_entries": len(self.memory),
+                "disk_bytes": self._disk_bytes,
+            }
+
+    def _remember(self, key: str, value: str, created_at: float):
+        self.memory[key] = (value, created_at)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+
+    def _evict(self, db: sqlite3.Connection, target_bytes: int):
+        rows = db.execute("SELECT key, size FROM llm_cache ORDER BY accessed_at ASC").fetchall()
+        for key, size in rows:
+            if self._disk_bytes <= target_bytes:
+                break
+            db.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            with self.lock:
+                self.memory.pop(key, None)
+                self.counters["evictions"] += 1
+            self._disk_bytes -= size
+
+
+llm_cache = LLMCache()
@@ -0,0 +1,208 @@
+import asyncio
+import json
+import os
+import random
+import time
+from dataclasses import dataclass
+from typing import AsyncIterator, Optional
+
+try:
+    from google.api_core import exceptions as google_exceptions
+    _PROVIDER_RETRYABLE = (
+        google_exceptions.ResourceExhausted,
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.DeadlineExceeded,
+        google_exceptions.InternalServerError,
+    )
+except ImportError:  # pragma: no cover - only without the Gemini SDK
+    _PROVIDER_RETRYABLE = ()
+
+MODEL_NAME = os.getenv("LLM_MODEL", "gemini-2.5-flash")
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")  # gemini | fake
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BASE_SECONDS = float(os.getenv("LLM_RETRY_BASE_SECONDS", "0.5"))
+LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", "8"))
+LLM_FAKE_LATENCY_MS = float(os.getenv("LLM_FAKE_LATENCY_MS", "200"))
+
+RETRYABLE_ERRORS = (asyncio.TimeoutError, ConnectionError) + _PROVIDER_RETRYABLE
+
+
+@dataclass
+class LLMResponse:
+    text: str
+    prompt_tokens: Optional[int] = None
+    output_tokens: Optional[int] = None
+
+
+class GeminiBackend:
+    """Gemini via the SDK's native async API; configured once per process."""
+
+    def __init__(self, model_name: str = MODEL_NAME):
+        import google.generativeai as genai
+
+        api_key = os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise ValueError("GEMINI_API_KEY is not set in your .env file")
+        genai.configure(api_key=api_key)
+        self.model = genai.GenerativeModel(model_name)
+
+    async def generate(self, prompt: str) -> LLMResponse:
+        response = await self.model.generate_content_async(prompt)
+        metadata = getattr(response, "usage_metadata", None)
+        return LLMResponse(
+            text=response.text,
+            prompt_tokens=getattr(metadata, "prompt_token_count", None),
+            output_tokens=getattr(metadata, "candidates_token_count", None),
+        )
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        response = await self.model.generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+
+class FakeBackend:
+    """Offline stand-in with configurable latency, for local runs and load tests.
+
+    `responder(prompt) -> str` decides the reply; the default returns an empty
+    extraction, a skeleton summary, or canned prose depending on the prompt.
+    """
+
+    def __init__(self, latency_ms: float = LLM_FAKE_LATENCY_MS, responder=None):
+        self.latency = latency_ms / 1000
+        self.responder = responder or self._default_reply
+
+    @staticmethod
+    def _default_reply(prompt: str) -> str:
+        if "Return ONLY a JSON array" in prompt:
+            return "[]"
+        if "Return ONLY valid JSON" in prompt:
+            return json.dumps({
+                "key_improvements": [], "worsening_indicators": [], "risk_trends": [],
+                "important_changes": [], "overall_assessment": "No assessment (offline backend).",
+            })
+        return "This is an offline response from the fake LLM backend."
+
+    async def generate(self, prompt: str) -> LLMResponse:
+        await asyncio.sleep(self.latency)
+        text = self.responder(prompt)
+        return LLMResponse(text=text, prompt_tokens=len(prompt) // 4, output_tokens=len(text) // 4)
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        words = self.responder(prompt).split(" ")
+        step = self.latency / max(len(words), 1)
+        for i, word in enumerate(words):
+            await asyncio.sleep(step)
+            yield word if i == 0 else " " + word
+
+
+class LLMClient:
+    """Process-wide LLM access with a global in-flight cap, timeouts and jittered retries."""
+
+    def __init__(self, backend, timeout: float = LLM_TIMEOUT_SECONDS, max_retries: int = LLM_MAX_RETRIES,
+                 max_in_flight: int = LLM_MAX_IN_FLIGHT, retry_base: float = LLM_RETRY_BASE_SECONDS):
+        self.backend = backend
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.max_in_flight = max_in_flight
+        self.retry_base = retry_base
+        self._semaphore = None
+        self.counters = {"calls": 0, "retries": 0, "timeouts": 0, "failures": 0, "in_flight": 0, "peak_in_flight": 0}
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        return self._semaphore
+
+    def _enter(self):
+        self.counters["in_flight"] += 1
+        self.counters["peak_in_flight"] = max(self.counters["peak_in_flight"], self.counters["in_flight"])
+
+    async def _backoff(self, attempt: int):
+        self.counters["retries"] += 1
+        await asyncio.sleep(random.uniform(0, self.retry_base * (2 ** attempt)))
+
+    async def generate(self, prompt: str, timeout: Optional[float] = None) -> LLMResponse:
+        self.counters["calls"] += 1
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self.semaphore:
+                    self._enter()
+                    try:
+                        return await asyncio.wait_for(self.backend.generate(prompt), timeout or self.timeout)
+                    finally:
+                        self.counters["in_flight"] -= 1
+            except RETRYABLE_ERRORS as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    self.counters["timeouts"] += 1
+                if attempt == self.max_retries:
+                    self.counters["failures"] += 1
+                    raise
+                await self._backoff(attempt)
+            except Exception:
+                self.counters["failures"] += 1
+                raise
+
+    async def stream(self, prompt: str, timeout: Optional[float] = None) -> AsyncIterator[str]:
+        """Yield text as the model produces it.
+
+        Only the wait for the first chunk is retried; once text has been
+        yielded a failure propagates. `timeout` bounds the whole generation.
+        """
+        self.counters["calls"] += 1
+        deadline = time.monotonic() + (timeout or self.timeout)
+        for attempt in range(self.max_retries + 1):
+            started = False
+            try:
+                async with self.semaphore:
+                    self._enter()
+                    try:
+                        chunks = self.backend.stream(prompt).__aiter__()
+                        while True:
+                            remaining = deadline - time.monotonic()
+                            if remaining <= 0:
+                                raise asyncio.TimeoutError()
+                            try:
+                                chunk = await asyncio.wait_for(chunks.__anext__(), remaining)
+                            except StopAsyncIteration:
+                                return
+                            started = True
+                            yield chunk
+                    finally:
+                        self.counters["in_flight"] -= 1
+            except RETRYABLE_ERRORS as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    self.counters["timeouts"] += 1
+                if started or attempt == self.max_retries:
+                    self.counters["failures"] += 1
+                    raise
+                await self._backoff(attempt)
+
+    def stats(self) -> dict:
+        return {**self.counters, "max_in_flight": self.max_in_flight, "backend": type(self.backend).__name__}
+
+
+_client: Optional[LLMClient] = None
+
+
+def get_llm_client() -> LLMClient:
+    """The shared client, created on first use."""
+    global _client
+    if _client is None:
+        backend = FakeBackend() if LLM_BACKEND == "fake" else GeminiBackend()
+        _client = LLMClient(backend)
+    return _client
+
+
+def set_llm_client(client: Optional[LLMClient]):
+    """Swap the shared client, e.g. for a FakeBackend in load tests."""
+    global _client
+    _client = client
+
+
+def llm_client_stats() -> Optional[dict]:
+    """Counters of the shared client, without creating it."""
+    return _client.stats() if _client else None
@@ -1,17 +1,120 @@
 import os
 import json
-import google.generativeai as genai
+import time
+import asyncio
+from app.ai.llm_cache import llm_cache, cache_key, normalize_text, LLM_CACHE_BYPASS
+from app.ai.llm_client import get_llm_client, MODEL_NAME
+from app.services.biomarker_codes import biomarker_code
 
-def get_client():
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        raise ValueError("GEMINI_API_KEY is not set in your .env file")
-    genai.configure(api_key=api_key)
-    return genai.GenerativeModel("gemini-2.5-flash")
+# Long reports are split into overlapping page-aligned chunks and extracted concurrently.
+EXTRACTION_CHUNK_CHARS = int(os.getenv("EXTRACTION_CHUNK_CHARS", "4000"))
+EXTRACTION_CHUNK_OVERLAP = int(os.getenv("EXTRACTION_CHUNK_OVERLAP", "300"))
+EXTRACTION_CONCURRENCY = int(os.getenv("EXTRACTION_CONCURRENCY", "4"))
 
+# Bump when a prompt template changes so stale cached responses aren't reused.
+EXTRACTION_PROMPT_VERSION = "extract-v1"
+SUMMARY_PROMPT_VERSION = "summary-v2"
+SUMMARY_UPDATE_PROMPT_VERSION = "summary-update-v1"
 
-async def extract_biomarkers_from_text(text: str) -> list:
-    model = get_client()
+
+def _parse_json_response(raw: str):
+    raw = raw.strip()
+    if raw.startswith("```"):
+        raw = raw.split("```")[1]
+        if raw.startswith("json"):
+            raw = raw[4:]
+    return json.loads(raw)
+
+
+async def _generate_json(prompt: str, template_version: str, cache_input: str, use_cache: bool = True):
+    """Run a JSON-returning prompt through the response cache.
+
+    Only responses that parse are cached. `use_cache=False` (or
+    LLM_CACHE_BYPASS) skips both the lookup and the write. Returns
+    (result, usage) where usage holds token counts, or None on a cache hit.
+    """
+    use_cache = use_cache and not LLM_CACHE_BYPASS
+    key = cache_key(MODEL_NAME, template_version, cache_input)
+    if use_cache:
+        cached = await llm_cache.aget(key)
+        if cached is not None:
+            return _parse_json_response(cached), None
+
+    response = await get_llm_client().generate(prompt)
+    result = _parse_json_response(response.text)
+    if use_cache:
+        await llm_cache.aset(key, response.text)
+    return result, {"prompt_tokens": response.prompt_tokens, "output_tokens": response.output_tokens}
+
+
+def chunk_report_text(text: str, max_chars: int = EXTRACTION_CHUNK_CHARS, overlap: int = EXTRACTION_CHUNK_OVERLAP) -> list:
+    """Split report text into chunks of at most ~max_chars.
+
+    Whole pages (separated by form feeds) are packed together where they fit;
+    longer pages are split on line boundaries. Each chunk repeats the last
+    `overlap` characters' worth of lines from the previous one so a table row
+    cut at a boundary is still seen whole.
+    """
+    segments = []
+    for page in text.split("\f"):
+        lines = [line for line in page.splitlines() if line.strip()]
+        current, size = [], 0
+        for line in lines:
+            if current and size + len(line) + 1 > max_chars:
+                segments.append(current)
+                current, size = [], 0
+            current.append(line)
+            size += len(line) + 1
+        if current:
+            segments.append(current)
+
+    chunks, current, size = [], [], 0
+    for segment in segments:
+        seg_size = sum(len(line) + 1 for line in segment)
+        if current and size + seg_size > max_chars:
+            chunks.append(current)
+            tail, tail_size = [], 0
+            for line in reversed(current):
+                if tail_size + len(line) + 1 > overlap:
+                    break
+                tail.insert(0, line)
+                tail_size += len(line) + 1
+            current, size = tail, tail_size
+        current = current + segment
+        size += seg_size
+    if current:
+        chunks.append(current)
+    return ["\n".join(chunk) for chunk in chunks]
+
+
+def merge_biomarkers(chunk_results: list) -> list:
+    """Combine per-chunk extractions, dropping readings repeated across chunk overlaps.
+
+    Repeats are matched on (code, value) only: a copy cut at a chunk
+    boundary may have lost its unit or range, which are then filled in from
+    whichever copy has them.
+    """
+    merged = {}
+    for items in chunk_results:
+        for b in items or []:
+            if not isinstance(b, dict):
+                continue
+            try:
+                value = round(float(b.get("value")), 6)
+            except (TypeError, ValueError):
+                value = str(b.get("value"))
+            key = (biomarker_code(b.get("name", "")), value)
+            existing = merged.get(key)
+            if existing is None:
+                merged[key] = dict(b)
+                continue
+            for field in ("unit", "ref_min", "ref_max"):
+                if existing.get(field) in (None, "") and b.get(field) not in (None, ""):
+                    existing[field] = b[field]
+    return list(merged.values())
+
+
+async def _extract_chunk(chunk: str, use_cache: bool) -> tuple:
     prompt = f"""You are a medical data extraction assistant.
 Extract all biomarkers/lab values from the following medical report text.
 Return ONLY a JSON array with no markdown, no explanation.
@@ -19,27 +122,51 @@ Each item must have: name, value, unit, ref_min, ref_max.
 Use empty string "" for missing fields. All values must be numeric strings or empty strings.
 
 Report text:
-{text[:4000]}
+{chunk}
 
 Return format:
 [{{"name": "Hemoglobin", "value": "14.2", "unit": "g/dL", "ref_min": "12.0", "ref_max": "16.0"}}]
 """
-    response = model.generate_content(prompt)
-    raw = response.text.strip()
-    if raw.startswith("```"):
-        raw = raw.split("```")[1]
-        if raw.startswith("json"):
-            raw = raw[4:]
-    return json.loads(raw)
+    started = time.perf_counter()
+    result, usage = await _generate_json(prompt, EXTRACTION_PROMPT_VERSION, normalize_text(chunk), use_cache)
+    stats = {
+        "chars": len(chunk),
+        "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+        "cached": usage is None,
+        **(usage or {"prompt_tokens": 0, "output_tokens": 0}),
+    }
+    return result, stats
+
+
+async def extract_biomarkers_with_stats(text: str, use_cache: bool = True) -> tuple:
+    """Extract biomarkers from the full report text.
+
+    Chunks are sent concurrently, at most EXTRACTION_CONCURRENCY at a time.
+    Returns (biomarkers, chunk_stats) with per-chunk latency and token counts.
+    """
+    semaphore = asyncio.Semaphore(EXTRACTION_CONCURRENCY)
+
+    async def run(chunk):
+        async with semaphore:
+            return await _extract_chunk(chunk, use_cache)
+
+    outcomes = await asyncio.gather(*(run(chunk) for chunk in chunk_report_text(text)))
+    chunk_stats = [{"chunk": i, **stats} for i, (_, stats) in enumerate(outcomes)]
+    return merge_biomarkers([result for result, _ in outcomes]), chunk_stats
+
+
+async def extract_biomarkers_from_text(text: str, use_cache: bool = True) -> list:
+    biomarkers, _ = await extract_biomarkers_with_stats(text, use_cache)
+    return biomarkers
 
 
-async def generate_health_summary(biomarker_data: list) -> dict:
-    model = get_client()
+async def generate_health_summary(history: str, use_cache: bool = True) -> dict:
+    """Summarise a compacted biomarker history (see services.history_compaction)."""
     prompt = f"""You are a health data analyst assistant. Based on the following biomarker history, generate a structured health summary.
 Return ONLY valid JSON with no markdown.
 
-Biomarker history:
-{json.dumps(biomarker_data[:80], indent=2)}
+Biomarker history, one line per biomarker (values flagged OUT are outside the reference range; slope is change per year):
+{history}
 
 Return this exact structure:
 {{
@@ -50,10 +177,23 @@ Return this exact structure:
   "overall_assessment": "..."
 }}
 """
-    response = model.generate_content(prompt)
-    raw = response.text.strip()
-    if raw.startswith("```"):
-        raw = raw.split("```")[1]
-        if raw.startswith("json"):
-            raw = raw[4:]
-    return json.loads(raw)
+    summary, _ = await _generate_json(prompt, SUMMARY_PROMPT_VERSION, history, use_cache)
+    return summary
+
+
+async def update_health_summary(previous: dict, delta_history: str, use_cache: bool = True) -> dict:
+    """Revise a previous summary given only the readings added since it was made."""
+    previous_json = json.dumps(previous, separators=(",", ":"))
+    prompt = f"""You are a health data analyst assistant. Below is a structured health summary generated earlier, followed by the biomarker readings added since then.
+Update the summary so it reflects the new readings: keep points that still hold, revise or drop points the new data contradicts, and add new findings.
+Return ONLY valid JSON with no markdown, in the same structure as the previous summary.
+
+Previous summary:
+{previous_json}
+
+New readings, one line per biomarker (the first value of each line is the last reading before this update; values flagged OUT are outside the reference range; slope is change per year):
+{delta_history}
+"""
+    cache_input = previous_json + "\n" + delta_history
+    summary, _ = await _generate_json(prompt, SUMMARY_UPDATE_PROMPT_VERSION, cache_input, use_cache)
+    return summary
@@ -1,13 +1,4 @@
-import os
-import json
-import google.generativeai as genai
-
-def get_client():
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        raise ValueError("GEMINI_API_KEY is not set in your .env file")
-    genai.configure(api_key=api_key)
-    return genai.GenerativeModel("gemini-2.5-flash")
+from app.ai.llm_client import get_llm_client
 
 SYSTEM_PROMPT = """You are a helpful health information assistant. You help users understand their lab results and health data.
 
@@ -23,25 +14,46 @@ DOCTOR_SYSTEM_PROMPT = """You are a clinical data summarization assistant for he
 Present data in a structured, clinical format. Be concise and factual. No conversational language."""
 
 
-async def get_rag_answer(
+def build_rag_prompt(
     question: str,
-    biomarker_context: list,
+    health_context: str,
     report_texts: list,
     doctor_mode: bool = False,
 ) -> str:
-    model = get_client()
-
-    biomarker_str = json.dumps(biomarker_context[:50], indent=2)
     system = DOCTOR_SYSTEM_PROMPT if doctor_mode else SYSTEM_PROMPT
+    excerpts = "\n---\n".join(report_texts) if report_texts else "(none found)"
 
-    prompt = f"""{system}
+    return f"""{system}
 
 User Question: {question}
 
-Recent Biomarker Data (latest first):
-{biomarker_str}
+Health Data:
+{health_context}
+
+Relevant Report Excerpts:
+{excerpts}
 
 Please answer the question based on this data."""
 
-    response = model.generate_content(prompt)
+
+async def get_rag_answer(
+    question: str,
+    health_context: str,
+    report_texts: list,
+    doctor_mode: bool = False,
+) -> str:
+    prompt = build_rag_prompt(question, health_context, report_texts, doctor_mode)
+    response = await get_llm_client().generate(prompt)
     return response.text
+
+
+async def stream_rag_answer(
+    question: str,
+    health_context: str,
+    report_texts: list,
+    doctor_mode: bool = False,
+):
+    """Yield the answer text as the model emits it."""
+    prompt = build_rag_prompt(question, health_context, report_texts, doctor_mode)
+    async for text in get_llm_client().stream(prompt):
+        yield text
@@ -0,0 +1,189 @@
+"""Per-user retrieval index over report text.
+
+Each user's report text is split into small overlapping chunks and embedded
+with a stateless hashing vectorizer, so chunks can be added and removed
+without refitting anything. Each user's index is a single file holding a
+JSON header (the chunk texts and the report each came from) followed by
+one L2-normalised float32 matrix, memory-mapped for queries:
+
+    CHROMA_PATH/user_<id>/index.bin
+
+Writes replace the file with one rename, so a reader in any process sees
+either the old or the new index, never vectors paired with another
+version's chunks. Writers take a per-user file lock (fcntl, where
+available) around their read-modify-write, so updates from several app
+processes don't overwrite each other.
+
+A query is a single matrix-vector product over the user's chunks.
+"""
+import json
+import logging
+import os
+import struct
+import threading
+from contextlib import contextmanager
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer
+from app.ai.openai_service import chunk_report_text
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; the in-process lock still serialises writers
+    fcntl = None
+
+logger = logging.getLogger("report_index")
+
+INDEX_PATH = os.getenv("CHROMA_PATH", "./chroma_db")
+RETRIEVAL_FEATURES = int(os.getenv("RETRIEVAL_FEATURES", str(2 ** 12)))
+RETRIEVAL_CHUNK_CHARS = int(os.getenv("RETRIEVAL_CHUNK_CHARS", "800"))
+RETRIEVAL_CHUNK_OVERLAP = int(os.getenv("RETRIEVAL_CHUNK_OVERLAP", "150"))
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "4"))
+
+INDEX_FILE = "index.bin"
+INDEX_MAGIC = b"RIDX1\n"
+INDEX_ALIGN = 64  # matrix offset alignment in the file
+
+_vectorizer = HashingVectorizer(
+    n_features=RETRIEVAL_FEATURES,
+    alternate_sign=False,
+    norm="l2",
+    ngram_range=(1, 2),
+    stop_words="english",
+)
+
+
+def embed(texts: list) -> np.ndarray:
+    return _vectorizer.transform(texts).toarray().astype(np.float32)
+
+
+class ReportIndex:
+    def __init__(self, root: str = INDEX_PATH):
+        self.root = root
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def _lock(self, user_id: int) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(user_id, threading.Lock())
+
+    @contextmanager
+    def _writing(self, user_id: int):
+        """Exclusive access to a user's index for a read-modify-write, across threads and processes."""
+        with self._lock(user_id):
+            if fcntl is None:
+                yield
+                return
+            directory = self._dir(user_id)
+            os.makedirs(directory, exist_ok=True)
+            with open(os.path.join(directory, ".lock"), "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _dir(self, user_id: int) -> str:
+        return os.path.join(self.root, f"user_{user_id}")
+
+    def _load(self, user_id: int, mmap: bool = False):
+        path = os.path.join(self._dir(user_id), INDEX_FILE)
+        empty = np.zeros((0, RETRIEVAL_FEATURES), dtype=np.float32), []
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            return empty
+        with f:
+            if f.read(len(INDEX_MAGIC)) != INDEX_MAGIC:
+                raise ValueError(f"{path} is not a report index")
+            (header_len,) = struct.unpack("<Q", f.read(8))
+            header = json.loads(f.read(header_len))
+        chunks, features = header["chunks"], header["features"]
+        if not chunks:
+            return empty
+        offset = _matrix_offset(header_len)
+        shape = (len(chunks), features)
+        if mmap:
+            vectors = np.memmap(path, dtype=np.float32, mode="r", offset=offset, shape=shape)
+        else:
+            vectors = np.fromfile(path, dtype=np.float32, count=shape[0] * shape[1], offset=offset).reshape(shape)
+        return vectors, chunks
+
+    def _save(self, user_id: int, vectors: np.ndarray, chunks: list):
+        # Header and matrix go in one file, swapped in with a single rename.
+        directory = self._dir(user_id)
+        os.makedirs(directory, exist_ok=True)
+        header = json.dumps({"features": int(vectors.shape[1]), "chunks": chunks}).encode()
+        tmp_path = os.path.join(directory, f"{INDEX_FILE}.{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(INDEX_MAGIC + struct.pack("<Q", len(header)) + header)
+            f.write(b"\0" * (_matrix_offset(len(header)) - f.tell()))
+            f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+        os.replace(tmp_path, os.path.join(directory, INDEX_FILE))
+
+    def add_report(self, user_id: int, report_id: int, text: str) -> int:
+        """Index a report's text, replacing any chunks it already had. Returns the chunk count."""
+        pieces = chunk_report_text(text or "", RETRIEVAL_CHUNK_CHARS, RETRIEVAL_CHUNK_OVERLAP)
+        with self._writing(user_id):
+            vectors, chunks = self._load(user_id)
+            keep = np.array([c["report_id"] != report_id for c in chunks], dtype=bool)
+            vectors, chunks = vectors[keep], [c for c, k in zip(chunks, keep) if k]
+            if pieces:
+                vectors = np.vstack([vectors, embed(pieces)])
+                chunks = chunks + [{"report_id": report_id, "text": p} for p in pieces]
+            self._save(user_id, vectors, chunks)
+        return len(pieces)
+
+    def remove_report(self, user_id: int, report_id: int) -> int:
+        """Drop a report's chunks. Returns how many were removed."""
+        with self._writing(user_id):
+            vectors, chunks = self._load(user_id)
+            keep = np.array([c["report_id"] != report_id for c in chunks], dtype=bool)
+            removed = len(chunks) - int(keep.sum())
+            if removed:
+                self._save(user_id, vectors[keep], [c for c, k in zip(chunks, keep) if k])
+        return removed
+
+    def search(self, user_id: int, query: str, k: int = RETRIEVAL_TOP_K) -> list:
+        """Top-k chunks by cosine similarity, best first. Chunks with no term overlap are skipped."""
+        with self._lock(user_id):
+            vectors, chunks = self._load(user_id, mmap=True)
+        if not chunks or not query.strip():
+            return []
+        scores = vectors @ embed([query])[0]
+        k = min(k, len(chunks))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            {"report_id": chunks[i]["report_id"], "text": chunks[i]["text"], "score": round(float(scores[i]), 4)}
+            for i in top
+            if scores[i] > 0
+        ]
+
+    def drop_user(self, user_id: int):
+        with self._writing(user_id):
+            path = os.path.join(self._dir(user_id), INDEX_FILE)
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def _matrix_offset(header_len: int) -> int:
+    unaligned = len(INDEX_MAGIC) + 8 + header_len
+    return -(-unaligned // INDEX_ALIGN) * INDEX_ALIGN
+
+
+report_index = ReportIndex()
+
+
+def index_report_safely(user_id: int, report_id: int, text: str):
+    """Index a report without letting an index failure break the caller's write path."""
+    try:
+        report_index.add_report(user_id, report_id, text)
+    except Exception:
+        logger.exception("Failed to index report %s", report_id)
+
+
+def unindex_report_safely(user_id: int, report_id: int):
+    try:
+        report_index.remove_report(user_id, report_id)
+    except Exception:
+        logger.exception("Failed to remove report %s from the index", report_id)
@@ -1,11 +1,40 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.database import engine, Base
-from app.routers import auth, reports, biomarkers, logs, medicines, chat, summary
+from fastapi.responses import ORJSONResponse
+from app.database import async_engine, pool_stats
+from app.routers import auth, reports, biomarkers, logs, medicines, chat, summary, series
+from app.services.ingestion_service import ingestion_pool
+from app.ai.llm_cache import llm_cache
+from app.ai.llm_client import llm_client_stats
+from app.ai.context_cache import context_cache
+from app.utils.auth import principal_cache, require_metrics_access
+from app.utils.conditional import conditional_stats
+from app.utils.responses import CompressionMiddleware
+from app.utils.passwords import password_hasher
+from app.utils.schema import upgrade_database
 
-Base.metadata.create_all(bind=engine)
 
-app = FastAPI(title="Health Intelligence API", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Existing databases get new columns and backfills before any request.
+    await asyncio.to_thread(upgrade_database)
+    await ingestion_pool.start()
+    yield
+    await ingestion_pool.stop()
+    password_hasher.shutdown()
+    await async_engine.dispose()
+
+
+app = FastAPI(
+    title="Health Intelligence API",
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+)
+
+app.add_middleware(CompressionMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -13,6 +42,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
 app.include_router(auth.router, prefix="/auth", tags=["auth"])
@@ -22,7 +52,21 @@ app.include_router(logs.router, prefix="/logs", tags=["logs"])
 app.include_router(medicines.router, prefix="/medicines", tags=["medicines"])
 app.include_router(chat.router, prefix="/chat", tags=["chat"])
 app.include_router(summary.router, prefix="/summary", tags=["summary"])
+app.include_router(series.router, prefix="/series", tags=["series"])
 
 @app.get("/")
 def root():
     return {"message": "Health Intelligence API running"}
+
+
+@app.get("/metrics", dependencies=[Depends(require_metrics_access)])
+def metrics():
+    return {
+        "llm_cache": llm_cache.stats(),
+        "llm_client": llm_client_stats(),
+        "chat_context_cache": context_cache.stats(),
+        "auth_cache": principal_cache.stats(),
+        "password_hasher": password_hasher.stats(),
+        "db_pool": pool_stats(),
+        "conditional_get": conditional_stats.stats(),
+    }
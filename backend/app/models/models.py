@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, Boolean, Date
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, Boolean, Date, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.database import Base
@@ -10,6 +10,7 @@ class User(Base):
     email = Column(String, unique=True, index=True, nullable=False)
     hashed_password = Column(String, nullable=False)
     full_name = Column(String)
+    token_version = Column(Integer, nullable=True, default=0)  # bumped to revoke issued tokens
     created_at = Column(DateTime, default=datetime.utcnow)
 
     reports = relationship("Report", back_populates="user")
@@ -19,10 +20,12 @@ class User(Base):
 
 class Report(Base):
     __tablename__ = "reports"
+    __table_args__ = (Index("ix_reports_user_uploaded", "user_id", "uploaded_at", "id"),)
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     filename = Column(String, nullable=False)
     file_path = Column(String, nullable=False)
+    content_hash = Column(String(64), nullable=True, index=True)  # sha256 of the PDF
     extracted_text = Column(Text)
     uploaded_at = Column(DateTime, default=datetime.utcnow)
     report_date = Column(DateTime, nullable=True)
@@ -33,10 +36,15 @@ class Report(Base):
 
 class Biomarker(Base):
     __tablename__ = "biomarkers"
+    __table_args__ = (
+        Index("ix_biomarkers_user_code", "user_id", "code"),
+        Index("ix_biomarkers_user_recorded", "user_id", "recorded_at", "id"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     report_id = Column(Integer, ForeignKey("reports.id"), nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     name = Column(String, nullable=False)
+    code = Column(String, nullable=True)  # canonical code from services.biomarker_codes
     value = Column(Float, nullable=False)
     unit = Column(String)
     ref_min = Column(Float, nullable=True)
@@ -46,8 +54,31 @@ class Biomarker(Base):
     report = relationship("Report", back_populates="biomarkers")
 
 
+class BiomarkerStats(Base):
+    """Running statistics per (user, biomarker code), maintained with Welford updates."""
+    __tablename__ = "biomarker_stats"
+    __table_args__ = (UniqueConstraint("user_id", "code", name="uq_biomarker_stats_user_code"),)
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    code = Column(String, nullable=False)
+    name = Column(String, nullable=False)  # most recent display name
+    count = Column(Integer, nullable=False, default=0)
+    mean = Column(Float, nullable=False, default=0.0)
+    m2 = Column(Float, nullable=False, default=0.0)  # sum of squared deviations from the mean
+    min_value = Column(Float, nullable=True)
+    max_value = Column(Float, nullable=True)
+    last_value = Column(Float, nullable=True)
+    last_recorded_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
 class ManualLog(Base):
     __tablename__ = "manual_logs"
+    __table_args__ = (
+        Index("ix_manual_logs_user_logged", "user_id", "logged_at", "id"),
+        # NULL keys never collide, so only keyed rows are deduplicated
+        Index("uq_manual_logs_user_idempotency", "user_id", "idempotency_key", unique=True),
+    )
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     log_type = Column(String, nullable=False)  # blood_pressure, glucose, weight, pulse
@@ -56,10 +87,38 @@ class ManualLog(Base):
     unit = Column(String)
     notes = Column(Text, nullable=True)
     logged_at = Column(DateTime, default=datetime.utcnow)
+    idempotency_key = Column(String(128), nullable=True)  # client-supplied, for replay-safe bulk imports
 
     user = relationship("User", back_populates="manual_logs")
 
 
+class LogRollup(Base):
+    """Pre-aggregated manual logs per (user, log type, granularity, bucket).
+
+    Kept in step with manual_logs by the write paths; outlives raw rows
+    removed by the retention policy.
+    """
+    __tablename__ = "log_rollups"
+    __table_args__ = (
+        UniqueConstraint("user_id", "log_type", "granularity", "bucket_start", name="uq_log_rollups_bucket"),
+    )
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    log_type = Column(String, nullable=False)
+    granularity = Column(String, nullable=False)  # hour, day, week
+    bucket_start = Column(DateTime, nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+    sum = Column(Float, nullable=False, default=0.0)
+    sumsq = Column(Float, nullable=False, default=0.0)
+    min_value = Column(Float, nullable=True)
+    max_value = Column(Float, nullable=True)
+    count2 = Column(Integer, nullable=False, default=0)  # rows with a value2
+    sum2 = Column(Float, nullable=False, default=0.0)
+    sumsq2 = Column(Float, nullable=False, default=0.0)
+    min_value2 = Column(Float, nullable=True)
+    max_value2 = Column(Float, nullable=True)
+
+
 class Medicine(Base):
     __tablename__ = "medicines"
     id = Column(Integer, primary_key=True, index=True)
@@ -71,3 +130,50 @@ class Medicine(Base):
     notes = Column(Text, nullable=True)
 
     user = relationship("User", back_populates="medicines")
+
+
+class IngestionJob(Base):
+    """A report upload working through extract -> llm -> insert in the background."""
+    __tablename__ = "ingestion_jobs"
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    report_id = Column(Integer, ForeignKey("reports.id"), nullable=True)
+    status = Column(String, nullable=False, default="queued", index=True)  # queued, running, retrying, done, failed
+    stage = Column(String, nullable=False, default="extract")  # extract, llm, insert, done
+    attempts = Column(Integer, nullable=False, default=0)  # attempts at the current stage
+    error = Column(Text, nullable=True)
+    timings = Column(Text, nullable=True)  # JSON: per-stage durations in ms
+    payload = Column(Text, nullable=True)  # JSON: extracted biomarkers carried to the insert stage
+    result = Column(Text, nullable=True)  # JSON: biomarkers_extracted, anomalies
+    next_attempt_at = Column(DateTime, nullable=True)
+    lease_owner = Column(String, nullable=True)  # token of the run currently holding a running job
+    lease_expires_at = Column(DateTime, nullable=True)  # renewed by that run's heartbeat
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+
+class DataVersion(Base):
+    """Per-user change counter for one data domain (reports, biomarkers, logs, medicines)."""
+    __tablename__ = "data_versions"
+    __table_args__ = (UniqueConstraint("user_id", "domain", name="uq_data_versions_user_domain"),)
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    domain = Column(String, nullable=False)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class HealthSummary(Base):
+    """The latest generated health summary per user and the data it was built from."""
+    __tablename__ = "health_summaries"
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, unique=True)
+    summary = Column(Text, nullable=False)  # JSON: the summary returned to the client
+    data_version = Column(Integer, nullable=False, default=0)  # biomarkers data version at generation
+    watermark_id = Column(Integer, nullable=False, default=0)  # highest biomarker id included
+    biomarker_count = Column(Integer, nullable=False, default=0)  # rows with id <= watermark_id
+    mode = Column(String, nullable=False, default="full")  # full or incremental
+    incremental_updates = Column(Integer, nullable=False, default=0)  # since the last full build
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
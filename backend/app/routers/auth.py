@@ -1,14 +1,36 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel, EmailStr
-from app.database import get_db
+from app.database import get_async_db
 from app.models.models import User
-from app.utils.auth import hash_password, verify_password, create_access_token, get_current_user
+from app.utils.auth import create_user_token, get_current_principal, Principal, principal_cache
+from app.utils.passwords import password_hasher, PasswordHasherBusy
 
 router = APIRouter()
 
 
+def _busy() -> HTTPException:
+    return HTTPException(status_code=429, detail="Too many sign-in attempts, retry shortly", headers={"Retry-After": "1"})
+
+
+async def _hash(password: str) -> str:
+    try:
+        return await password_hasher.hash(password)
+    except PasswordHasherBusy:
+        raise _busy()
+
+
+async def _verify(password: str, hashed: str) -> tuple:
+    """(matches, new_hash or None); see utils.passwords."""
+    try:
+        return await password_hasher.verify(password, hashed)
+    except PasswordHasherBusy:
+        raise _busy()
+
+
 class RegisterRequest(BaseModel):
     email: EmailStr
     password: str
@@ -23,32 +45,93 @@ class TokenResponse(BaseModel):
     full_name: str
 
 
+async def _account(db: AsyncSession, *criteria):
+    """Load what login needs, then hand the pooled connection back.
+
+    The bcrypt wait that follows can be long under load; holding a connection
+    across it would let a login burst exhaust the pool.
+    """
+    result = await db.execute(
+        select(User.id, User.email, User.full_name, User.hashed_password, User.token_version).where(*criteria)
+    )
+    row = result.first()
+    await db.close()
+    return row
+
+
+def _token_response(account) -> TokenResponse:
+    return TokenResponse(
+        access_token=create_user_token(account),
+        token_type="bearer",
+        user_id=account.id,
+        email=account.email,
+        full_name=account.full_name or "",
+    )
+
+
 @router.post("/register", response_model=TokenResponse)
-def register(data: RegisterRequest, db: Session = Depends(get_db)):
-    if db.query(User).filter(User.email == data.email).first():
+async def register(data: RegisterRequest, db: AsyncSession = Depends(get_async_db)):
+    if await _account(db, User.email == data.email):
         raise HTTPException(status_code=400, detail="Email already registered")
     user = User(
         email=data.email,
-        hashed_password=hash_password(data.password),
+        hashed_password=await _hash(data.password),
         full_name=data.full_name,
     )
     db.add(user)
-    db.commit()
-    db.refresh(user)
-    token = create_access_token({"sub": str(user.id)})
-    return TokenResponse(access_token=token, token_type="bearer", user_id=user.id, email=user.email, full_name=user.full_name)
+    try:
+        await db.commit()
+    except IntegrityError:
+        raise HTTPException(status_code=400, detail="Email already registered")
+    await db.refresh(user)
+    return _token_response(user)
 
 
 @router.post("/login", response_model=TokenResponse)
-def login(form: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == form.username).first()
-    if not user or not verify_password(form.password, user.hashed_password):
+async def login(form: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
+    account = await _account(db, User.email == form.username)
+    if not account:
         raise HTTPException(status_code=401, detail="Invalid credentials")
-    token = create_access_token({"sub": str(user.id)})
-    return TokenResponse(access_token=token, token_type="bearer", user_id=user.id, email=user.email, full_name=user.full_name or "")
+    matches, new_hash = await _verify(form.password, account.hashed_password)
+    if not matches:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    if new_hash:
+        # Stored with an older bcrypt cost; upgrade while we have the plaintext.
+        await db.execute(update(User).where(User.id == account.id).values(hashed_password=new_hash))
+        await db.commit()
+    return _token_response(account)
 
 
 @router.get("/validate")
-def validate_token(current_user: User = Depends(get_current_user)):
+def validate_token(current_user: Principal = Depends(get_current_principal)):
     """Validate if the current token is still valid"""
     return {"valid": True, "user_id": current_user.id}
+
+
+class ChangePasswordRequest(BaseModel):
+    current_password: str
+    new_password: str
+
+
+@router.post("/change-password", response_model=TokenResponse)
+async def change_password(
+    data: ChangePasswordRequest,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal),
+):
+    """Set a new password and revoke every token issued before it."""
+    account = await _account(db, User.id == current_user.id)
+    if not account:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    matches, _ = await _verify(data.current_password, account.hashed_password)
+    if not matches:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    new_hash = await _hash(data.new_password)
+    await db.execute(
+        update(User)
+        .where(User.id == current_user.id)
+        .values(hashed_password=new_hash, token_version=func.coalesce(User.token_version, 0) + 1)
+    )
+    await db.commit()
+    principal_cache.invalidate_user(current_user.id)
+    return _token_response(await _account(db, User.id == current_user.id))
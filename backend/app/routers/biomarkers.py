@@ -1,62 +1,184 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
+from pydantic import BaseModel
 from typing import List, Optional
+from datetime import datetime
 from app.database import get_db
-from app.models.models import Biomarker, User
-from app.utils.auth import get_current_user
+from app.models.models import Biomarker
+from app.utils.auth import get_current_principal, Principal
+from app.utils.conditional import conditional_get
+from app.utils.responses import trusted_json
+from app.utils.pagination import paginate, stream_rows, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER
 from app.services.analytics_service import (
     forecast_biomarker,
     compute_risk_scores,
-    detect_anomalies,
+    build_dashboard,
+    forecast_all_biomarkers,
 )
+from app.services.stats_service import query_anomalies, stats_summary
+from app.services.biomarker_codes import biomarker_code
 
 router = APIRouter()
 
+MAX_SPARKLINE_POINTS = 500
 
-@router.get("/")
+
+class BiomarkerOut(BaseModel):
+    id: int
+    name: str
+    code: Optional[str] = None
+    value: float
+    unit: Optional[str] = None
+    ref_min: Optional[float] = None
+    ref_max: Optional[float] = None
+    recorded_at: Optional[datetime] = None
+    report_id: int
+
+
+LISTING_COLUMNS = (
+    Biomarker.id,
+    Biomarker.name,
+    Biomarker.code,
+    Biomarker.value,
+    Biomarker.unit,
+    Biomarker.ref_min,
+    Biomarker.ref_max,
+    Biomarker.recorded_at,
+    Biomarker.report_id,
+)
+
+
+def _serialize_biomarker(b) -> dict:
+    return {
+        "id": b.id,
+        "name": b.name,
+        "code": b.code,
+        "value": b.value,
+        "unit": b.unit,
+        "ref_min": b.ref_min,
+        "ref_max": b.ref_max,
+        "recorded_at": b.recorded_at,
+        "report_id": b.report_id,
+    }
+
+
+@router.get("/", response_model=List[BiomarkerOut], dependencies=[Depends(conditional_get("biomarkers"))])
 def get_biomarkers(
+    response: Response,
     name: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    stream: Optional[str] = Query(None, pattern="^(ndjson|json)$"),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
 ):
-    query = db.query(Biomarker).filter(Biomarker.user_id == current_user.id)
-    if name:
-        query = query.filter(Biomarker.name.ilike(f"%{name}%"))
-    biomarkers = query.order_by(Biomarker.recorded_at.asc()).all()
-    return [
-        {
-            "id": b.id,
-            "name": b.name,
-            "value": b.value,
-            "unit": b.unit,
-            "ref_min": b.ref_min,
-            "ref_max": b.ref_max,
-            "recorded_at": b.recorded_at,
-            "report_id": b.report_id,
-        }
-        for b in biomarkers
-    ]
-
-
-@router.get("/names")
+    user_id = current_user.id
+    code = biomarker_code(name) if name else None
+
+    def build_query(session):
+        query = session.query(*LISTING_COLUMNS).filter(Biomarker.user_id == user_id)
+        if code:
+            query = query.filter(Biomarker.code == code)
+        return query
+
+    if stream:
+        return stream_rows(
+            lambda session: build_query(session).order_by(Biomarker.recorded_at.asc(), Biomarker.id.asc()),
+            _serialize_biomarker,
+            stream,
+        )
+    if limit or cursor:
+        biomarkers, next_cursor = paginate(
+            build_query(db), Biomarker.recorded_at, Biomarker.id, cursor, limit or MAX_PAGE_SIZE
+        )
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    else:
+        biomarkers = build_query(db).order_by(Biomarker.recorded_at.asc(), Biomarker.id.asc()).all()
+    return trusted_json([_serialize_biomarker(b) for b in biomarkers], response)
+
+
+@router.get("/dashboard", dependencies=[Depends(conditional_get("biomarkers"))])
+def get_dashboard(
+    name: Optional[str] = None,
+    sparkline_points: int = Query(12, ge=1, le=MAX_SPARKLINE_POINTS),
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal),
+):
+    # Load the history once as plain column rows (no ORM identity map) and
+    # derive names, latest values, risk and forecast from it; anomalies come
+    # from the maintained stats table.
+    rows = (
+        db.query(
+            Biomarker.id,
+            Biomarker.name,
+            Biomarker.code,
+            Biomarker.value,
+            Biomarker.unit,
+            Biomarker.ref_min,
+            Biomarker.ref_max,
+            Biomarker.recorded_at,
+            Biomarker.report_id,
+        )
+        .filter(Biomarker.user_id == current_user.id)
+        .order_by(Biomarker.recorded_at.asc(), Biomarker.id.asc())
+        .all()
+    )
+    return build_dashboard(rows, query_anomalies(db, current_user.id), selected=name, sparkline_points=sparkline_points)
+
+
+@router.get("/names", dependencies=[Depends(conditional_get("biomarkers"))])
 def get_biomarker_names(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
 ):
-    from sqlalchemy import distinct
-    names = db.query(distinct(Biomarker.name)).filter(Biomarker.user_id == current_user.id).all()
-    return [n[0] for n in names]
+    from sqlalchemy import func
+    # One row per spelling; rows not yet backfilled (NULL code) are grouped by
+    # the code of their name, and each series shows its most recent spelling,
+    # as on the dashboard.
+    spellings = (
+        db.query(Biomarker.code, Biomarker.name, func.max(Biomarker.recorded_at), func.max(Biomarker.id))
+        .filter(Biomarker.user_id == current_user.id)
+        .group_by(Biomarker.code, Biomarker.name)
+        .all()
+    )
+    display = {}
+    for code, name, last_recorded, last_id in sorted(spellings, key=lambda s: (s[2] or datetime.min, s[3])):
+        display[code or biomarker_code(name)] = name
+    return list(display.values())
 
 
-@router.get("/forecast/{biomarker_name}")
+@router.get("/forecast", dependencies=[Depends(conditional_get("biomarkers"))])
+def get_all_forecasts(
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal),
+):
+    rows = (
+        db.query(
+            Biomarker.id,
+            Biomarker.name,
+            Biomarker.code,
+            Biomarker.value,
+            Biomarker.ref_min,
+            Biomarker.ref_max,
+            Biomarker.recorded_at,
+        )
+        .filter(Biomarker.user_id == current_user.id)
+        .order_by(Biomarker.recorded_at.asc(), Biomarker.id.asc())
+        .all()
+    )
+    return forecast_all_biomarkers(rows)
+
+
+@router.get("/forecast/{biomarker_name}", dependencies=[Depends(conditional_get("biomarkers"))])
 def get_forecast(
     biomarker_name: str,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
 ):
     biomarkers = (
         db.query(Biomarker)
-        .filter(Biomarker.user_id == current_user.id, Biomarker.name.ilike(f"%{biomarker_name}%"))
+        .filter(Biomarker.user_id == current_user.id, Biomarker.code == biomarker_code(biomarker_name))
         .order_by(Biomarker.recorded_at.asc())
         .all()
     )
@@ -66,19 +188,26 @@ def get_forecast(
     return forecast_biomarker(biomarkers)
 
 
-@router.get("/risk-scores")
+@router.get("/risk-scores", dependencies=[Depends(conditional_get("biomarkers"))])
 def get_risk_scores(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
 ):
     biomarkers = db.query(Biomarker).filter(Biomarker.user_id == current_user.id).order_by(Biomarker.recorded_at.desc()).all()
     return compute_risk_scores(biomarkers)
 
 
-@router.get("/anomalies")
+@router.get("/anomalies", dependencies=[Depends(conditional_get("biomarkers"))])
 def get_anomalies(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
+):
+    return query_anomalies(db, current_user.id)
+
+
+@router.get("/stats", dependencies=[Depends(conditional_get("biomarkers"))])
+def get_stats(
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal),
 ):
-    biomarkers = db.query(Biomarker).filter(Biomarker.user_id == current_user.id).order_by(Biomarker.recorded_at.asc()).all()
-    return detect_anomalies(biomarkers)
+    return stats_summary(db, current_user.id)
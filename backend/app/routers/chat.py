@@ -1,10 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+import asyncio
+import json
+import logging
+import time
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
-from app.database import get_db
-from app.models.models import User, Biomarker, Report
-from app.utils.auth import get_current_user
-from app.ai.rag_service import get_rag_answer
+from app.database import get_async_db
+from app.utils.auth import get_current_principal, Principal
+from app.ai.rag_service import get_rag_answer, stream_rag_answer
+from app.ai.report_index import report_index
+from app.ai.context_cache import context_cache
+
+logger = logging.getLogger("chat")
 
 router = APIRouter()
 
@@ -14,41 +22,28 @@ class ChatRequest(BaseModel):
     doctor_mode: bool = False
 
 
+async def _gather_context(db: AsyncSession, user_id: int, question: str):
+    # Biomarkers, medicines and logs as compact text, reused until the user's data changes
+    health_context = await db.run_sync(context_cache.get, user_id)
+    # Return the connection to the pool before the (long) model call
+    await db.close()
+    # Only the report passages relevant to the question, not whole reports
+    hits = await asyncio.to_thread(report_index.search, user_id, question)
+    return health_context, [hit["text"] for hit in hits]
+
+
 @router.post("/")
 async def chat(
     req: ChatRequest,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal),
 ):
-    # Gather biomarker context
-    biomarkers = (
-        db.query(Biomarker)
-        .filter(Biomarker.user_id == current_user.id)
-        .order_by(Biomarker.recorded_at.desc())
-        .limit(100)
-        .all()
-    )
-
-    # Gather report texts
-    reports = db.query(Report).filter(Report.user_id == current_user.id).order_by(Report.uploaded_at.desc()).limit(5).all()
-    report_texts = [r.extracted_text for r in reports if r.extracted_text]
-
-    biomarker_context = [
-        {
-            "name": b.name,
-            "value": b.value,
-            "unit": b.unit,
-            "ref_min": b.ref_min,
-            "ref_max": b.ref_max,
-            "recorded_at": b.recorded_at.isoformat() if b.recorded_at else None,
-        }
-        for b in biomarkers
-    ]
+    health_context, report_texts = await _gather_context(db, current_user.id, req.message)
 
     try:
         answer = await get_rag_answer(
             question=req.message,
-            biomarker_context=biomarker_context,
+            health_context=health_context,
             report_texts=report_texts,
             doctor_mode=req.doctor_mode,
         )
@@ -57,3 +52,52 @@ async def chat(
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.post("/stream")
+async def chat_stream(
+    req: ChatRequest,
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal),
+):
+    """Server-sent events: `token` events as text arrives, then `done` with timings (or `error`)."""
+    health_context, report_texts = await _gather_context(db, current_user.id, req.message)
+
+    async def events():
+        started = time.perf_counter()
+        first_token_at = None
+        upstream = stream_rag_answer(
+            question=req.message,
+            health_context=health_context,
+            report_texts=report_texts,
+            doctor_mode=req.doctor_mode,
+        )
+        try:
+            async for text in upstream:
+                if await request.is_disconnected():
+                    logger.info("chat stream client disconnected; cancelling generation")
+                    return
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                yield _sse("token", {"text": text})
+            total_ms = round((time.perf_counter() - started) * 1000, 1)
+            ttft_ms = round((first_token_at - started) * 1000, 1) if first_token_at else None
+            logger.info("chat stream ttft_ms=%s total_ms=%s", ttft_ms, total_ms)
+            yield _sse("done", {"ttft_ms": ttft_ms, "total_ms": total_ms})
+        except Exception as e:
+            logger.exception("chat stream failed")
+            yield _sse("error", {"detail": str(e)})
+        finally:
+            # Closing the generator tears down the upstream model stream as well.
+            await upstream.aclose()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
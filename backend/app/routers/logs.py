@@ -1,11 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
-from app.database import get_db
-from app.models.models import ManualLog, User
-from app.utils.auth import get_current_user
+from app.database import get_db, get_async_db
+from app.models.models import ManualLog
+from app.utils.auth import get_current_principal, Principal
+from app.utils.conditional import conditional_get
+from app.utils.responses import trusted_json
+from app.utils.pagination import paginate, stream_rows, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER
+from app.services.version_service import bump_data_version
+from app.services.log_import_service import import_logs, LogImportError
+from app.services.rollup_service import add_to_rollups, remove_from_rollups, query_rollups, naive_utc, raw_log_cutoff
 
 router = APIRouter()
 
@@ -20,7 +27,12 @@ class LogCreate(BaseModel):
 
 
 @router.post("/")
-def create_log(data: LogCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def create_log(data: LogCreate, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_principal)):
+    logged_at = naive_utc(data.logged_at) if data.logged_at else datetime.utcnow()
+    cutoff = raw_log_cutoff()
+    if cutoff is not None and logged_at < cutoff:
+        # Its bucket's raw rows may already be gone; see log_import_service._validate.
+        raise HTTPException(status_code=422, detail=f"logged_at is before the raw log retention cut-off ({cutoff.isoformat()})")
     log = ManualLog(
         user_id=current_user.id,
         log_type=data.log_type,
@@ -28,43 +40,127 @@ def create_log(data: LogCreate, db: Session = Depends(get_db), current_user: Use
         value2=data.value2,
         unit=data.unit,
         notes=data.notes,
-        logged_at=data.logged_at or datetime.utcnow(),
+        logged_at=logged_at,
     )
     db.add(log)
+    add_to_rollups(db, [(current_user.id, log.log_type, log.logged_at, log.value, log.value2)])
+    bump_data_version(db, current_user.id, "logs")
     db.commit()
     db.refresh(log)
     return {"id": log.id, "message": "Log created"}
 
 
-@router.get("/")
+@router.post("/bulk")
+async def bulk_import_logs(
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(csv|ndjson)$"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal),
+):
+    """Import many logs from a CSV (with header row) or NDJSON body.
+
+    The format comes from ?format= or the Content-Type. Each batch is
+    committed separately and reported with its inserted, duplicate and
+    rejected counts; rows whose idempotency_key was already imported are
+    skipped, so a failed upload can simply be sent again.
+    """
+    content_type = request.headers.get("content-type", "")
+    fmt = format or ("ndjson" if "ndjson" in content_type or "jsonlines" in content_type else "csv" if "csv" in content_type else None)
+    if fmt is None:
+        raise HTTPException(status_code=415, detail="Send text/csv or application/x-ndjson, or pass ?format=")
+    try:
+        return await import_logs(db, current_user.id, request.stream(), fmt)
+    except LogImportError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+class LogOut(BaseModel):
+    id: int
+    log_type: str
+    value: float
+    value2: Optional[float] = None
+    unit: Optional[str] = None
+    notes: Optional[str] = None
+    logged_at: Optional[datetime] = None
+
+
+LISTING_COLUMNS = (
+    ManualLog.id,
+    ManualLog.log_type,
+    ManualLog.value,
+    ManualLog.value2,
+    ManualLog.unit,
+    ManualLog.notes,
+    ManualLog.logged_at,
+)
+
+
+def _serialize_log(l) -> dict:
+    return {
+        "id": l.id,
+        "log_type": l.log_type,
+        "value": l.value,
+        "value2": l.value2,
+        "unit": l.unit,
+        "notes": l.notes,
+        "logged_at": l.logged_at,
+    }
+
+
+@router.get("/", response_model=List[LogOut], dependencies=[Depends(conditional_get("logs"))])
 def get_logs(
+    response: Response,
     log_type: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    stream: Optional[str] = Query(None, pattern="^(ndjson|json)$"),
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal),
+):
+    user_id = current_user.id
+
+    def build_query(session):
+        query = session.query(*LISTING_COLUMNS).filter(ManualLog.user_id == user_id)
+        if log_type:
+            query = query.filter(ManualLog.log_type == log_type)
+        return query
+
+    if stream:
+        return stream_rows(
+            lambda session: build_query(session).order_by(ManualLog.logged_at.asc(), ManualLog.id.asc()),
+            _serialize_log,
+            stream,
+        )
+    if limit or cursor:
+        logs, next_cursor = paginate(build_query(db), ManualLog.logged_at, ManualLog.id, cursor, limit or MAX_PAGE_SIZE)
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    else:
+        logs = build_query(db).order_by(ManualLog.logged_at.asc(), ManualLog.id.asc()).all()
+    return trusted_json([_serialize_log(l) for l in logs], response)
+
+
+@router.get("/rollups", dependencies=[Depends(conditional_get("logs"))])
+def get_log_rollups(
+    log_type: str,
+    granularity: str = Query("day", pattern="^(hour|day|week)$"),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
 ):
-    query = db.query(ManualLog).filter(ManualLog.user_id == current_user.id)
-    if log_type:
-        query = query.filter(ManualLog.log_type == log_type)
-    logs = query.order_by(ManualLog.logged_at.asc()).all()
-    return [
-        {
-            "id": l.id,
-            "log_type": l.log_type,
-            "value": l.value,
-            "value2": l.value2,
-            "unit": l.unit,
-            "notes": l.notes,
-            "logged_at": l.logged_at,
-        }
-        for l in logs
-    ]
+    """Per-bucket count, mean, std, min and max (and the same for value2), read from the rollup table."""
+    return query_rollups(db, current_user.id, log_type, granularity, start, end)
 
 
 @router.delete("/{log_id}")
-def delete_log(log_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def delete_log(log_id: int, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_principal)):
     log = db.query(ManualLog).filter(ManualLog.id == log_id, ManualLog.user_id == current_user.id).first()
     if not log:
         raise HTTPException(status_code=404, detail="Log not found")
     db.delete(log)
+    db.flush()
+    remove_from_rollups(db, current_user.id, log.log_type, log.logged_at)
+    bump_data_version(db, current_user.id, "logs")
     db.commit()
     return {"message": "Deleted"}
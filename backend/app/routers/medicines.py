@@ -1,15 +1,28 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
-from typing import Optional
-from datetime import date
+from typing import List, Optional
+from datetime import date, datetime, time, timedelta
 from app.database import get_db
-from app.models.models import Medicine, User
-from app.utils.auth import get_current_user
+from app.models.models import Biomarker, Medicine
+from app.utils.auth import get_current_principal, Principal
+from app.utils.conditional import conditional_get
+from app.services.version_service import bump_data_version
+from app.services.medication_effects import EFFECT_WINDOW_DAYS, annotated_points, medication_effects
+from app.utils.responses import trusted_json
 
 router = APIRouter()
 
 
+class MedicineOut(BaseModel):
+    id: int
+    drug_name: str
+    dosage: Optional[str] = None
+    start_date: date
+    end_date: Optional[date] = None
+    notes: Optional[str] = None
+
+
 class MedicineCreate(BaseModel):
     drug_name: str
     dosage: Optional[str] = None
@@ -19,35 +32,97 @@ class MedicineCreate(BaseModel):
 
 
 @router.post("/")
-def create_medicine(data: MedicineCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def create_medicine(data: MedicineCreate, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_principal)):
     med = Medicine(user_id=current_user.id, **data.dict())
     db.add(med)
+    bump_data_version(db, current_user.id, "medicines")
     db.commit()
     db.refresh(med)
     return {"id": med.id, "message": "Medicine added"}
 
 
-@router.get("/")
-def get_medicines(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+@router.get("/", response_model=List[MedicineOut], dependencies=[Depends(conditional_get("medicines"))])
+def get_medicines(db: Session = Depends(get_db), current_user: Principal = Depends(get_current_principal)):
     meds = db.query(Medicine).filter(Medicine.user_id == current_user.id).order_by(Medicine.start_date.asc()).all()
-    return [
-        {
-            "id": m.id,
-            "drug_name": m.drug_name,
-            "dosage": m.dosage,
-            "start_date": m.start_date,
-            "end_date": m.end_date,
-            "notes": m.notes,
-        }
-        for m in meds
-    ]
+    return [_serialize_medicine(m) for m in meds]
+
+
+def _serialize_medicine(m) -> dict:
+    return {
+        "id": m.id,
+        "drug_name": m.drug_name,
+        "dosage": m.dosage,
+        "start_date": m.start_date,
+        "end_date": m.end_date,
+        "notes": m.notes,
+    }
+
+
+def _load_effect_inputs(db: Session, user_id: int) -> tuple:
+    medicines = (
+        db.query(Medicine.id, Medicine.drug_name, Medicine.dosage, Medicine.start_date, Medicine.end_date, Medicine.notes)
+        .filter(Medicine.user_id == user_id)
+        .order_by(Medicine.start_date.asc(), Medicine.id.asc())
+        .all()
+    )
+    biomarkers = (
+        db.query(Biomarker.id, Biomarker.name, Biomarker.code, Biomarker.value, Biomarker.unit, Biomarker.recorded_at)
+        .filter(Biomarker.user_id == user_id, Biomarker.recorded_at.isnot(None))
+        .order_by(Biomarker.recorded_at.asc(), Biomarker.id.asc())
+        .all()
+    )
+    return medicines, biomarkers
+
+
+@router.get("/effects", dependencies=[Depends(conditional_get("medicines", "biomarkers"))])
+def get_all_medication_effects(
+    response: Response,
+    window_days: int = Query(EFFECT_WINDOW_DAYS, ge=7, le=3650),
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal),
+):
+    medicines, biomarkers = _load_effect_inputs(db, current_user.id)
+    effects = medication_effects(biomarkers, medicines, window_days)
+    return trusted_json({
+        "window_days": window_days,
+        "medicines": [{**_serialize_medicine(m), "effects": effects[m.id]} for m in medicines],
+        "points": annotated_points(biomarkers, medicines),
+    }, response)
+
+
+@router.get("/{med_id}/effects", dependencies=[Depends(conditional_get("medicines", "biomarkers"))])
+def get_medication_effects(
+    med_id: int,
+    response: Response,
+    window_days: int = Query(EFFECT_WINDOW_DAYS, ge=7, le=3650),
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal),
+):
+    medicines, biomarkers = _load_effect_inputs(db, current_user.id)
+    med = next((m for m in medicines if m.id == med_id), None)
+    if med is None:
+        raise HTTPException(status_code=404, detail="Medicine not found")
+
+    # Annotate against every medicine so overlapping courses show up, but
+    # only return the points inside this medicine's analysis window.
+    window_end = med.start_date + timedelta(days=window_days)
+    lo = datetime.combine(med.start_date - timedelta(days=window_days), time.min)
+    hi = datetime.combine(min(med.end_date, window_end) if med.end_date else window_end, time.max)
+    points = [p for p in annotated_points(biomarkers, medicines) if lo <= p["recorded_at"] <= hi]
+    return trusted_json({
+        "medicine": _serialize_medicine(med),
+        "window_days": window_days,
+        "effects": medication_effects(biomarkers, [med], window_days)[med.id],
+        "points": points,
+    }, response)
 
 
 @router.delete("/{med_id}")
-def delete_medicine(med_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def delete_medicine(med_id: int, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_principal)):
     med = db.query(Medicine).filter(Medicine.id == med_id, Medicine.user_id == current_user.id).first()
     if not med:
         raise HTTPException(status_code=404, detail="Medicine not found")
     db.delete(med)
+    bump_data_version(db, current_user.id, "medicines")
     db.commit()
     return {"message": "Deleted"}
@@ -1,94 +1,176 @@
-import os
-import json
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query, Response
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
+from pydantic import BaseModel
 from datetime import datetime
-from app.database import get_db
-from app.models.models import Report, Biomarker, User
-from app.utils.auth import get_current_user
-from app.services.pdf_service import extract_text_from_pdf
-from app.ai.openai_service import extract_biomarkers_from_text
+from app.database import get_db, get_async_db
+from app.models.models import Report, Biomarker, IngestionJob
+from app.utils.auth import get_current_principal, Principal
+from app.utils.conditional import conditional_get
+from app.utils.responses import trusted_json
+from app.utils.pagination import paginate, stream_rows, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER
+from app.services.stats_service import remove_from_stats
+from app.services.version_service import bump_data_version
+from app.services.ingestion_service import ingestion_pool, serialize_job, find_ingested_report, copy_report_results
+from app.services.storage_service import (
+    save_upload, place_upload, discard_upload, blob_path, release_file, UploadTooLarge,
+)
+from app.ai.report_index import index_report_safely, unindex_report_safely
 
 router = APIRouter()
 
-UPLOAD_DIR = os.getenv("UPLOAD_DIR", "./uploads")
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+def _register_upload(db: Session, user_id: int, filename: str, digest: str, file_path: str) -> dict:
+    """Create the report row, then either reuse an earlier ingestion of the same PDF or queue a job."""
+    report = Report(
+        user_id=user_id,
+        filename=filename,
+        file_path=file_path,
+        content_hash=digest,
+        report_date=datetime.utcnow(),
+    )
+    db.add(report)
+    db.flush()
+
+    # Same PDF already ingested for this user: reuse its text and biomarkers,
+    # no parsing or LLM call.
+    source = find_ingested_report(db, user_id, digest)
+    if source is not None:
+        inserted, anomalies = copy_report_results(db, source, report)
+        db.commit()
+        return {
+            "report_id": report.id,
+            "job_id": None,
+            "filename": filename,
+            "status": "done",
+            "deduplicated": True,
+            "biomarkers_extracted": len(inserted),
+            "anomalies": anomalies,
+            "_text": report.extracted_text,
+        }
+
+    job = IngestionJob(user_id=user_id, report_id=report.id)
+    db.add(job)
+    bump_data_version(db, user_id, "reports")
+    db.commit()
+    return {"report_id": report.id, "job_id": job.id, "filename": filename, "status": job.status, "deduplicated": False}
 
 
 @router.post("/upload")
 async def upload_report(
     file: UploadFile = File(...),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal),
 ):
     if not file.filename.lower().endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Only PDF files supported")
 
-    file_path = os.path.join(UPLOAD_DIR, f"{current_user.id}_{datetime.utcnow().timestamp()}_{file.filename}")
-    with open(file_path, "wb") as f:
-        f.write(await file.read())
+    try:
+        digest, staged_path, _ = await save_upload(file)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
 
-    extracted_text = extract_text_from_pdf(file_path)
+    try:
+        result = await db.run_sync(_register_upload, current_user.id, file.filename, digest, blob_path(digest))
+    except BaseException:
+        discard_upload(staged_path)
+        raise
+    place_upload(digest, staged_path)
+    if result["deduplicated"]:
+        await asyncio.to_thread(index_report_safely, current_user.id, result["report_id"], result.pop("_text"))
+    else:
+        # Extraction, the LLM call and biomarker inserts run in the ingestion
+        # workers; poll /reports/jobs/{job_id} for progress.
+        ingestion_pool.enqueue(result["job_id"])
+    return result
 
-    report = Report(
-        user_id=current_user.id,
-        filename=file.filename,
-        file_path=file_path,
-        extracted_text=extracted_text,
-        report_date=datetime.utcnow(),
+
+@router.get("/jobs/{job_id}")
+def get_job(job_id: int, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_principal)):
+    job = db.query(IngestionJob).filter(IngestionJob.id == job_id, IngestionJob.user_id == current_user.id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return serialize_job(job)
+
+
+def _report_listing(session, user_id: int):
+    """Reports with their biomarker counts from one grouped outer join."""
+    return (
+        session.query(
+            Report.id,
+            Report.filename,
+            Report.uploaded_at,
+            Report.report_date,
+            func.count(Biomarker.id).label("biomarker_count"),
+        )
+        .outerjoin(Biomarker, Biomarker.report_id == Report.id)
+        .filter(Report.user_id == user_id)
+        .group_by(Report.id, Report.filename, Report.uploaded_at, Report.report_date)
     )
-    db.add(report)
-    db.commit()
-    db.refresh(report)
 
-    # Extract biomarkers via OpenAI
-    try:
-        biomarkers_data = await extract_biomarkers_from_text(extracted_text)
-        for b in biomarkers_data:
-            try:
-                biomarker = Biomarker(
-                    report_id=report.id,
-                    user_id=current_user.id,
-                    name=b.get("name", "Unknown"),
-                    value=float(b.get("value", 0)),
-                    unit=b.get("unit", ""),
-                    ref_min=float(b["ref_min"]) if b.get("ref_min") not in [None, ""] else None,
-                    ref_max=float(b["ref_max"]) if b.get("ref_max") not in [None, ""] else None,
-                    recorded_at=report.report_date,
-                )
-                db.add(biomarker)
-            except (ValueError, TypeError):
-                continue
-        db.commit()
-    except Exception as e:
-        # Don't fail if AI extraction fails
-        pass
-
-    return {"report_id": report.id, "filename": file.filename, "biomarkers_extracted": len(biomarkers_data) if 'biomarkers_data' in dir() else 0}
-
-
-@router.get("/")
-def list_reports(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    reports = db.query(Report).filter(Report.user_id == current_user.id).order_by(Report.uploaded_at.desc()).all()
-    return [
-        {
-            "id": r.id,
-            "filename": r.filename,
-            "uploaded_at": r.uploaded_at,
-            "report_date": r.report_date,
-            "biomarker_count": db.query(Biomarker).filter(Biomarker.report_id == r.id).count(),
-        }
-        for r in reports
-    ]
+
+class ReportOut(BaseModel):
+    id: int
+    filename: str
+    uploaded_at: Optional[datetime] = None
+    report_date: Optional[datetime] = None
+    biomarker_count: int
+
+
+def _serialize_report(r) -> dict:
+    return {
+        "id": r.id,
+        "filename": r.filename,
+        "uploaded_at": r.uploaded_at,
+        "report_date": r.report_date,
+        "biomarker_count": r.biomarker_count,
+    }
+
+
+@router.get("/", response_model=List[ReportOut], dependencies=[Depends(conditional_get("reports", "biomarkers"))])
+def list_reports(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    stream: Optional[str] = Query(None, pattern="^(ndjson|json)$"),
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal),
+):
+    user_id = current_user.id
+    if stream:
+        return stream_rows(
+            lambda session: _report_listing(session, user_id).order_by(Report.uploaded_at.desc(), Report.id.desc()),
+            _serialize_report,
+            stream,
+        )
+    if limit or cursor:
+        reports, next_cursor = paginate(
+            _report_listing(db, user_id), Report.uploaded_at, Report.id, cursor, limit or MAX_PAGE_SIZE, descending=True
+        )
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    else:
+        reports = _report_listing(db, user_id).order_by(Report.uploaded_at.desc(), Report.id.desc()).all()
+    return trusted_json([_serialize_report(r) for r in reports], response)
 
 
 @router.delete("/{report_id}")
-def delete_report(report_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def delete_report(report_id: int, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_principal)):
     report = db.query(Report).filter(Report.id == report_id, Report.user_id == current_user.id).first()
     if not report:
         raise HTTPException(status_code=404, detail="Report not found")
+    removed = db.query(Biomarker.code, Biomarker.value).filter(Biomarker.report_id == report_id).all()
     db.query(Biomarker).filter(Biomarker.report_id == report_id).delete()
+    db.flush()
+    remove_from_stats(db, current_user.id, [(r.code, r.value) for r in removed])
+    db.query(IngestionJob).filter(IngestionJob.report_id == report_id).update({IngestionJob.report_id: None})
+    content_hash, file_path = report.content_hash, report.file_path
     db.delete(report)
+    bump_data_version(db, current_user.id, "reports", "biomarkers")
     db.commit()
+    unindex_report_safely(current_user.id, report_id)
+    release_file(db, content_hash, file_path)
     return {"message": "Deleted"}
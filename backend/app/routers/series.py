@@ -0,0 +1,52 @@
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, Depends, Query, Response
+from sqlalchemy.orm import Session
+from app.database import get_db
+from app.models.models import Biomarker, ManualLog
+from app.utils.auth import get_current_principal, Principal
+from app.utils.conditional import conditional_get
+from app.utils.responses import trusted_json
+from app.services.biomarker_codes import biomarker_code
+from app.services.series_service import build_series, MAX_SERIES_POINTS
+
+router = APIRouter()
+
+METHOD_PATTERN = "^(lttb|buckets)$"
+
+
+@router.get("/logs", dependencies=[Depends(conditional_get("logs"))])
+def get_log_series(
+    response: Response,
+    log_type: str,
+    points: int = Query(500, ge=3, le=MAX_SERIES_POINTS),
+    method: str = Query("lttb", pattern=METHOD_PATTERN),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal),
+):
+    """Chart-sized series for one log type; value2 (diastolic) is reduced alongside value."""
+    return trusted_json(build_series(
+        db, ManualLog.logged_at, ManualLog.value, ManualLog.value2,
+        [ManualLog.user_id == current_user.id, ManualLog.log_type == log_type],
+        method, points, start, end,
+    ), response)
+
+
+@router.get("/biomarkers", dependencies=[Depends(conditional_get("biomarkers"))])
+def get_biomarker_series(
+    response: Response,
+    name: str,
+    points: int = Query(500, ge=3, le=MAX_SERIES_POINTS),
+    method: str = Query("lttb", pattern=METHOD_PATTERN),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal),
+):
+    return trusted_json(build_series(
+        db, Biomarker.recorded_at, Biomarker.value, None,
+        [Biomarker.user_id == current_user.id, Biomarker.code == biomarker_code(name)],
+        method, points, start, end,
+    ), response)
@@ -1,42 +1,34 @@
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.database import get_db
-from app.models.models import User, Biomarker
-from app.utils.auth import get_current_user
-from app.ai.openai_service import generate_health_summary
+from app.database import get_db, get_async_db
+from app.utils.auth import get_current_principal, Principal
+from app.services.summary_service import get_or_generate_summary, get_stored_summary, serialize_summary, NoBiomarkerData
 
 router = APIRouter()
 
 
+@router.get("/")
+def get_summary(db: Session = Depends(get_db), current_user: Principal = Depends(get_current_principal)):
+    stored = get_stored_summary(db, current_user.id)
+    if stored is None:
+        raise HTTPException(status_code=404, detail="No summary generated yet")
+    return serialize_summary(stored, cached=True)
+
+
 @router.post("/generate")
 async def generate_summary(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    force: bool = False,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal),
 ):
-    biomarkers = (
-        db.query(Biomarker)
-        .filter(Biomarker.user_id == current_user.id)
-        .order_by(Biomarker.recorded_at.asc())
-        .all()
-    )
-
-    if not biomarkers:
-        raise HTTPException(status_code=400, detail="No biomarker data available")
-
-    biomarker_data = [
-        {
-            "name": b.name,
-            "value": b.value,
-            "unit": b.unit,
-            "ref_min": b.ref_min,
-            "ref_max": b.ref_max,
-            "recorded_at": b.recorded_at.isoformat() if b.recorded_at else None,
-        }
-        for b in biomarkers
-    ]
+    """Return the stored summary if the data is unchanged; otherwise update or rebuild it.
 
+    `force=true` always rebuilds from the full history.
+    """
     try:
-        summary = await generate_health_summary(biomarker_data)
-        return summary
+        return await get_or_generate_summary(db, current_user.id, force=force)
+    except NoBiomarkerData:
+        raise HTTPException(status_code=400, detail="No biomarker data available")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
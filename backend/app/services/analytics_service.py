@@ -2,6 +2,7 @@ import numpy as np
 from typing import List
 from datetime import datetime, timedelta
 from collections import defaultdict
+from app.services.biomarker_codes import biomarker_code
 
 
 def forecast_biomarker(biomarkers: list) -> dict:
@@ -49,31 +50,112 @@ def forecast_biomarker(biomarkers: list) -> dict:
                 break
 
     return {
-        "historical": [{"date": b.recorded_at.isoformat(), "value": b.value} for b in biomarkers],
+        "historical": [{"id": b.id, "date": b.recorded_at.isoformat(), "value": b.value} for b in biomarkers],
         "forecast": future_points,
         "slope": round(slope, 6),
         "warning": warning,
     }
 
 
+def _last_set_per_segment(values: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """Last non-null, non-zero value in each contiguous segment (NaN if none)."""
+    idx = np.arange(len(values))
+    valid = ~np.isnan(values) & (values != 0)
+    last_idx = np.maximum.reduceat(np.where(valid, idx, -1), starts)
+    out = np.full(len(starts), np.nan)
+    found = last_idx >= 0
+    out[found] = values[last_idx[found]]
+    return out
+
+
+def forecast_all_biomarkers(biomarkers: list, horizon: int = 3) -> dict:
+    """Forecast every biomarker series at once.
+
+    Series are laid out back to back in flat arrays and each least-squares
+    line is solved in closed form with segmented reductions, so the cost is a
+    handful of NumPy passes regardless of how many markers a user tracks.
+    Results match `forecast_biomarker` for each series. Expects rows ordered
+    by recorded_at ascending.
+    """
+    grouped = {code: items for code, items in group_by_code(biomarkers).items() if len(items) >= 2}
+    if not grouped:
+        return {}
+
+    codes = list(grouped.keys())
+    rows = [b for code in codes for b in grouped[code]]
+    counts = np.array([len(grouped[code]) for code in codes])
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    ends = starts + counts - 1
+    seg = np.repeat(np.arange(len(codes)), counts)
+
+    x = np.array([b.recorded_at.timestamp() for b in rows])
+    y = np.array([b.value for b in rows], dtype=float)
+    ref_max_col = np.array([b.ref_max if b.ref_max is not None else np.nan for b in rows], dtype=float)
+    ref_min_col = np.array([b.ref_min if b.ref_min is not None else np.nan for b in rows], dtype=float)
+
+    # Centre x per series for a numerically stable closed-form fit.
+    x_norm = x - np.minimum.reduceat(x, starts)[seg]
+    x_mean = np.add.reduceat(x_norm, starts) / counts
+    y_mean = np.add.reduceat(y, starts) / counts
+    xc = x_norm - x_mean[seg]
+    sxx = np.add.reduceat(xc * xc, starts)
+    sxy = np.add.reduceat(xc * y, starts)
+    slope = np.divide(sxy, sxx, out=np.zeros_like(sxy), where=sxx != 0)
+    intercept = y_mean - slope * x_mean
+
+    avg_gap = (x[ends] - x[starts]) / np.maximum(counts - 1, 1)
+    steps = np.arange(1, horizon + 1)
+    future_x = x_norm[ends][:, None] + avg_gap[:, None] * steps
+    predicted = np.round(slope[:, None] * future_x + intercept[:, None], 2)
+
+    ref_max = _last_set_per_segment(ref_max_col, starts)
+    ref_min = _last_set_per_segment(ref_min_col, starts)
+    exceeds = np.where(np.isnan(ref_max), False, (predicted > ref_max[:, None]).any(axis=1))
+    drops = np.where(np.isnan(ref_min), False, (predicted < ref_min[:, None]).any(axis=1))
+
+    results = {}
+    for i, code in enumerate(codes):
+        items = grouped[code]
+        last_date = items[-1].recorded_at
+        warning = None
+        if exceeds[i]:
+            warning = f"Forecast suggests value may exceed upper reference limit ({float(ref_max[i])})"
+        elif drops[i]:
+            warning = f"Forecast suggests value may drop below lower reference limit ({float(ref_min[i])})"
+        results[items[-1].name] = {
+            "code": code,
+            "historical": [{"id": b.id, "date": b.recorded_at.isoformat(), "value": b.value} for b in items],
+            "forecast": [
+                {
+                    "date": (last_date + timedelta(seconds=float(avg_gap[i]) * int(step))).isoformat(),
+                    "value": float(predicted[i, j]),
+                }
+                for j, step in enumerate(steps)
+            ],
+            "slope": round(float(slope[i]), 6),
+            "warning": warning,
+        }
+    return results
+
+
 def compute_risk_scores(biomarkers: list) -> dict:
     """Compute diabetes risk score and cardiovascular risk score."""
-    # Get latest value for each biomarker name
+    # Get latest value for each biomarker code
     latest = {}
     for b in biomarkers:
-        if b.name not in latest or b.recorded_at > latest[b.name].recorded_at:
-            latest[b.name] = b
-
-    def get_val(names):
-        for n in names:
-            for key in latest:
-                if n.lower() in key.lower():
-                    return latest[key].value
+        code = series_code(b)
+        if code not in latest or b.recorded_at > latest[code].recorded_at:
+            latest[code] = b
+
+    def get_val(codes):
+        for code in codes:
+            if code in latest:
+                return latest[code].value
         return None
 
     # Diabetes Risk
-    hba1c = get_val(["hba1c", "hemoglobin a1c"])
-    fasting_glucose = get_val(["fasting glucose", "glucose"])
+    hba1c = get_val(["hba1c"])
+    fasting_glucose = get_val(["fasting_glucose", "glucose"])
 
     diabetes_score = 0
     diabetes_factors = []
@@ -102,8 +184,8 @@ def compute_risk_scores(biomarkers: list) -> dict:
     # Cardio Risk
     ldl = get_val(["ldl"])
     hdl = get_val(["hdl"])
-    triglycerides = get_val(["triglyceride"])
-    bp_systolic = get_val(["systolic", "blood pressure"])
+    triglycerides = get_val(["triglycerides"])
+    bp_systolic = get_val(["systolic_bp"])
 
     cardio_score = 0
     cardio_factors = []
@@ -132,31 +214,75 @@ def compute_risk_scores(biomarkers: list) -> dict:
     }
 
 
-def detect_anomalies(biomarkers: list) -> list:
-    """Z-score based anomaly detection per biomarker type."""
+def series_code(b) -> str:
+    """Canonical code of a row, falling back to normalising its name."""
+    return getattr(b, "code", None) or biomarker_code(b.name)
+
+
+def group_by_code(biomarkers: list) -> dict:
+    """Group biomarker rows by canonical code, preserving input (recorded_at) order."""
     grouped = defaultdict(list)
     for b in biomarkers:
-        grouped[b.name].append(b)
-
-    anomalies = []
-    for name, items in grouped.items():
-        if len(items) < 3:
-            continue
-        values = np.array([b.value for b in items])
-        mean = np.mean(values)
-        std = np.std(values)
-        if std == 0:
-            continue
-        for b in items:
-            z = abs((b.value - mean) / std)
-            if z > 2.5:
-                anomalies.append({
-                    "biomarker_id": b.id,
-                    "name": name,
-                    "value": b.value,
-                    "z_score": round(z, 2),
-                    "recorded_at": b.recorded_at.isoformat(),
-                    "severity": "high" if z > 3 else "medium",
-                })
-
-    return anomalies
+        grouped[series_code(b)].append(b)
+    return grouped
+
+
+def build_dashboard(biomarkers: list, anomalies: list, selected: str = None, sparkline_points: int = 12) -> dict:
+    """Everything the dashboard renders, computed from one ascending biomarker load.
+
+    `biomarkers` may be ORM objects or lightweight column rows; only attribute
+    access is used, so callers should load just the columns they need.
+    `anomalies` comes from stats_service.query_anomalies, the same list
+    /biomarkers/anomalies returns.
+    """
+    grouped = group_by_code(biomarkers)
+    # Series are keyed by code; show each under its most recent spelling.
+    display = {code: items[-1].name for code, items in grouped.items()}
+    names = list(display.values())
+
+    latest = {}
+    sparklines = {}
+    for code, items in grouped.items():
+        name = display[code]
+        last = items[-1]
+        latest[name] = {
+            "code": code,
+            "id": last.id,
+            "value": last.value,
+            "unit": last.unit,
+            "ref_min": last.ref_min,
+            "ref_max": last.ref_max,
+            "recorded_at": last.recorded_at.isoformat() if last.recorded_at else None,
+        }
+        sparklines[name] = [b.value for b in items[-sparkline_points:]]
+
+    selected_code = biomarker_code(selected) if selected else None
+    if selected_code not in grouped:
+        selected_code = next(iter(grouped), None)
+
+    series = grouped.get(selected_code, [])
+    forecast = forecast_biomarker(series) if len(series) >= 2 else None
+
+    return {
+        "names": names,
+        "selected": display.get(selected_code),
+        "series": [
+            {
+                "id": b.id,
+                "name": b.name,
+                "code": selected_code,
+                "value": b.value,
+                "unit": b.unit,
+                "ref_min": b.ref_min,
+                "ref_max": b.ref_max,
+                "recorded_at": b.recorded_at,
+                "report_id": b.report_id,
+            }
+            for b in series
+        ],
+        "forecast": forecast,
+        "risk_scores": compute_risk_scores(biomarkers),
+        "anomalies": anomalies,
+        "latest": latest,
+        "sparklines": sparklines,
+    }
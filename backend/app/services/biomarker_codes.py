@@ -0,0 +1,84 @@
+import re
+
+# Canonical code -> known spellings. Spellings are normalised with
+# normalize_name() when the lookup table is built, so case, punctuation and
+# parenthetical qualifiers don't need to be listed. Bare symbols and
+# abbreviations that name several tests (na, k, ca, tc, a lone "blood
+# pressure") are left out: a series split across two codes is better than
+# unrelated tests merged into one.
+BIOMARKER_ALIASES = {
+    "hba1c": ["hba1c", "hb a1c", "a1c", "hemoglobin a1c", "haemoglobin a1c", "glycated hemoglobin",
+              "glycated haemoglobin", "glycosylated hemoglobin", "glycosylated haemoglobin"],
+    "fasting_glucose": ["fasting glucose", "glucose fasting", "fasting blood glucose", "fasting blood sugar",
+                        "fbs", "fasting plasma glucose", "fpg"],
+    "glucose": ["glucose", "blood glucose", "blood sugar", "plasma glucose", "random glucose",
+                "random blood sugar", "rbs"],
+    "ldl": ["ldl", "ldl c", "ldl cholesterol", "cholesterol ldl", "ldl direct",
+            "low density lipoprotein", "low density lipoprotein cholesterol"],
+    "hdl": ["hdl", "hdl c", "hdl cholesterol", "cholesterol hdl",
+            "high density lipoprotein", "high density lipoprotein cholesterol"],
+    "vldl": ["vldl", "vldl cholesterol", "very low density lipoprotein"],
+    "triglycerides": ["triglycerides", "triglyceride", "tg", "trigs"],
+    "total_cholesterol": ["total cholesterol", "cholesterol", "cholesterol total"],
+    "systolic_bp": ["systolic", "systolic bp", "systolic blood pressure", "blood pressure systolic",
+                    "sbp"],
+    "diastolic_bp": ["diastolic", "diastolic bp", "diastolic blood pressure", "blood pressure diastolic", "dbp"],
+    "hemoglobin": ["hemoglobin", "haemoglobin", "hb", "hgb"],
+    "hematocrit": ["hematocrit", "haematocrit", "hct", "pcv", "packed cell volume"],
+    "wbc": ["wbc", "white blood cells", "white blood cell count", "total leucocyte count", "tlc",
+            "total leukocyte count"],
+    "rbc": ["rbc", "red blood cells", "red blood cell count", "rbc count"],
+    "platelets": ["platelets", "platelet count", "plt"],
+    "creatinine": ["creatinine", "creatinine serum", "s creatinine"],
+    "egfr": ["egfr", "estimated gfr", "estimated glomerular filtration rate"],
+    "bun": ["bun", "blood urea nitrogen", "urea nitrogen"],
+    "urea": ["urea", "blood urea"],
+    "uric_acid": ["uric acid"],
+    "alt": ["alt", "sgpt", "alanine aminotransferase", "alanine transaminase"],
+    "ast": ["ast", "sgot", "aspartate aminotransferase", "aspartate transaminase"],
+    "alp": ["alp", "alkaline phosphatase"],
+    "bilirubin_total": ["bilirubin", "total bilirubin", "bilirubin total"],
+    "tsh": ["tsh", "thyroid stimulating hormone"],
+    "t3": ["t3", "total t3", "triiodothyronine"],
+    "t4": ["t4", "total t4", "thyroxine"],
+    "vitamin_d": ["vitamin d", "vitamin d3", "25 oh vitamin d", "25 hydroxy vitamin d", "vit d"],
+    "vitamin_b12": ["vitamin b12", "b12", "vit b12", "cobalamin"],
+    "ferritin": ["ferritin"],
+    "iron": ["iron", "serum iron"],
+    "sodium": ["sodium"],
+    "potassium": ["potassium"],
+    "calcium": ["calcium", "total calcium", "calcium total"],
+    "crp": ["crp", "c reactive protein", "hs crp", "hscrp"],
+}
+
+# Words that qualify a measurement without changing what it is.
+_NOISE_WORDS = {"serum", "level", "levels", "value"}
+_PARENTHETICAL = re.compile(r"\([^)]*\)|\[[^\]]*\]")
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_name(name: str) -> str:
+    """Lower-case, drop parenthetical qualifiers and punctuation, collapse spaces."""
+    text = _PARENTHETICAL.sub(" ", (name or "").lower())
+    words = [w for w in _NON_ALNUM.split(text) if w and w not in _NOISE_WORDS]
+    return " ".join(words)
+
+
+_LOOKUP = {
+    normalize_name(alias): code
+    for code, aliases in BIOMARKER_ALIASES.items()
+    for alias in aliases
+}
+
+
+def biomarker_code(name: str) -> str:
+    """Canonical code for a free-text biomarker name.
+
+    Known aliases map to their canonical code; anything else gets a stable
+    slug of its normalised name, so identical spellings still group together.
+    """
+    normalized = normalize_name(name)
+    code = _LOOKUP.get(normalized)
+    if code:
+        return code
+    return normalized.replace(" ", "_") or "unknown"
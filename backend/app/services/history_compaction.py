@@ -0,0 +1,135 @@
+"""Compact a user's biomarker history into a token-budgeted prompt section.
+
+Each series is reduced to a handful of features (first, last, min, max,
+slope per year, out-of-range count and the most recent points), computed for
+all series at once with segmented NumPy reductions. The rendered lines are
+then packed under a token budget: recent points are trimmed first, then the
+least notable series are dropped.
+"""
+import os
+import numpy as np
+from app.services.analytics_service import group_by_code
+
+SUMMARY_TOKEN_BUDGET = int(os.getenv("SUMMARY_TOKEN_BUDGET", "2000"))
+SUMMARY_RECENT_POINTS = int(os.getenv("SUMMARY_RECENT_POINTS", "5"))
+
+SECONDS_PER_YEAR = 365.25 * 24 * 3600
+CHARS_PER_TOKEN = 4  # rough average for English text and numbers
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def compute_series_features(biomarkers: list, recent_points: int = SUMMARY_RECENT_POINTS) -> list:
+    """One feature dict per biomarker code. Expects rows ordered by recorded_at ascending."""
+    grouped = group_by_code(biomarkers)
+    if not grouped:
+        return []
+
+    codes = list(grouped.keys())
+    rows = [b for code in codes for b in grouped[code]]
+    counts = np.array([len(grouped[code]) for code in codes])
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    ends = starts + counts - 1
+    seg = np.repeat(np.arange(len(codes)), counts)
+
+    x = np.array([b.recorded_at.timestamp() for b in rows]) / SECONDS_PER_YEAR
+    y = np.array([b.value for b in rows], dtype=float)
+    ref_min = np.array([b.ref_min if b.ref_min is not None else np.nan for b in rows], dtype=float)
+    ref_max = np.array([b.ref_max if b.ref_max is not None else np.nan for b in rows], dtype=float)
+
+    with np.errstate(invalid="ignore"):
+        out_of_range = (y < ref_min) | (y > ref_max)  # NaN limits compare False
+    oor_count = np.add.reduceat(out_of_range.astype(int), starts)
+
+    # Least-squares slope per series, x in years and centred for stability.
+    x_mean = np.add.reduceat(x, starts) / counts
+    xc = x - x_mean[seg]
+    sxx = np.add.reduceat(xc * xc, starts)
+    sxy = np.add.reduceat(xc * y, starts)
+    slope = np.divide(sxy, sxx, out=np.zeros_like(sxy), where=sxx > 0)
+
+    y_min = np.minimum.reduceat(y, starts)
+    y_max = np.maximum.reduceat(y, starts)
+    y_mean = np.add.reduceat(y, starts) / counts
+    span_years = x[ends] - x[starts]
+    # How far the series has moved over its span, relative to its level.
+    relative_change = np.abs(slope * span_years) / np.maximum(np.abs(y_mean), 1e-9)
+
+    features = []
+    for i, code in enumerate(codes):
+        items = grouped[code]
+        last = items[-1]
+        features.append({
+            "code": code,
+            "name": last.name,
+            "unit": last.unit,
+            "ref_min": last.ref_min,
+            "ref_max": last.ref_max,
+            "count": int(counts[i]),
+            "first": (items[0].recorded_at, items[0].value),
+            "last": (last.recorded_at, last.value),
+            "min": float(y_min[i]),
+            "max": float(y_max[i]),
+            "slope_per_year": float(slope[i]),
+            "out_of_range": int(oor_count[i]),
+            "last_out_of_range": bool(out_of_range[ends[i]]),
+            "relative_change": float(relative_change[i]),
+            "recent": [(b.recorded_at, b.value) for b in items[-recent_points:]] if recent_points else [],
+        })
+    return features
+
+
+def _num(value) -> str:
+    return f"{value:.4g}" if value is not None else "?"
+
+
+def _day(dt) -> str:
+    return dt.strftime("%Y-%m-%d") if dt else "?"
+
+
+def render_series(f: dict, recent_points: int) -> str:
+    ref = f"{_num(f['ref_min'])}-{_num(f['ref_max'])}" if f["ref_min"] is not None or f["ref_max"] is not None else "n/a"
+    line = (
+        f"{f['name']} [{f['unit'] or '-'}, ref {ref}] n={f['count']}: "
+        f"first {_num(f['first'][1])} ({_day(f['first'][0])}), "
+        f"last {_num(f['last'][1])}{' OUT' if f['last_out_of_range'] else ''} ({_day(f['last'][0])}), "
+        f"min {_num(f['min'])}, max {_num(f['max'])}, "
+        f"slope {f['slope_per_year']:+.3g}/yr, out of range {f['out_of_range']}/{f['count']}"
+    )
+    recent = f["recent"][-recent_points:] if recent_points else []
+    if recent:
+        line += "; recent " + ", ".join(f"{_day(d)} {_num(v)}" for d, v in recent)
+    return line
+
+
+def _priority(f: dict):
+    return (not f["last_out_of_range"], -f["out_of_range"] / f["count"], -f["relative_change"])
+
+
+def pack_history(features: list, token_budget: int = SUMMARY_TOKEN_BUDGET, recent_points: int = SUMMARY_RECENT_POINTS) -> str:
+    """Render features most notable first, fitting `token_budget` tokens."""
+    ordered = sorted(features, key=_priority)
+    # Keep every series if possible, trading away recent points first.
+    for points in range(recent_points, -1, -1):
+        lines = [render_series(f, points) for f in ordered]
+        if estimate_tokens("\n".join(lines)) <= token_budget:
+            return "\n".join(lines)
+
+    lines, used = [], 0
+    for f in ordered:
+        line = render_series(f, 0)
+        cost = estimate_tokens(line + "\n")
+        if used + cost > token_budget:
+            break
+        lines.append(line)
+        used += cost
+    omitted = len(ordered) - len(lines)
+    if omitted:
+        lines.append(f"({omitted} lower-priority series omitted to fit the budget)")
+    return "\n".join(lines)
+
+
+def compact_history(biomarkers: list, token_budget: int = SUMMARY_TOKEN_BUDGET, recent_points: int = SUMMARY_RECENT_POINTS) -> str:
+    return pack_history(compute_series_features(biomarkers, recent_points), token_budget, recent_points)
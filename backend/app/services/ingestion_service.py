@@ -0,0 +1,458 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models.models import Biomarker, IngestionJob, Report
+from app.services.biomarker_codes import biomarker_code
+from app.services.pdf_service import parse_report_pdf, TABLE_CONFIDENCE_THRESHOLD
+from app.services.stats_service import add_to_stats, flag_new_points
+from app.services.version_service import bump_data_version
+from app.utils.bulk import insert_in_batches
+from app.ai.openai_service import extract_biomarkers_with_stats
+from app.ai.report_index import index_report_safely
+
+logger = logging.getLogger("ingestion")
+
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+INGEST_PARSE_PROCESSES = int(os.getenv("INGEST_PARSE_PROCESSES", "2"))
+INGEST_MAX_ATTEMPTS = int(os.getenv("INGEST_MAX_ATTEMPTS", "4"))
+INGEST_RETRY_BASE_SECONDS = float(os.getenv("INGEST_RETRY_BASE_SECONDS", "2"))
+INGEST_LEASE_SECONDS = float(os.getenv("INGEST_LEASE_SECONDS", "60"))
+
+
+class PermanentJobError(Exception):
+    """A failure that retrying won't fix (e.g. an unreadable PDF)."""
+
+
+class LeaseLost(Exception):
+    """The job's lease lapsed and another worker took it over."""
+
+
+def insert_biomarkers(db: Session, report: Report, biomarkers_data: list):
+    """Insert extracted biomarker dicts for a report and fold them into the stats.
+
+    Rows go in as multi-row INSERTs; rows with non-numeric values are
+    skipped. Returns (inserted, anomalies), where inserted holds
+    (id, name, code, value, recorded_at) rows; the caller commits.
+    """
+    recorded_at = report.report_date or datetime.utcnow()
+    rows = []
+    for b in biomarkers_data:
+        try:
+            name = b.get("name", "Unknown")
+            rows.append({
+                "report_id": report.id,
+                "user_id": report.user_id,
+                "name": name,
+                "code": biomarker_code(name),
+                "value": float(b.get("value", 0)),
+                "unit": b.get("unit", ""),
+                "ref_min": float(b["ref_min"]) if b.get("ref_min") not in [None, ""] else None,
+                "ref_max": float(b["ref_max"]) if b.get("ref_max") not in [None, ""] else None,
+                "recorded_at": recorded_at,
+            })
+        except (ValueError, TypeError):
+            continue
+    inserted = insert_in_batches(
+        db, Biomarker, rows,
+        returning=(Biomarker.id, Biomarker.name, Biomarker.code, Biomarker.value, Biomarker.recorded_at),
+    )
+    stats = add_to_stats(db, report.user_id, inserted)
+    bump_data_version(db, report.user_id, "reports", "biomarkers")
+    return inserted, flag_new_points(stats, inserted)
+
+
+def find_ingested_report(db: Session, user_id: int, content_hash: str):
+    """The user's most recent fully ingested report with this PDF content, if any.
+
+    Scoped to the user: another account's upload of the same file shares
+    only the stored blob, never its extracted text or biomarkers.
+    """
+    unfinished = (
+        db.query(IngestionJob.id)
+        .filter(IngestionJob.report_id == Report.id, IngestionJob.status != "done")
+        .exists()
+    )
+    return (
+        db.query(Report)
+        .filter(
+            Report.user_id == user_id,
+            Report.content_hash == content_hash,
+            Report.extracted_text.isnot(None),
+            ~unfinished,
+        )
+        .order_by(Report.id.desc())
+        .first()
+    )
+
+
+def copy_report_results(db: Session, source: Report, report: Report):
+    """Give a re-uploaded report the text and biomarkers already extracted from its content."""
+    report.extracted_text = source.extracted_text
+    rows = db.query(Biomarker).filter(Biomarker.report_id == source.id).order_by(Biomarker.id).all()
+    biomarkers_data = [
+        {"name": b.name, "value": b.value, "unit": b.unit, "ref_min": b.ref_min, "ref_max": b.ref_max}
+        for b in rows
+    ]
+    return insert_biomarkers(db, report, biomarkers_data)
+
+
+def serialize_job(job: IngestionJob) -> dict:
+    return {
+        "id": job.id,
+        "report_id": job.report_id,
+        "status": job.status,
+        "stage": job.stage,
+        "attempts": job.attempts,
+        "error": job.error,
+        "timings": json.loads(job.timings) if job.timings else {},
+        "result": json.loads(job.result) if job.result else None,
+        "created_at": job.created_at,
+        "updated_at": job.updated_at,
+        "finished_at": job.finished_at,
+    }
+
+
+def _retry_delay(attempts: int) -> float:
+    """Exponential backoff with full jitter."""
+    return random.uniform(0, INGEST_RETRY_BASE_SECONDS * (2 ** (attempts - 1)))
+
+
+class IngestionWorkerPool:
+    """Bounded asyncio workers draining DB-backed ingestion jobs.
+
+    Job state lives in the ingestion_jobs table; the in-memory queue only
+    carries ids. A running job holds a lease that its worker keeps renewing,
+    so with several app processes only jobs whose lease has lapsed (their
+    process died) are taken over. PDF parsing is CPU bound and runs in a
+    process pool; DB work runs in threads so the event loop stays free for
+    requests.
+    """
+
+    def __init__(self, workers: int = INGEST_WORKERS, parse_processes: int = INGEST_PARSE_PROCESSES):
+        self.workers = workers
+        self.parse_processes = parse_processes
+        self.queue = None
+        self.executor = None
+        self.tasks = []
+        self.pending = set()  # delayed retries, referenced so they aren't garbage-collected
+
+    async def start(self):
+        self.queue = asyncio.Queue()
+        self.executor = ProcessPoolExecutor(max_workers=self.parse_processes)
+        self.tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self.tasks.append(asyncio.create_task(self._reclaim_expired()))
+        for job_id, delay in await asyncio.to_thread(self._recover):
+            self.schedule(job_id, delay)
+
+    async def stop(self):
+        for task in [*self.tasks, *self.pending]:
+            task.cancel()
+        await asyncio.gather(*self.tasks, *self.pending, return_exceptions=True)
+        self.tasks = []
+        self.pending = set()
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    def enqueue(self, job_id: int):
+        self.queue.put_nowait(job_id)
+
+    def schedule(self, job_id: int, delay: float):
+        if delay <= 0:
+            self.enqueue(job_id)
+            return
+
+        async def later():
+            await asyncio.sleep(delay)
+            self.enqueue(job_id)
+
+        task = asyncio.create_task(later())
+        self.pending.add(task)
+        task.add_done_callback(self.pending.discard)
+
+    def _recover(self) -> list:
+        """Startup: queued and retrying jobs, plus running jobs whose lease has lapsed."""
+        db = SessionLocal()
+        try:
+            expired = self._release_expired(db)
+            jobs = (
+                db.query(IngestionJob.id, IngestionJob.next_attempt_at)
+                .filter(IngestionJob.status.in_(("queued", "retrying")))
+                .order_by(IngestionJob.id)
+                .all()
+            )
+            now = datetime.utcnow()
+            pending = [
+                (job_id, max((next_attempt_at - now).total_seconds(), 0) if next_attempt_at else 0)
+                for job_id, next_attempt_at in jobs
+            ]
+            if pending:
+                logger.info("Recovered %d unfinished ingestion jobs (%d with lapsed leases)", len(pending), len(expired))
+            return pending
+        finally:
+            db.close()
+
+    @staticmethod
+    def _release_expired(db: Session) -> list:
+        """Put running jobs whose lease has lapsed back in the queue; commits."""
+        jobs = (
+            db.query(IngestionJob)
+            .filter(
+                IngestionJob.status == "running",
+                or_(IngestionJob.lease_expires_at.is_(None), IngestionJob.lease_expires_at < datetime.utcnow()),
+            )
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+        for job in jobs:
+            job.status = "queued"  # its process died mid-run; resume its stage
+            job.lease_owner = None
+            job.lease_expires_at = None
+        db.commit()
+        return [job.id for job in jobs]
+
+    async def _reclaim_expired(self):
+        """Pick up jobs abandoned by another process that died while running them."""
+        while True:
+            await asyncio.sleep(INGEST_LEASE_SECONDS)
+            try:
+                for job_id in await asyncio.to_thread(self._release_expired_now):
+                    self.enqueue(job_id)
+            except Exception:
+                logger.exception("Reclaiming expired ingestion jobs failed")
+
+    def _release_expired_now(self) -> list:
+        db = SessionLocal()
+        try:
+            return self._release_expired(db)
+        finally:
+            db.close()
+
+    async def _worker(self):
+        while True:
+            job_id = await self.queue.get()
+            try:
+                await self._run(job_id)
+            except Exception:
+                logger.exception("Ingestion job %s crashed", job_id)
+            finally:
+                self.queue.task_done()
+
+    async def _heartbeat(self, job_id: int, token: str):
+        while True:
+            await asyncio.sleep(INGEST_LEASE_SECONDS / 3)
+            if not await asyncio.to_thread(self._renew_lease, job_id, token):
+                return
+
+    async def _run(self, job_id: int):
+        token = uuid.uuid4().hex
+        job = await asyncio.to_thread(self._claim, job_id, token)
+        if job is None:
+            return
+        heartbeat = asyncio.create_task(self._heartbeat(job_id, token))
+        stage = job["stage"]
+        try:
+            while stage != "done":
+                started = time.perf_counter()
+                if stage == "extract":
+                    parsed = await asyncio.get_running_loop().run_in_executor(
+                        self.executor, parse_report_pdf, job["file_path"]
+                    )
+                    if parsed["text"].startswith("Error extracting PDF"):
+                        raise PermanentJobError(parsed["text"])
+                    next_stage = await asyncio.to_thread(self._save_extraction, job_id, token, parsed, started)
+                elif stage == "llm":
+                    text = await asyncio.to_thread(self._load_text, job_id)
+                    biomarkers_data, chunk_stats = await extract_biomarkers_with_stats(text)
+                    next_stage = await asyncio.to_thread(
+                        self._save_payload, job_id, token, biomarkers_data, chunk_stats, started
+                    )
+                else:
+                    next_stage = await asyncio.to_thread(self._insert, job_id, token, started)
+                stage = next_stage
+        except LeaseLost:
+            logger.warning("Ingestion job %s was taken over by another worker", job_id)
+        except Exception as e:
+            delay = await asyncio.to_thread(self._fail, job_id, token, e, isinstance(e, PermanentJobError))
+            if delay is not None:
+                self.schedule(job_id, delay)
+        finally:
+            heartbeat.cancel()
+
+    # -- DB steps (run in worker threads) ---------------------------------
+    # Each step records its outcome and the move to the next stage in the
+    # same transaction, so a crash between steps never repeats a stage whose
+    # writes were already committed.
+
+    def _claim(self, job_id: int, token: str):
+        db = SessionLocal()
+        try:
+            job = db.query(IngestionJob).filter(IngestionJob.id == job_id).with_for_update().first()
+            if job is None or job.status not in ("queued", "retrying"):
+                return None
+            report = db.query(Report).filter(Report.id == job.report_id).first() if job.report_id else None
+            if report is None:
+                job.status = "failed"
+                job.error = "Report was deleted before ingestion finished"
+                job.finished_at = datetime.utcnow()
+                db.commit()
+                return None
+            # Conditional on the status read above, so two processes handed
+            # the same id can't both claim it (SQLite ignores FOR UPDATE).
+            claimed = (
+                db.query(IngestionJob)
+                .filter(IngestionJob.id == job_id, IngestionJob.status.in_(("queued", "retrying")))
+                .update({
+                    IngestionJob.status: "running",
+                    IngestionJob.attempts: IngestionJob.attempts + 1,
+                    IngestionJob.next_attempt_at: None,
+                    IngestionJob.lease_owner: token,
+                    IngestionJob.lease_expires_at: datetime.utcnow() + timedelta(seconds=INGEST_LEASE_SECONDS),
+                }, synchronize_session=False)
+            )
+            db.commit()
+            return {"stage": job.stage, "file_path": report.file_path} if claimed else None
+        finally:
+            db.close()
+
+    def _renew_lease(self, job_id: int, token: str) -> bool:
+        db = SessionLocal()
+        try:
+            renewed = (
+                db.query(IngestionJob)
+                .filter(IngestionJob.id == job_id, IngestionJob.lease_owner == token, IngestionJob.status == "running")
+                .update({IngestionJob.lease_expires_at: datetime.utcnow() + timedelta(seconds=INGEST_LEASE_SECONDS)},
+                        synchronize_session=False)
+            )
+            db.commit()
+            return bool(renewed)
+        finally:
+            db.close()
+
+    @staticmethod
+    def _owned(db: Session, job_id: int, token: str) -> IngestionJob:
+        """The job, locked, as long as this run still holds its lease."""
+        job = db.query(IngestionJob).filter(IngestionJob.id == job_id).with_for_update().first()
+        if job is None or job.lease_owner != token or job.status != "running":
+            raise LeaseLost(job_id)
+        return job
+
+    @staticmethod
+    def _advance(job: IngestionJob, next_stage: str, started: float):
+        """Record the finished stage's timing and move the job on; the caller commits."""
+        timings = json.loads(job.timings) if job.timings else {}
+        timings[f"{job.stage}_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        job.timings = json.dumps(timings)
+        job.stage = next_stage
+        job.error = None
+        if next_stage == "done":
+            job.status = "done"
+            job.payload = None
+            job.finished_at = datetime.utcnow()
+            job.lease_owner = None
+            job.lease_expires_at = None
+        else:
+            job.attempts = 1  # the next stage starts right away in this run
+
+    def _save_extraction(self, job_id: int, token: str, parsed: dict, started: float) -> str:
+        """Store the PDF text; skip the LLM when the table extractor is confident."""
+        db = SessionLocal()
+        try:
+            job = self._owned(db, job_id, token)
+            db.query(Report).filter(Report.id == job.report_id).update({Report.extracted_text: parsed["text"]})
+            trusted = parsed["biomarkers"] and parsed["confidence"] >= TABLE_CONFIDENCE_THRESHOLD
+            job.payload = json.dumps({
+                "extractor": "table" if trusted else "llm",
+                "table_confidence": parsed["confidence"],
+                "biomarkers": parsed["biomarkers"] if trusted else [],
+            })
+            next_stage = "insert" if trusted else "llm"
+            self._advance(job, next_stage, started)
+            db.commit()
+            return next_stage
+        finally:
+            db.close()
+
+    def _load_text(self, job_id: int) -> str:
+        db = SessionLocal()
+        try:
+            job = db.query(IngestionJob).filter(IngestionJob.id == job_id).first()
+            report = db.query(Report).filter(Report.id == job.report_id).first()
+            return report.extracted_text or ""
+        finally:
+            db.close()
+
+    def _save_payload(self, job_id: int, token: str, biomarkers_data: list, chunk_stats: list, started: float) -> str:
+        db = SessionLocal()
+        try:
+            job = self._owned(db, job_id, token)
+            payload = json.loads(job.payload) if job.payload else {}
+            payload["biomarkers"] = biomarkers_data
+            payload["llm_chunks"] = chunk_stats
+            job.payload = json.dumps(payload)
+            self._advance(job, "insert", started)
+            db.commit()
+            return "insert"
+        finally:
+            db.close()
+
+    def _insert(self, job_id: int, token: str, started: float) -> str:
+        """Insert the biomarkers and finish the job in one transaction."""
+        db = SessionLocal()
+        try:
+            job = self._owned(db, job_id, token)
+            report = db.query(Report).filter(Report.id == job.report_id).first()
+            if report is None:
+                raise PermanentJobError("Report was deleted before ingestion finished")
+            payload = json.loads(job.payload) if job.payload else {}
+            inserted, anomalies = insert_biomarkers(db, report, payload.get("biomarkers", []))
+            job.result = json.dumps({
+                "biomarkers_extracted": len(inserted),
+                "anomalies": anomalies,
+                "extractor": payload.get("extractor", "llm"),
+                "table_confidence": payload.get("table_confidence"),
+                "llm_chunks": payload.get("llm_chunks", []),
+            })
+            self._advance(job, "done", started)
+            db.commit()
+            index_report_safely(report.user_id, report.id, report.extracted_text)
+            return "done"
+        finally:
+            db.close()
+
+    def _fail(self, job_id: int, token: str, error: Exception, permanent: bool):
+        """Record a failed attempt. Returns the retry delay, or None if the job is finished."""
+        db = SessionLocal()
+        try:
+            try:
+                job = self._owned(db, job_id, token)
+            except LeaseLost:
+                return None  # another worker owns the job now
+            job.error = f"{job.stage}: {error}"
+            job.lease_owner = None
+            job.lease_expires_at = None
+            if permanent or job.attempts >= INGEST_MAX_ATTEMPTS:
+                job.status = "failed"
+                job.finished_at = datetime.utcnow()
+                db.commit()
+                logger.warning("Ingestion job %s failed at %s: %s", job_id, job.stage, error)
+                return None
+            delay = _retry_delay(job.attempts)
+            job.status = "retrying"
+            job.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+            db.commit()
+            return delay
+        finally:
+            db.close()
+
+
+ingestion_pool = IngestionWorkerPool()
@@ -0,0 +1,261 @@
+"""Bulk import of manual logs from CSV or NDJSON request bodies.
+
+The body is read as a stream and parsed record by record; rows are validated
+and written in batches of LOG_IMPORT_BATCH_SIZE, each batch committed on its
+own so a failure part-way keeps earlier batches. Rows may carry an
+`idempotency_key`: a key already stored for the user (or repeated within
+the import) is counted as a duplicate and skipped, so replaying an import
+is safe.
+"""
+import codecs
+import csv
+import json
+import os
+from collections import deque
+from datetime import datetime
+from typing import Optional
+from pydantic import BaseModel, Field, ValidationError
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.models.models import ManualLog
+from app.services.rollup_service import add_to_rollups, naive_utc, raw_log_cutoff
+from app.services.version_service import bump_data_version
+from app.utils.bulk import insert_in_batches
+
+LOG_IMPORT_BATCH_SIZE = int(os.getenv("LOG_IMPORT_BATCH_SIZE", "500"))
+LOG_IMPORT_MAX_ROWS = int(os.getenv("LOG_IMPORT_MAX_ROWS", "200000"))
+MAX_ERRORS_PER_BATCH = 20
+# A quoted CSV field may span lines, but no further than this.
+MAX_RECORD_LINES = 50
+MAX_RECORD_CHARS = 64 * 1024
+
+CSV_COLUMNS = ("log_type", "value", "value2", "unit", "notes", "logged_at", "idempotency_key")
+
+
+class LogImportRow(BaseModel):
+    log_type: str = Field(min_length=1)
+    value: float
+    value2: Optional[float] = None
+    unit: Optional[str] = None
+    notes: Optional[str] = None
+    logged_at: Optional[datetime] = None
+    idempotency_key: Optional[str] = Field(None, max_length=128)
+
+
+class LogImportError(Exception):
+    """The body can't be read at all (e.g. a bad CSV header)."""
+
+
+async def _lines(chunks):
+    """Decoded lines, with their line endings, from an async iterator of byte
+    chunks, with 1-based line numbers.
+
+    The incremental decoder carries a multi-byte character split across two
+    chunks over to the next one, and drops a leading BOM.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    buffer, line_no = "", 0
+    async for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        *complete, buffer = buffer.split("\n")
+        for line in complete:
+            line_no += 1
+            yield line_no, line + "\n"
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield line_no + 1, buffer
+
+
+def _drain(lines: deque):
+    while True:
+        yield lines.popleft()
+
+
+class _CsvRecords:
+    """Groups CSV lines into records and parses them with one csv.reader.
+
+    Quoted fields may span lines, so lines are held back until their quotes
+    balance, which is when the reader has a complete record to read. A
+    record still open after MAX_RECORD_LINES lines or MAX_RECORD_CHARS
+    characters (say, a stray `"` in an unquoted note) is reported as an
+    error on its first line, and the lines after it are parsed again on
+    their own, so one bad row doesn't swallow the rest of the import.
+    """
+
+    def __init__(self):
+        self.header = None
+        self.pending = deque()  # lines of the open record, read by the csv.reader
+        self.held = []  # (line_no, line) for the same lines
+        self.size = 0
+        self.quoted = False
+        self.reader = csv.reader(_drain(self.pending))
+
+    def _reset(self) -> list:
+        held = self.held
+        self.pending.clear()
+        self.held, self.size, self.quoted = [], 0, False
+        self.reader = csv.reader(_drain(self.pending))
+        return held
+
+    def feed(self, line_no: int, line: str):
+        backlog = deque([(line_no, line)])
+        while backlog:
+            line_no, line = backlog.popleft()
+            if not self.held and not line.strip():
+                continue
+            self.pending.append(line)
+            self.held.append((line_no, line))
+            self.size += len(line)
+            self.quoted ^= line.count('"') % 2 == 1
+            if not self.quoted:
+                yield from self._parse()
+            elif len(self.held) >= MAX_RECORD_LINES or self.size > MAX_RECORD_CHARS:
+                held = self._reset()
+                yield held[0][0], "unterminated quoted field"
+                backlog.extendleft(reversed(held[1:]))
+
+    def finish(self):
+        while self.held:
+            held = self._reset()
+            yield held[0][0], "unterminated quoted field"
+            for line_no, line in held[1:]:
+                yield from self.feed(line_no, line)
+
+    def _parse(self):
+        record_line = self.held[0][0]
+        self.held, self.size = [], 0
+        try:
+            fields = next(self.reader)
+        except (IndexError, csv.Error):
+            self._reset()
+            yield record_line, "malformed quoting"
+            return
+        if self.header is None:
+            self.header = [f.strip() for f in fields]
+            unknown = set(self.header) - set(CSV_COLUMNS)
+            if "log_type" not in self.header or "value" not in self.header or unknown:
+                raise LogImportError(
+                    f"CSV header must include log_type and value, and only columns from {', '.join(CSV_COLUMNS)}"
+                )
+            return
+        if len(fields) != len(self.header):
+            yield record_line, f"expected {len(self.header)} columns, got {len(fields)}"
+            return
+        yield record_line, {k: (v if v.strip() != "" else None) for k, v in zip(self.header, fields)}
+
+
+async def _records(chunks, fmt: str):
+    """(line_no, dict) per data row, or (line_no, error string) for rows that can't be parsed."""
+    records = _CsvRecords()
+    async for line_no, line in _lines(chunks):
+        if fmt == "ndjson":
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield line_no, f"invalid JSON: {e}"
+                continue
+            yield line_no, record if isinstance(record, dict) else "expected a JSON object"
+            continue
+        for item in records.feed(line_no, line):
+            yield item
+    for item in records.finish():
+        yield item
+
+
+def _validate(batch: list, user_id: int, seen_keys: set):
+    """Split a batch into insertable rows and per-line errors.
+
+    Rows older than the raw log retention cut-off are rejected: their raw
+    rows (and idempotency keys) may already be gone while their rollups
+    remain, so a replay would count them twice.
+    """
+    rows, errors, duplicates = [], [], 0
+    now = datetime.utcnow()
+    cutoff = raw_log_cutoff(now)
+    for line_no, record in batch:
+        if isinstance(record, str):
+            errors.append({"line": line_no, "error": record})
+            continue
+        try:
+            row = LogImportRow.model_validate(record)
+        except ValidationError as e:
+            first = e.errors()[0]
+            errors.append({"line": line_no, "error": f"{'.'.join(map(str, first['loc']))}: {first['msg']}"})
+            continue
+        logged_at = naive_utc(row.logged_at) if row.logged_at else now
+        if cutoff is not None and logged_at < cutoff:
+            errors.append({"line": line_no, "error": f"logged_at: before the raw log retention cut-off ({cutoff.isoformat()})"})
+            continue
+        if row.idempotency_key is not None:
+            if row.idempotency_key in seen_keys:
+                duplicates += 1
+                continue
+            seen_keys.add(row.idempotency_key)
+        rows.append({**row.model_dump(), "user_id": user_id, "logged_at": logged_at})
+    return rows, errors, duplicates
+
+
+def _insert_batch(db: Session, user_id: int, rows: list) -> tuple:
+    """Insert rows whose keys aren't stored yet. Returns (inserted, duplicates)."""
+    keys = [r["idempotency_key"] for r in rows if r["idempotency_key"] is not None]
+    existing = set()
+    if keys:
+        existing = {
+            k for (k,) in db.query(ManualLog.idempotency_key)
+            .filter(ManualLog.user_id == user_id, ManualLog.idempotency_key.in_(keys))
+        }
+    fresh = [r for r in rows if r["idempotency_key"] is None or r["idempotency_key"] not in existing]
+    if fresh:
+        insert_in_batches(db, ManualLog, fresh, batch_size=LOG_IMPORT_BATCH_SIZE)
+        add_to_rollups(db, [(user_id, r["log_type"], r["logged_at"], r["value"], r["value2"]) for r in fresh])
+        bump_data_version(db, user_id, "logs")
+    db.commit()
+    return len(fresh), len(rows) - len(fresh)
+
+
+def _write_batch(db: Session, user_id: int, rows: list) -> tuple:
+    try:
+        return _insert_batch(db, user_id, rows)
+    except IntegrityError:
+        # A concurrent replay stored some of the same keys first; re-check once.
+        db.rollback()
+        return _insert_batch(db, user_id, rows)
+
+
+async def import_logs(db: AsyncSession, user_id: int, chunks, fmt: str) -> dict:
+    report = {"received": 0, "inserted": 0, "duplicates": 0, "rejected": 0, "truncated": False, "batches": []}
+    seen_keys = set()
+
+    async def flush(batch):
+        rows, errors, duplicates = _validate(batch, user_id, seen_keys)
+        inserted, stored_duplicates = await db.run_sync(_write_batch, user_id, rows) if rows else (0, 0)
+        duplicates += stored_duplicates
+        report["inserted"] += inserted
+        report["duplicates"] += duplicates
+        report["rejected"] += len(errors)
+        report["batches"].append({
+            "batch": len(report["batches"]) + 1,
+            "first_line": batch[0][0],
+            "last_line": batch[-1][0],
+            "inserted": inserted,
+            "duplicates": duplicates,
+            "rejected": len(errors),
+            "errors": errors[:MAX_ERRORS_PER_BATCH],
+        })
+
+    batch = []
+    async for line_no, record in _records(chunks, fmt):
+        if report["received"] >= LOG_IMPORT_MAX_ROWS:
+            report["truncated"] = True  # rows up to here are kept; send the rest separately
+            break
+        report["received"] += 1
+        batch.append((line_no, record))
+        if len(batch) >= LOG_IMPORT_BATCH_SIZE:
+            await flush(batch)
+            batch = []
+    if batch:
+        await flush(batch)
+    return report
@@ -0,0 +1,176 @@
+"""Relate medication periods to biomarker trends.
+
+Two pieces:
+
+- annotate_active_medicines() tags each biomarker point with the medicines
+  active on its date, in one sweep over points and medicine start/end
+  events (sorted starts plus a min-heap of end dates) rather than testing
+  every medicine against every point.
+- medication_effects() compares each biomarker series before and after
+  each medicine's start date. It reports the means, the slope per year on
+  each side, the change in slope and Cohen's d. The series are laid out
+  back to back as in analytics_service.forecast_all_biomarkers. Each
+  medicine's windows are found with searchsorted over the time-sorted
+  points, and all (medicine, series) windows are reduced together with
+  bincount, so the work grows with the points inside the windows rather
+  than with medicines x points.
+"""
+import heapq
+import os
+from datetime import date, datetime, time
+import numpy as np
+from app.services.analytics_service import group_by_code
+
+EFFECT_WINDOW_DAYS = int(os.getenv("EFFECT_WINDOW_DAYS", "180"))
+DAYS_PER_YEAR = 365.25
+EPOCH = datetime(1970, 1, 1)
+
+
+def _days(dt: datetime) -> float:
+    """Days since the epoch for a naive UTC datetime."""
+    return (dt - EPOCH).total_seconds() / 86400.0
+
+
+def _day(value) -> date:
+    return value.date() if isinstance(value, datetime) else value
+
+
+def annotate_active_medicines(biomarkers: list, medicines: list) -> list:
+    """Ids of the medicines active on each point's date, in input order.
+
+    A medicine is active from start_date through end_date inclusive, or
+    indefinitely without an end date. Expects points ordered by recorded_at.
+    """
+    starts = sorted(medicines, key=lambda m: m.start_date)
+    ending = []  # heap of (end_date, medicine id)
+    active = set()
+    next_start = 0
+    out = []
+    for b in biomarkers:
+        day = _day(b.recorded_at)
+        while next_start < len(starts) and starts[next_start].start_date <= day:
+            m = starts[next_start]
+            heapq.heappush(ending, (m.end_date or date.max, m.id))
+            active.add(m.id)
+            next_start += 1
+        while ending and ending[0][0] < day:
+            active.discard(heapq.heappop(ending)[1])
+        out.append(sorted(active))
+    return out
+
+
+def _window_index(lo: np.ndarray, hi: np.ndarray) -> tuple:
+    """Flat indices covering the slices [lo[i], hi[i]), and the slice each came from."""
+    lengths = hi - lo
+    owner = np.repeat(np.arange(len(lo)), lengths)
+    offsets = np.arange(int(lengths.sum())) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return lo[owner] + offsets, owner
+
+
+def _window_stats(group: np.ndarray, x: np.ndarray, y: np.ndarray, size: int) -> dict:
+    """Count, mean, sample variance and least-squares slope per group."""
+
+    def total(weights=None):
+        return np.bincount(group, weights=weights, minlength=size)
+
+    n = total()
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_x = total(x) / n
+        mean_y = total(y) / n
+        sxx = total(x * x) - n * mean_x ** 2
+        sxy = total(x * y) - n * mean_x * mean_y
+        syy = total(y * y) - n * mean_y ** 2
+        var = np.where(n > 1, np.maximum(syy, 0.0) / (n - 1), np.nan)
+        slope = np.where((n > 1) & (sxx > 1e-12), sxy / sxx, np.nan)
+    return {"n": n.astype(np.int64), "mean": mean_y, "var": var, "slope": slope}
+
+
+def _num(value, digits: int = 4):
+    return None if value is None or np.isnan(value) else round(float(value), digits)
+
+
+def medication_effects(biomarkers: list, medicines: list, window_days: int = EFFECT_WINDOW_DAYS) -> dict:
+    """medicine id -> before/after statistics for every biomarker series.
+
+    For a medicine started on day S, "before" covers [S - window, S) and
+    "after" covers [S, min(S + window, end_date)]. Slopes are per year.
+    Series without points on both sides are left out.
+    """
+    grouped = group_by_code([b for b in biomarkers if b.recorded_at is not None])
+    if not grouped or not medicines:
+        return {m.id: [] for m in medicines}
+
+    codes = list(grouped.keys())
+    rows = [b for code in codes for b in grouped[code]]
+    counts = np.array([len(grouped[code]) for code in codes])
+    seg = np.repeat(np.arange(len(codes)), counts)
+    n_series = len(codes)
+
+    x = np.array([_days(b.recorded_at) for b in rows])
+    y = np.array([b.value for b in rows], dtype=float)
+    order = np.argsort(x, kind="stable")
+    x, y, seg = x[order], y[order], seg[order]
+
+    window = float(window_days)
+    start = np.array([_days(datetime.combine(m.start_date, time.min)) for m in medicines])
+    # end_date is inclusive, so the window closes at the end of that day
+    end = np.array([_days(datetime.combine(m.end_date, time.max)) if m.end_date else np.inf for m in medicines])
+    after_end = np.minimum(start + window, end)
+    size = len(medicines) * n_series
+
+    def stats(lo, hi):
+        # group = medicine * n_series + series
+        idx, med = _window_index(lo, hi)
+        group = med * n_series + seg[idx]
+        return _window_stats(group, (x[idx] - start[med]) / DAYS_PER_YEAR, y[idx], size)
+
+    first_after = np.searchsorted(x, start, side="left")
+    b = stats(np.searchsorted(x, start - window, side="left"), first_after)
+    a = stats(first_after, np.maximum(np.searchsorted(x, after_end, side="right"), first_after))
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        delta = a["mean"] - b["mean"]
+        percent = np.where(b["mean"] != 0, delta / np.abs(b["mean"]) * 100, np.nan)
+        dof = b["n"] + a["n"] - 2
+        pooled = np.sqrt(((b["n"] - 1) * b["var"] + (a["n"] - 1) * a["var"]) / dof)
+        cohens_d = np.where((b["n"] > 1) & (a["n"] > 1) & (pooled > 0), delta / pooled, np.nan)
+        slope_change = a["slope"] - b["slope"]
+
+    results = {}
+    for i, m in enumerate(medicines):
+        effects = []
+        for j, code in enumerate(codes):
+            k = i * n_series + j
+            if b["n"][k] == 0 or a["n"][k] == 0:
+                continue
+            last = grouped[code][-1]
+            effects.append({
+                "code": code,
+                "name": last.name,
+                "unit": getattr(last, "unit", None),
+                "before": {"n": int(b["n"][k]), "mean": _num(b["mean"][k]), "slope_per_year": _num(b["slope"][k])},
+                "after": {"n": int(a["n"][k]), "mean": _num(a["mean"][k]), "slope_per_year": _num(a["slope"][k])},
+                "mean_change": _num(delta[k]),
+                "percent_change": _num(percent[k], 2),
+                "slope_change_per_year": _num(slope_change[k]),
+                "effect_size": _num(cohens_d[k], 3),
+            })
+        # Largest standardized effects first; series without one last.
+        effects.sort(key=lambda e: (e["effect_size"] is None, -abs(e["effect_size"] or 0.0)))
+        results[m.id] = effects
+    return results
+
+
+def annotated_points(biomarkers: list, medicines: list) -> list:
+    active = annotate_active_medicines(biomarkers, medicines)
+    return [
+        {
+            "id": b.id,
+            "code": b.code,
+            "name": b.name,
+            "value": b.value,
+            "recorded_at": b.recorded_at,
+            "active_medicines": ids,
+        }
+        for b, ids in zip(biomarkers, active)
+    ]
@@ -1,4 +1,7 @@
+import os
+import re
 import pdfplumber
+from app.services.biomarker_codes import BIOMARKER_ALIASES, biomarker_code
 
 
 def extract_text_from_pdf(file_path: str) -> str:
@@ -13,3 +16,180 @@ def extract_text_from_pdf(file_path: str) -> str:
     except Exception as e:
         return f"Error extracting PDF: {str(e)}"
     return "\n".join(text_parts)
+
+# Separates pages in stored report text so later stages can chunk by page.
+PAGE_SEPARATOR = "\n\f"
+
+# Table extraction is trusted on its own above this confidence; below it the
+# report goes to the LLM.
+TABLE_CONFIDENCE_THRESHOLD = float(os.getenv("TABLE_CONFIDENCE_THRESHOLD", "0.8"))
+
+_NUMBER = r"[-+]?\d+(?:,\d{3})*(?:[.,]\d+)?"
+_NUMBER_RE = re.compile(rf"^\s*({_NUMBER})\s*$")
+_LEADING_NUMBER_RE = re.compile(rf"^\s*({_NUMBER})\b")
+_RANGE_RE = re.compile(rf"^\s*({_NUMBER})\s*(?:-|–|—|to)\s*({_NUMBER})\s*$", re.IGNORECASE)
+_UPPER_RE = re.compile(rf"^\s*(?:<=?|≤|upto|up to|less than|below)\s*({_NUMBER})\s*$", re.IGNORECASE)
+_LOWER_RE = re.compile(rf"^\s*(?:>=?|≥|more than|greater than|above)\s*({_NUMBER})\s*$", re.IGNORECASE)
+_UNIT_RE = re.compile(r"^(?:%|[a-zµμ/]+[a-zµμ0-9/^.*\s]*|10\^\d+/[a-zµμ]+)$", re.IGNORECASE)
+
+_HEADER_KEYWORDS = {
+    "name": ("test", "parameter", "investigation", "analyte", "biomarker", "name", "component"),
+    "value": ("result", "value", "observed", "reading"),
+    "unit": ("unit",),
+    "range": ("reference", "range", "normal", "interval", "ref"),
+}
+_TEXT_TABLE_SETTINGS = {"vertical_strategy": "text", "horizontal_strategy": "text"}
+
+
+def _clean(cell) -> str:
+    return " ".join(str(cell).split()) if cell is not None else ""
+
+
+def _number(text: str):
+    """Normalise "250,000" (thousands) and "5,6" (decimal comma) to plain numbers."""
+    if re.fullmatch(r"[-+]?\d{1,3}(?:,\d{3})+(?:\.\d+)?", text):
+        return text.replace(",", "")
+    return text.replace(",", ".")
+
+
+def parse_reference_range(text: str):
+    """Parse a reference range into (ref_min, ref_max) strings ("" when open).
+
+    Handles "12.0-16.0", "0.5 to 1.2", "<200", "≤ 5.6", "Up to 40", ">40".
+    Returns None if the text isn't a range.
+    """
+    text = _clean(text)
+    m = _RANGE_RE.match(text)
+    if m:
+        return _number(m.group(1)), _number(m.group(2))
+    m = _UPPER_RE.match(text)
+    if m:
+        return "", _number(m.group(1))
+    m = _LOWER_RE.match(text)
+    if m:
+        return _number(m.group(1)), ""
+    return None
+
+
+def _header_columns(row: list):
+    """Map column roles from a header row, or None if it isn't one."""
+    columns = {}
+    for i, cell in enumerate(row):
+        label = _clean(cell).lower()
+        if not label:
+            continue
+        for role, keywords in _HEADER_KEYWORDS.items():
+            if role not in columns and any(k in label for k in keywords):
+                columns[role] = i
+                break
+    if "name" in columns and "value" in columns:
+        return columns
+    return None
+
+
+def _parse_row(cells: list, columns: dict = None):
+    """Turn one table row into a biomarker dict, or None if it doesn't look like one."""
+    cells = [_clean(c) for c in cells]
+    if columns:
+        def pick(role):
+            i = columns.get(role)
+            return cells[i] if i is not None and i < len(cells) else ""
+        name, value_text, unit, range_text = pick("name"), pick("value"), pick("unit"), pick("range")
+    else:
+        # No header: name first, then the first number, a unit-looking cell and a range.
+        name, value_text, unit, range_text = (cells[0] if cells else ""), "", "", ""
+        for cell in cells[1:]:
+            if not value_text and _LEADING_NUMBER_RE.match(cell) and not parse_reference_range(cell):
+                value_text = cell
+            elif not range_text and parse_reference_range(cell):
+                range_text = cell
+            elif not unit and value_text and _UNIT_RE.match(cell):
+                unit = cell
+
+    if not name or _NUMBER_RE.match(name):
+        return None
+    m = _LEADING_NUMBER_RE.match(value_text)
+    if not m:
+        return None
+    value = _number(m.group(1))
+    # Units sometimes trail the value in the same cell ("14.2 g/dL").
+    trailing = value_text[m.end():].strip()
+    if not unit and trailing and _UNIT_RE.match(trailing):
+        unit = trailing
+    ref_min, ref_max = parse_reference_range(range_text) or ("", "")
+    return {"name": name, "value": value, "unit": unit, "ref_min": ref_min, "ref_max": ref_max}
+
+
+def _biomarkers_from_table(table: list):
+    """Returns (biomarkers, candidate_rows, has_header)."""
+    columns = None
+    biomarkers, candidates = [], 0
+    for row in table:
+        if not row or not any(_clean(c) for c in row):
+            continue
+        header = _header_columns(row)
+        if header:
+            columns = header
+            continue
+        # Rows with no digits at all are section titles, not readings.
+        if not any(ch.isdigit() for c in row for ch in _clean(c)):
+            continue
+        candidates += 1
+        parsed = _parse_row(row, columns)
+        if parsed:
+            biomarkers.append(parsed)
+    return biomarkers, candidates, columns is not None
+
+
+def _score_tables(tables: list):
+    """Parse all tables from a report and score how much to trust the result."""
+    biomarkers, candidates, headers = [], 0, 0
+    seen = set()
+    for table in tables:
+        found, rows, has_header = _biomarkers_from_table(table)
+        candidates += rows
+        headers += has_header and bool(found)
+        for b in found:
+            key = (biomarker_code(b["name"]), b["value"])
+            if key not in seen:
+                seen.add(key)
+                biomarkers.append(b)
+    if not biomarkers:
+        return [], 0.0
+    parse_rate = min(len(biomarkers) / max(candidates, 1), 1.0)
+    known_rate = sum(biomarker_code(b["name"]) in BIOMARKER_ALIASES for b in biomarkers) / len(biomarkers)
+    header_factor = 1.0 if headers else 0.85
+    confidence = (0.6 * parse_rate + 0.4 * known_rate) * header_factor
+    return biomarkers, round(confidence, 3)
+
+
+def extract_biomarkers_from_tables(pdf) -> tuple:
+    """Rule-based biomarker extraction from an open pdfplumber document.
+
+    Reads ruled tables, falling back to text-aligned columns on pages without
+    any. Returns (biomarkers, confidence) where biomarkers use the same schema
+    as extract_biomarkers_from_text and confidence is in [0, 1].
+    """
+    tables = []
+    for page in pdf.pages:
+        page_tables = page.extract_tables()
+        if not page_tables:
+            page_tables = page.extract_tables(table_settings=_TEXT_TABLE_SETTINGS)
+        tables.extend(page_tables)
+    return _score_tables(tables)
+
+
+def parse_report_pdf(file_path: str) -> dict:
+    """Text plus table-based biomarkers from one pass over the PDF.
+
+    Runs in the ingestion process pool. Returns {"text", "biomarkers",
+    "confidence"}; on an unreadable file "text" carries the error message as
+    extract_text_from_pdf does.
+    """
+    try:
+        with pdfplumber.open(file_path) as pdf:
+            text = PAGE_SEPARATOR.join(t for t in (page.extract_text() for page in pdf.pages) if t)
+            biomarkers, confidence = extract_biomarkers_from_tables(pdf)
+    except Exception as e:
+        return {"text": f"Error extracting PDF: {str(e)}", "biomarkers": [], "confidence": 0.0}
+    return {"text": text, "biomarkers": biomarkers, "confidence": confidence}
@@ -0,0 +1,305 @@
+"""Hour, day and week rollups of manual logs.
+
+Each log_rollups row holds count, sum, sum of squares, min and max of
+`value` (and of `value2` where present) for one (user, log type,
+granularity, bucket). Inserts fold into the rollups in the same transaction
+as the logs; deletes re-aggregate the three buckets the row belonged to.
+Range queries then read one row per bucket instead of every raw log.
+
+Raw logs can be aged out with apply_retention(). The cut-off is aligned to
+the start of a week, so every bucket is either fully backed by raw rows or
+has none left, and rollups for aged-out buckets are kept as they are.
+"""
+import math
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+import numpy as np
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import Session
+from app.models.models import LogRollup, ManualLog
+from app.services.version_service import bump_data_version
+from app.utils.bulk import insert_in_batches, upsert
+
+GRANULARITIES = ("hour", "day", "week")
+BUCKET_SPAN = {"hour": timedelta(hours=1), "day": timedelta(days=1), "week": timedelta(weeks=1)}
+
+LOG_RAW_RETENTION_DAYS = int(os.getenv("LOG_RAW_RETENTION_DAYS", "0"))  # 0 keeps raw logs forever
+
+# count, sum, sumsq, min, max for value, then the same for value2
+_FIELDS = ("count", "sum", "sumsq", "min_value", "max_value", "count2", "sum2", "sumsq2", "min_value2", "max_value2")
+
+
+def naive_utc(ts: datetime) -> datetime:
+    """Timestamps are stored as naive UTC; convert aware input before writing it."""
+    return ts.astimezone(timezone.utc).replace(tzinfo=None) if ts.tzinfo is not None else ts
+
+
+def bucket_start(ts: datetime, granularity: str) -> datetime:
+    """Start of the bucket containing `ts`; weeks start on Monday."""
+    if granularity == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    day = ts.replace(hour=0, minute=0, second=0, microsecond=0)
+    return day if granularity == "day" else day - timedelta(days=day.weekday())
+
+
+def _truncate(ts: np.ndarray, granularity: str) -> np.ndarray:
+    """bucket_start() over a datetime64 array."""
+    if granularity == "hour":
+        return ts.astype("datetime64[h]")
+    days = ts.astype("datetime64[D]")
+    if granularity == "day":
+        return days
+    # 1970-01-01 was a Thursday; step back to the Monday of each week.
+    return days - (days.astype(np.int64) + 3) % 7
+
+
+def _none_if_nan(values: np.ndarray) -> list:
+    return [None if math.isnan(v) else v for v in values.tolist()]
+
+
+def _aggregate(logs) -> dict:
+    """(user_id, log_type, granularity, bucket_start) -> [count, sum, sumsq,
+    min, max, count2, sum2, sumsq2, min2, max2], from (user_id, log_type,
+    logged_at, value, value2) tuples. Buckets are reduced with NumPy per
+    series, so large imports don't pay a Python loop per row and bucket."""
+    series = defaultdict(lambda: ([], [], []))
+    for user_id, log_type, logged_at, value, value2 in logs:
+        ts, values, values2 = series[(user_id, log_type)]
+        ts.append(naive_utc(logged_at))
+        values.append(value)
+        values2.append(value2)
+
+    buckets = {}
+    for (user_id, log_type), (ts, values, values2) in series.items():
+        ts = np.array(ts, dtype="datetime64[us]")
+        v = np.array(values, dtype=float)
+        v2 = np.array(values2, dtype=float)  # None becomes NaN
+        present = ~np.isnan(v2)
+        for granularity in GRANULARITIES:
+            keys, inverse = np.unique(_truncate(ts, granularity), return_inverse=True)
+            order = np.argsort(inverse, kind="stable")
+            starts = np.searchsorted(inverse[order], np.arange(len(keys)))
+            columns = (
+                np.bincount(inverse, minlength=len(keys)).tolist(),
+                np.bincount(inverse, weights=v, minlength=len(keys)).tolist(),
+                np.bincount(inverse, weights=v * v, minlength=len(keys)).tolist(),
+                np.minimum.reduceat(v[order], starts).tolist(),
+                np.maximum.reduceat(v[order], starts).tolist(),
+                np.bincount(inverse, weights=present, minlength=len(keys)).astype(np.int64).tolist(),
+                np.bincount(inverse, weights=np.where(present, v2, 0.0), minlength=len(keys)).tolist(),
+                np.bincount(inverse, weights=np.where(present, v2 * v2, 0.0), minlength=len(keys)).tolist(),
+                _none_if_nan(np.fmin.reduceat(v2[order], starts)),
+                _none_if_nan(np.fmax.reduceat(v2[order], starts)),
+            )
+            for i, start in enumerate(keys.astype("datetime64[us]").tolist()):
+                buckets[(user_id, log_type, granularity, start)] = [column[i] for column in columns]
+    return buckets
+
+
+def _lower(current, new):
+    """SQL min of two nullable columns, ignoring NULL."""
+    return case(((new < current) | current.is_(None), new), else_=current)
+
+
+def _upper(current, new):
+    """SQL max of two nullable columns, ignoring NULL."""
+    return case(((new > current) | current.is_(None), new), else_=current)
+
+
+def add_to_rollups(db: Session, logs: list):
+    """Fold new logs, given as (user_id, log_type, logged_at, value, value2)
+    tuples, into their rollups. Call inside the inserting transaction.
+
+    Each bucket is one INSERT ... ON CONFLICT DO UPDATE that adds the
+    deltas, so concurrent writers into a bucket that doesn't exist yet
+    both land in the same row.
+    """
+    buckets = _aggregate(logs)
+    if not buckets:
+        return
+    rows = [
+        {"user_id": k[0], "log_type": k[1], "granularity": k[2], "bucket_start": k[3], **dict(zip(_FIELDS, acc))}
+        for k, acc in buckets.items()
+    ]
+    stmt = upsert(db, LogRollup)
+    new = stmt.excluded
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[LogRollup.user_id, LogRollup.log_type, LogRollup.granularity, LogRollup.bucket_start],
+        set_={
+            "count": LogRollup.count + new["count"],
+            "sum": LogRollup.sum + new.sum,
+            "sumsq": LogRollup.sumsq + new.sumsq,
+            "min_value": _lower(LogRollup.min_value, new.min_value),
+            "max_value": _upper(LogRollup.max_value, new.max_value),
+            "count2": LogRollup.count2 + new.count2,
+            "sum2": LogRollup.sum2 + new.sum2,
+            "sumsq2": LogRollup.sumsq2 + new.sumsq2,
+            "min_value2": _lower(LogRollup.min_value2, new.min_value2),
+            "max_value2": _upper(LogRollup.max_value2, new.max_value2),
+        },
+    )
+    insert_in_batches(db, LogRollup, rows, stmt=stmt)
+
+
+def _aggregate_columns():
+    return (
+        func.count(ManualLog.id),
+        func.coalesce(func.sum(ManualLog.value), 0.0),
+        func.coalesce(func.sum(ManualLog.value * ManualLog.value), 0.0),
+        func.min(ManualLog.value),
+        func.max(ManualLog.value),
+        func.count(ManualLog.value2),
+        func.coalesce(func.sum(ManualLog.value2), 0.0),
+        func.coalesce(func.sum(ManualLog.value2 * ManualLog.value2), 0.0),
+        func.min(ManualLog.value2),
+        func.max(ManualLog.value2),
+    )
+
+
+def remove_from_rollups(db: Session, user_id: int, log_type: str, logged_at: datetime):
+    """Re-aggregate the buckets a deleted log belonged to.
+
+    The delete must already be flushed. Min and max can't be reversed from
+    the running sums, so each bucket is recomputed from its raw rows, which
+    the (user_id, logged_at) index serves directly. Buckets before the raw
+    log retention cut-off are left as they are: their other raw rows may
+    already be gone.
+    """
+    cutoff = raw_log_cutoff()
+    if logged_at is None or (cutoff is not None and logged_at < cutoff):
+        return
+    for granularity in GRANULARITIES:
+        start = bucket_start(logged_at, granularity)
+        acc = db.execute(
+            select(*_aggregate_columns()).where(
+                ManualLog.user_id == user_id,
+                ManualLog.log_type == log_type,
+                ManualLog.logged_at >= start,
+                ManualLog.logged_at < start + BUCKET_SPAN[granularity],
+            )
+        ).one()
+        row = (
+            db.query(LogRollup)
+            .filter(
+                LogRollup.user_id == user_id,
+                LogRollup.log_type == log_type,
+                LogRollup.granularity == granularity,
+                LogRollup.bucket_start == start,
+            )
+            .with_for_update()
+            .first()
+        )
+        if row is None:
+            continue
+        if acc[0] == 0:
+            db.delete(row)
+            continue
+        for field, value in zip(_FIELDS, acc):
+            setattr(row, field, value)
+
+
+def rebuild_rollups(db: Session, user_id: int = None, full: bool = False) -> int:
+    """Recompute rollups from raw logs. Returns rows written.
+
+    For each (user, log type) only buckets from the week of its oldest raw
+    log onward are rebuilt, and never those before the raw log retention
+    cut-off: older buckets may have lost some or all of their raw rows and
+    are kept. `full` drops the cut-off, for building a new, empty table
+    while every raw row is still there.
+    """
+    cutoff = None if full else raw_log_cutoff()
+    oldest = db.query(ManualLog.user_id, ManualLog.log_type, func.min(ManualLog.logged_at)).group_by(
+        ManualLog.user_id, ManualLog.log_type
+    )
+    source = db.query(ManualLog.user_id, ManualLog.log_type, ManualLog.logged_at, ManualLog.value, ManualLog.value2)
+    source = source.filter(ManualLog.logged_at.isnot(None))
+    if user_id is not None:
+        oldest = oldest.filter(ManualLog.user_id == user_id)
+        source = source.filter(ManualLog.user_id == user_id)
+    if cutoff is not None:
+        oldest = oldest.filter(ManualLog.logged_at >= cutoff)
+        source = source.filter(ManualLog.logged_at >= cutoff)
+
+    for uid, log_type, first_logged in oldest.all():
+        if first_logged is None:
+            continue
+        db.query(LogRollup).filter(
+            LogRollup.user_id == uid,
+            LogRollup.log_type == log_type,
+            LogRollup.bucket_start >= bucket_start(first_logged, "week"),
+        ).delete(synchronize_session=False)
+
+    buckets = _aggregate(row for row in source.yield_per(5000))
+    rows = [
+        {"user_id": k[0], "log_type": k[1], "granularity": k[2], "bucket_start": k[3], **dict(zip(_FIELDS, acc))}
+        for k, acc in buckets.items()
+    ]
+    insert_in_batches(db, LogRollup, rows)
+    db.commit()
+    return len(rows)
+
+
+def retention_cutoff(days: int, now: Optional[datetime] = None) -> datetime:
+    """Start of the week containing now - days, so no bucket straddles it."""
+    return bucket_start((now or datetime.utcnow()) - timedelta(days=days), "week")
+
+
+def raw_log_cutoff(now: Optional[datetime] = None) -> Optional[datetime]:
+    """The cut-off for LOG_RAW_RETENTION_DAYS, or None when raw logs are kept forever.
+
+    Logs before it can't be written, and their rollups are never recomputed.
+    """
+    return retention_cutoff(LOG_RAW_RETENTION_DAYS, now) if LOG_RAW_RETENTION_DAYS > 0 else None
+
+
+def apply_retention(db: Session, days: int = LOG_RAW_RETENTION_DAYS, now: Optional[datetime] = None) -> int:
+    """Delete raw logs older than the cut-off, keeping their rollups. Returns rows deleted."""
+    if days <= 0:
+        return 0
+    cutoff = retention_cutoff(days, now)
+    users = [u for (u,) in db.query(ManualLog.user_id).filter(ManualLog.logged_at < cutoff).distinct()]
+    deleted = db.query(ManualLog).filter(ManualLog.logged_at < cutoff).delete(synchronize_session=False)
+    for user_id in users:
+        bump_data_version(db, user_id, "logs")
+    db.commit()
+    return deleted
+
+
+def _moments(count: int, total: float, sumsq: float) -> tuple:
+    """Mean and population standard deviation from running sums."""
+    if not count:
+        return None, None
+    mean = total / count
+    return mean, math.sqrt(max(sumsq / count - mean * mean, 0.0))
+
+
+def query_rollups(db: Session, user_id: int, log_type: str, granularity: str,
+                  start: Optional[datetime] = None, end: Optional[datetime] = None) -> list:
+    query = db.query(LogRollup).filter(
+        LogRollup.user_id == user_id,
+        LogRollup.log_type == log_type,
+        LogRollup.granularity == granularity,
+    )
+    if start is not None:
+        query = query.filter(LogRollup.bucket_start >= bucket_start(naive_utc(start), granularity))
+    if end is not None:
+        query = query.filter(LogRollup.bucket_start <= naive_utc(end))
+
+    out = []
+    for r in query.order_by(LogRollup.bucket_start.asc()):
+        mean, std = _moments(r.count, r.sum, r.sumsq)
+        bucket = {
+            "bucket_start": r.bucket_start,
+            "count": r.count,
+            "mean": mean,
+            "std": std,
+            "min": r.min_value,
+            "max": r.max_value,
+        }
+        if r.count2:
+            mean2, std2 = _moments(r.count2, r.sum2, r.sumsq2)
+            bucket.update({"value2_mean": mean2, "value2_std": std2, "value2_min": r.min_value2, "value2_max": r.max_value2})
+        out.append(bucket)
+    return out
@@ -0,0 +1,151 @@
+"""Downsample a time series to a chart-sized number of points.
+
+Two reductions over the same columnar arrays (timestamps, value, optional
+value2):
+
+- LTTB (Largest-Triangle-Three-Buckets) keeps real points chosen to
+  preserve the visual shape. With value2 (diastolic) present, one point per
+  bucket is chosen for both series together so each kept reading stays a
+  systolic/diastolic pair.
+- Time buckets split [start, end] into equal-width intervals and report
+  count, min, mean and max per non-empty bucket, for value and value2.
+"""
+from datetime import datetime, timedelta
+from typing import Optional
+import numpy as np
+from sqlalchemy import Float, cast, extract, select
+from sqlalchemy.orm import Session
+from app.services.rollup_service import naive_utc
+
+MAX_SERIES_POINTS = 5000
+EPOCH = datetime(1970, 1, 1)
+
+
+def load_columns(db: Session, ts_col, value_col, value2_col, *criteria):
+    """One ordered, columnar fetch: (epoch seconds, value, value2 or None) arrays.
+
+    The database converts timestamps to epoch seconds, which skips building
+    a datetime object per row.
+    """
+    columns = [cast(extract("epoch", ts_col), Float), value_col] + ([value2_col] if value2_col is not None else [])
+    rows = db.execute(
+        select(*columns).where(ts_col.isnot(None), *criteria).order_by(ts_col.asc())
+    ).all()
+    if not rows:
+        empty = np.empty(0)
+        return empty, empty, (empty if value2_col is not None else None)
+    cols = [np.array(col, dtype=float) for col in zip(*rows)]  # NULL value2 becomes NaN
+    value2 = cols[2] if value2_col is not None and not np.isnan(cols[2]).all() else None
+    return cols[0], cols[1], value2
+
+
+def _normalized(y: np.ndarray) -> np.ndarray:
+    lo, hi = np.nanmin(y), np.nanmax(y)
+    scaled = (y - lo) / (hi - lo) if hi > lo else np.zeros_like(y)
+    return np.where(np.isnan(scaled), np.nanmean(scaled), scaled)
+
+
+def lttb_indices(x: np.ndarray, ys: np.ndarray, threshold: int) -> np.ndarray:
+    """Indices kept by LTTB. `ys` is (series, n); triangle areas are summed across series."""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # threshold - 2 buckets over the interior points; each is non-empty
+    # because the bucket width (n - 2) / (threshold - 2) is at least 1.
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    sizes = np.diff(edges)
+    avg_x = np.append(np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / sizes, x[-1])
+    avg_y = np.hstack([np.add.reduceat(ys[:, 1:n - 1], edges[:-1] - 1, axis=1) / sizes, ys[:, -1:]])
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        ax, ay = x[a], ys[:, a:a + 1]
+        cx, cy = avg_x[i + 1], avg_y[:, i + 1:i + 2]
+        area = np.abs((ax - cx) * (ys[:, lo:hi] - ay) - (ax - x[lo:hi]) * (cy - ay)).sum(axis=0)
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def _epoch(dt: datetime) -> float:
+    return (dt - EPOCH).total_seconds()
+
+
+def _iso(ts: float) -> str:
+    return (EPOCH + timedelta(seconds=float(ts))).isoformat()
+
+
+def _num(v) -> Optional[float]:
+    return None if np.isnan(v) else float(v)
+
+
+def lttb_series(ts: np.ndarray, value: np.ndarray, value2: Optional[np.ndarray], points: int) -> list:
+    if len(ts) == 0:
+        return []
+    ys = np.vstack([_normalized(value)] + ([_normalized(value2)] if value2 is not None else []))
+    keep = lttb_indices(ts - ts[0], ys, points)
+    out = []
+    for i in keep:
+        point = {"t": _iso(ts[i]), "value": float(value[i])}
+        if value2 is not None:
+            point["value2"] = _num(value2[i])
+        out.append(point)
+    return out
+
+
+def _bucket_stats(y: np.ndarray, starts: np.ndarray) -> tuple:
+    """count, min, mean, max per segment; NaNs (missing values) are ignored."""
+    present = ~np.isnan(y)
+    count = np.add.reduceat(present.astype(np.int64), starts)
+    total = np.add.reduceat(np.where(present, y, 0.0), starts)
+    mean = np.divide(total, count, out=np.full(len(starts), np.nan), where=count > 0)
+    return count, np.fmin.reduceat(y, starts), mean, np.fmax.reduceat(y, starts)
+
+
+def bucket_series(ts: np.ndarray, value: np.ndarray, value2: Optional[np.ndarray], start: float, end: float, buckets: int) -> list:
+    if len(ts) == 0:
+        return []
+    width = max((end - start) / buckets, 1e-9)
+    index = np.minimum(((ts - start) // width).astype(np.int64), buckets - 1)
+    occupied, starts = np.unique(index, return_index=True)
+
+    count, lo, mean, hi = _bucket_stats(value, starts)
+    if value2 is not None:
+        count2, lo2, mean2, hi2 = _bucket_stats(value2, starts)
+
+    out = []
+    for i, b in enumerate(occupied):
+        bucket = {
+            "t": _iso(start + b * width),
+            "count": int(count[i]),
+            "min": float(lo[i]),
+            "mean": float(mean[i]),
+            "max": float(hi[i]),
+        }
+        if value2 is not None:
+            bucket.update({"value2_min": _num(lo2[i]), "value2_mean": _num(mean2[i]), "value2_max": _num(hi2[i])})
+        out.append(bucket)
+    return out
+
+
+def build_series(db: Session, ts_col, value_col, value2_col, criteria: list, method: str, points: int,
+                 start: Optional[datetime] = None, end: Optional[datetime] = None) -> dict:
+    if start is not None:
+        start = naive_utc(start)
+        criteria = criteria + [ts_col >= start]
+    if end is not None:
+        end = naive_utc(end)
+        criteria = criteria + [ts_col <= end]
+    ts, value, value2 = load_columns(db, ts_col, value_col, value2_col, *criteria)
+
+    if method == "buckets":
+        range_start = _epoch(start) if start is not None else (ts[0] if len(ts) else 0.0)
+        range_end = _epoch(end) if end is not None else (ts[-1] if len(ts) else range_start)
+        data = bucket_series(ts, value, value2, range_start, range_end, points)
+    else:
+        data = lttb_series(ts, value, value2, points)
+    return {"method": method, "total": int(len(ts)), "returned": len(data), "points": data}
@@ -0,0 +1,202 @@
+import math
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.models.models import Biomarker, BiomarkerStats
+
+# z-score cut-offs for anomalies (dashboard, /anomalies and ingest alerts)
+Z_THRESHOLD = 2.5
+Z_HIGH = 3.0
+MIN_POINTS = 3
+
+
+def _load_stats(db: Session, user_id: int, codes) -> dict:
+    rows = (
+        db.query(BiomarkerStats)
+        .filter(BiomarkerStats.user_id == user_id, BiomarkerStats.code.in_(list(codes)))
+        .with_for_update()
+        .all()
+    )
+    return {s.code: s for s in rows}
+
+
+def std_of(stats: BiomarkerStats) -> float:
+    """Population standard deviation, matching np.std."""
+    if not stats.count:
+        return 0.0
+    return math.sqrt(max(stats.m2, 0.0) / stats.count)
+
+
+def z_score(stats: BiomarkerStats, value: float):
+    std = std_of(stats)
+    if stats.count < MIN_POINTS or std == 0:
+        return None
+    return abs((value - stats.mean) / std)
+
+
+def add_to_stats(db: Session, user_id: int, biomarkers: list) -> dict:
+    """Fold newly inserted biomarker rows into the running statistics.
+
+    Call inside the same transaction as the inserts. Returns the updated
+    stats keyed by biomarker code.
+    """
+    if not biomarkers:
+        return {}
+    stats = _load_stats(db, user_id, {b.code for b in biomarkers})
+    for b in biomarkers:
+        s = stats.get(b.code)
+        if s is None:
+            s = BiomarkerStats(user_id=user_id, code=b.code, name=b.name, count=0, mean=0.0, m2=0.0)
+            db.add(s)
+            stats[b.code] = s
+        s.count += 1
+        delta = b.value - s.mean
+        s.mean += delta / s.count
+        s.m2 += delta * (b.value - s.mean)
+        s.min_value = b.value if s.min_value is None else min(s.min_value, b.value)
+        s.max_value = b.value if s.max_value is None else max(s.max_value, b.value)
+        if s.last_recorded_at is None or (b.recorded_at and b.recorded_at >= s.last_recorded_at):
+            s.last_value = b.value
+            s.last_recorded_at = b.recorded_at
+            s.name = b.name
+    return stats
+
+
+def remove_from_stats(db: Session, user_id: int, removed: list):
+    """Back removed rows out of the running statistics.
+
+    `removed` holds (code, value) pairs of rows that have already been deleted
+    (flushed) in this transaction. Count, mean and M2 are reversed exactly;
+    min, max and last value are re-read for the affected codes only.
+    """
+    if not removed:
+        return
+    stats = _load_stats(db, user_id, {code for code, _ in removed})
+    for code, value in removed:
+        s = stats.get(code)
+        if s is None or s.count == 0:
+            continue
+        if s.count == 1:
+            s.count, s.mean, s.m2 = 0, 0.0, 0.0
+            continue
+        old_mean = s.mean
+        s.count -= 1
+        s.mean = (old_mean * (s.count + 1) - value) / s.count
+        s.m2 = max(s.m2 - (value - s.mean) * (value - old_mean), 0.0)
+
+    for code, s in stats.items():
+        if s.count == 0:
+            db.delete(s)
+            continue
+        s.min_value, s.max_value = (
+            db.query(func.min(Biomarker.value), func.max(Biomarker.value))
+            .filter(Biomarker.user_id == user_id, Biomarker.code == code)
+            .one()
+        )
+        last = (
+            db.query(Biomarker.value, Biomarker.recorded_at, Biomarker.name)
+            .filter(Biomarker.user_id == user_id, Biomarker.code == code)
+            .order_by(Biomarker.recorded_at.desc(), Biomarker.id.desc())
+            .first()
+        )
+        if last:
+            s.last_value, s.last_recorded_at, s.name = last
+        else:
+            s.last_value, s.last_recorded_at = None, None
+
+
+def flag_new_points(stats: dict, biomarkers: list) -> list:
+    """Anomalies among freshly ingested rows, scored against the updated stats."""
+    flagged = []
+    for b in biomarkers:
+        s = stats.get(b.code)
+        z = z_score(s, b.value) if s is not None else None
+        if z is not None and z > Z_THRESHOLD:
+            flagged.append(_anomaly(b.id, b.name, b.code, b.value, z, b.recorded_at))
+    return flagged
+
+
+def query_anomalies(db: Session, user_id: int) -> list:
+    """Historical anomalies using the stats table.
+
+    The z-score cut-off is pushed into SQL as (v - mean)^2 > t^2 * M2 / n, so
+    only anomalous rows come back instead of the user's full history.
+    """
+    deviation = Biomarker.value - BiomarkerStats.mean
+    rows = (
+        db.query(Biomarker.id, Biomarker.name, Biomarker.code, Biomarker.value, Biomarker.recorded_at, BiomarkerStats.mean, BiomarkerStats.m2, BiomarkerStats.count)
+        .join(BiomarkerStats, (BiomarkerStats.user_id == Biomarker.user_id) & (BiomarkerStats.code == Biomarker.code))
+        .filter(
+            Biomarker.user_id == user_id,
+            BiomarkerStats.count >= MIN_POINTS,
+            BiomarkerStats.m2 > 0,
+            deviation * deviation * BiomarkerStats.count > Z_THRESHOLD ** 2 * BiomarkerStats.m2,
+        )
+        .order_by(Biomarker.code, Biomarker.recorded_at.asc())
+        .all()
+    )
+    return [
+        _anomaly(r.id, r.name, r.code, r.value, abs(r.value - r.mean) / math.sqrt(r.m2 / r.count), r.recorded_at)
+        for r in rows
+    ]
+
+
+def stats_summary(db: Session, user_id: int) -> list:
+    rows = db.query(BiomarkerStats).filter(BiomarkerStats.user_id == user_id).order_by(BiomarkerStats.code).all()
+    return [
+        {
+            "code": s.code,
+            "name": s.name,
+            "count": s.count,
+            "mean": round(s.mean, 4),
+            "std": round(std_of(s), 4),
+            "min": s.min_value,
+            "max": s.max_value,
+            "last_value": s.last_value,
+            "last_recorded_at": s.last_recorded_at,
+            "last_z_score": _rounded(z_score(s, s.last_value)) if s.last_value is not None else None,
+        }
+        for s in rows
+    ]
+
+
+def rebuild_stats(db: Session, user_id: int = None) -> int:
+    """Recompute the stats table from raw biomarker rows. Returns rows written."""
+    cleanup = db.query(BiomarkerStats)
+    source = db.query(Biomarker).order_by(Biomarker.user_id, Biomarker.recorded_at.asc(), Biomarker.id.asc())
+    if user_id is not None:
+        cleanup = cleanup.filter(BiomarkerStats.user_id == user_id)
+        source = source.filter(Biomarker.user_id == user_id)
+    cleanup.delete(synchronize_session=False)
+
+    batch, batch_user = [], None
+    for b in source.yield_per(1000):
+        if batch and (b.user_id != batch_user or len(batch) >= 1000):
+            add_to_stats(db, batch_user, batch)
+            db.flush()
+            batch = []
+        batch_user = b.user_id
+        batch.append(b)
+    if batch:
+        add_to_stats(db, batch_user, batch)
+    db.commit()
+
+    written = db.query(BiomarkerStats)
+    if user_id is not None:
+        written = written.filter(BiomarkerStats.user_id == user_id)
+    return written.count()
+
+
+def _rounded(z):
+    return round(z, 2) if z is not None else None
+
+
+def _anomaly(biomarker_id, name, code, value, z, recorded_at) -> dict:
+    return {
+        "biomarker_id": biomarker_id,
+        "name": name,
+        "code": code,
+        "value": value,
+        "z_score": round(z, 2),
+        "recorded_at": recorded_at.isoformat() if recorded_at else None,
+        "severity": "high" if z > Z_HIGH else "medium",
+    }
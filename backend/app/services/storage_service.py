@@ -0,0 +1,105 @@
+import hashlib
+import os
+import tempfile
+import uuid
+from fastapi import UploadFile
+from sqlalchemy.orm import Session
+from app.models.models import Report
+
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "./uploads")
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", "25")) * 1024 * 1024
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+def blob_path(digest: str) -> str:
+    """Content-addressed location: <UPLOAD_DIR>/<first two hex chars>/<sha256>.pdf"""
+    return os.path.join(UPLOAD_DIR, digest[:2], f"{digest}.pdf")
+
+
+async def save_upload(file: UploadFile, max_bytes: int = MAX_UPLOAD_BYTES):
+    """Stream an upload to a staging file in UPLOAD_DIR.
+
+    The body is copied in fixed-size chunks while its SHA-256 is computed, so
+    the whole PDF never sits in memory. Returns (digest, staged_path, size);
+    raises UploadTooLarge past max_bytes. Register the report, commit, then
+    call place_upload() to move the file to its content-addressed location.
+    """
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    hasher = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=UPLOAD_DIR, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(f"Upload exceeds {max_bytes // (1024 * 1024)} MB limit")
+                hasher.update(chunk)
+                out.write(chunk)
+        return hasher.hexdigest(), tmp_path, size
+    except BaseException:
+        discard_upload(tmp_path)
+        raise
+
+
+def place_upload(digest: str, staged_path: str) -> str:
+    """Move a staged upload into content-addressed storage; identical content is stored once.
+
+    Call only after the report referencing `digest` has committed: from then
+    on release_file() sees the reference, and if it had already set the old
+    blob aside this puts the content back.
+    """
+    path = blob_path(digest)
+    if os.path.exists(path):
+        os.remove(staged_path)
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(staged_path, path)
+    return path
+
+
+def discard_upload(staged_path: str):
+    if os.path.exists(staged_path):
+        os.remove(staged_path)
+
+
+def release_file(db: Session, content_hash: str, file_path: str):
+    """Remove a deleted report's file once no other report references it.
+
+    Reference counts come from the indexed reports.content_hash column, so
+    they can't drift from the rows themselves. Reports stored before content
+    addressing (no hash) own their file outright. Call after the deleting
+    transaction has committed.
+
+    A concurrent upload of the same content commits its report before
+    placing its blob, so the blob is first renamed aside and the references
+    checked again: if a report appeared in between, the blob goes back.
+    """
+    if not content_hash:
+        if file_path and os.path.exists(file_path):
+            os.remove(file_path)
+        return
+
+    def referenced() -> bool:
+        db.rollback()  # fresh snapshot, so reports committed meanwhile are visible
+        return db.query(Report.id).filter(Report.content_hash == content_hash).first() is not None
+
+    if referenced():
+        return
+    path = blob_path(content_hash)
+    aside = f"{path}.{uuid.uuid4().hex}.deleting"
+    try:
+        os.rename(path, aside)
+    except FileNotFoundError:
+        return
+    if referenced():
+        os.replace(aside, path)
+    else:
+        os.remove(aside)
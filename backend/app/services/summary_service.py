@@ -0,0 +1,153 @@
+"""Stored health summaries, regenerated only when the data behind them changes.
+
+A summary is kept per user with the biomarkers data version it was built from
+and a watermark (the highest biomarker id it covered). Requests with an
+unchanged version get the stored summary back. When readings were only added
+since then, the previous summary is revised from the new readings alone;
+deletions, `force`, or SUMMARY_MAX_INCREMENTAL revisions in a row trigger a
+full rebuild from the compacted history.
+"""
+import json
+import os
+from datetime import datetime
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.models.models import Biomarker, HealthSummary
+from app.services.history_compaction import compact_history
+from app.services.version_service import get_data_versions
+from app.utils.bulk import upsert
+from app.ai.openai_service import generate_health_summary, update_health_summary
+
+SUMMARY_MAX_INCREMENTAL = int(os.getenv("SUMMARY_MAX_INCREMENTAL", "5"))
+
+
+class NoBiomarkerData(Exception):
+    pass
+
+
+def _biomarker_rows(db: Session, user_id: int):
+    return db.query(
+        Biomarker.id, Biomarker.name, Biomarker.code, Biomarker.value, Biomarker.unit,
+        Biomarker.ref_min, Biomarker.ref_max, Biomarker.recorded_at,
+    ).filter(Biomarker.user_id == user_id)
+
+
+def serialize_summary(stored: HealthSummary, cached: bool) -> dict:
+    return {
+        **json.loads(stored.summary),
+        "generated_at": stored.updated_at,
+        "mode": stored.mode,
+        "cached": cached,
+    }
+
+
+def get_stored_summary(db: Session, user_id: int):
+    return db.query(HealthSummary).filter(HealthSummary.user_id == user_id).first()
+
+
+def _can_update_incrementally(db: Session, user_id: int, stored: HealthSummary) -> bool:
+    if stored.incremental_updates >= SUMMARY_MAX_INCREMENTAL:
+        return False
+    # Any deleted reading at or below the watermark means the old summary may
+    # describe data that no longer exists.
+    covered = (
+        db.query(func.count(Biomarker.id))
+        .filter(Biomarker.user_id == user_id, Biomarker.id <= stored.watermark_id)
+        .scalar()
+    )
+    return covered == stored.biomarker_count
+
+
+def _delta_rows(db: Session, user_id: int, watermark_id: int):
+    """Readings added after the watermark, each series preceded by its last earlier reading."""
+    delta = _biomarker_rows(db, user_id).filter(Biomarker.id > watermark_id).all()
+    if not delta:
+        return [], []
+    codes = {b.code for b in delta}
+    previous_ids = (
+        db.query(func.max(Biomarker.id))
+        .filter(Biomarker.user_id == user_id, Biomarker.id <= watermark_id, Biomarker.code.in_(codes))
+        .group_by(Biomarker.code)
+    )
+    previous = _biomarker_rows(db, user_id).filter(Biomarker.id.in_(previous_ids)).all()
+    return previous, delta
+
+
+def _plan(db: Session, user_id: int, force: bool) -> dict:
+    """Decide what to do and gather its inputs: a cached answer, an incremental update or a full build."""
+    # Read the version before the data so a concurrent write can only make
+    # the stored summary look stale, never fresh.
+    (version,) = get_data_versions(db, user_id, ("biomarkers",))
+    stored = get_stored_summary(db, user_id)
+    if stored is not None and not force and stored.data_version == version:
+        return {"cached": serialize_summary(stored, cached=True)}
+
+    if stored is not None and not force and _can_update_incrementally(db, user_id, stored):
+        previous, delta = _delta_rows(db, user_id, stored.watermark_id)
+        if not delta:
+            # Version moved without new readings (e.g. a report with no biomarkers).
+            stored.data_version = version
+            db.commit()
+            return {"cached": serialize_summary(stored, cached=True)}
+        rows = sorted(previous + delta, key=lambda b: (b.recorded_at, b.id))
+        return {
+            "mode": "incremental",
+            "version": version,
+            "previous": json.loads(stored.summary),
+            "history": compact_history(rows),
+            "watermark_id": max(b.id for b in delta),
+            "biomarker_count": stored.biomarker_count + len(delta),
+        }
+
+    rows = _biomarker_rows(db, user_id).order_by(Biomarker.recorded_at.asc(), Biomarker.id.asc()).all()
+    if not rows:
+        # Every reading was deleted: drop the summary that described them.
+        if stored is not None:
+            db.delete(stored)
+            db.commit()
+        raise NoBiomarkerData()
+    return {
+        "mode": "full",
+        "version": version,
+        # Whole history reduced to per-series features under the token budget
+        "history": compact_history(rows),
+        "watermark_id": max(b.id for b in rows),
+        "biomarker_count": len(rows),
+    }
+
+
+def _save(db: Session, user_id: int, plan: dict, summary: dict) -> dict:
+    """Store the summary; an upsert, so concurrent first generations share the user's one row."""
+    now = datetime.utcnow()
+    fields = {
+        "summary": json.dumps(summary),
+        "mode": plan["mode"],
+        "watermark_id": plan["watermark_id"],
+        "biomarker_count": plan["biomarker_count"],
+        "data_version": plan["version"],
+        "updated_at": now,
+    }
+    stmt = upsert(db, HealthSummary).values(user_id=user_id, incremental_updates=0, created_at=now, **fields)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[HealthSummary.user_id],
+        set_={
+            **fields,
+            "incremental_updates": HealthSummary.incremental_updates + 1 if plan["mode"] == "incremental" else 0,
+        },
+    ))
+    db.commit()
+    return serialize_summary(get_stored_summary(db, user_id), cached=False)
+
+
+async def get_or_generate_summary(db: AsyncSession, user_id: int, force: bool = False) -> dict:
+    plan = await db.run_sync(_plan, user_id, force)
+    if "cached" in plan:
+        return plan["cached"]
+    # No connection is held while the model works.
+    await db.close()
+    if plan["mode"] == "incremental":
+        summary = await update_health_summary(plan["previous"], plan["history"])
+    else:
+        summary = await generate_health_summary(plan["history"])
+    return await db.run_sync(_save, user_id, plan, summary)
@@ -0,0 +1,41 @@
+"""Per-user data version counters.
+
+Every write to a user's data bumps the counter for the domains it touches, in
+the same transaction as the write. Anything derived from that data (cached
+chat context, stored summaries, HTTP validators) can then tell whether it is
+stale with one indexed lookup instead of re-reading the data itself.
+"""
+from datetime import datetime
+from sqlalchemy.orm import Session
+from app.models.models import DataVersion
+from app.utils.bulk import upsert
+
+DATA_DOMAINS = ("reports", "biomarkers", "logs", "medicines")
+
+
+def bump_data_version(db: Session, user_id: int, *domains: str):
+    """Increment the counters for `domains`, creating missing ones. The caller commits.
+
+    One INSERT ... ON CONFLICT DO UPDATE, so repeated calls in a transaction
+    and concurrent first writes for a user both land on the single row per
+    (user, domain).
+    """
+    now = datetime.utcnow()
+    stmt = upsert(db, DataVersion).values([
+        {"user_id": user_id, "domain": domain, "version": 1, "updated_at": now}
+        for domain in dict.fromkeys(domains)
+    ])
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[DataVersion.user_id, DataVersion.domain],
+        set_={"version": DataVersion.version + 1, "updated_at": now},
+    ))
+
+
+def get_data_versions(db: Session, user_id: int, domains=DATA_DOMAINS) -> tuple:
+    """Current counters for `domains`, in order (0 for a domain never written)."""
+    rows = dict(
+        db.query(DataVersion.domain, DataVersion.version)
+        .filter(DataVersion.user_id == user_id, DataVersion.domain.in_(domains))
+        .all()
+    )
+    return tuple(rows.get(domain, 0) for domain in domains)
@@ -1,12 +1,17 @@
+import hmac
+import ipaddress
 import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
-from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, Header, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
-from app.database import get_db
+from app.database import get_db, SessionLocal
 from app.models.models import User
 import logging
 
@@ -15,19 +20,13 @@ logger = logging.getLogger("auth")
 SECRET_KEY = os.getenv("SECRET_KEY", "super-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24  # 24 hours
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "60"))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "10000"))
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
-
-
-def verify_password(plain: str, hashed: str) -> bool:
-    return pwd_context.verify(plain, hashed)
-
-
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
@@ -35,28 +34,142 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
-    credentials_exception = HTTPException(
+def create_user_token(user: User) -> str:
+    return create_access_token({"sub": str(user.id), "ver": user.token_version or 0})
+
+
+@dataclass(frozen=True)
+class Principal:
+    """The authenticated caller, without an ORM load."""
+    id: int
+    email: str
+    full_name: str
+    token_version: int
+
+
+class PrincipalCache:
+    """Bounded LRU of token -> Principal with a short TTL.
+
+    Entries never outlive the token's own expiry. Password changes bump
+    users.token_version and call invalidate_user(); other processes pick the
+    change up when their entry's TTL runs out.
+    """
+
+    def __init__(self, ttl_seconds: float = AUTH_CACHE_TTL_SECONDS, max_entries: int = AUTH_CACHE_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # token -> (principal, expires_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, token: str) -> Optional[Principal]:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is not None and entry[1] > time.time():
+                self._entries.move_to_end(token)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[token]
+            self.misses += 1
+            return None
+
+    def put(self, token: str, principal: Principal, token_expires_at: float):
+        expires_at = min(time.time() + self.ttl_seconds, token_expires_at)
+        with self._lock:
+            self._entries[token] = (principal, expires_at)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            stale = [token for token, (principal, _) in self._entries.items() if principal.id == user_id]
+            for token in stale:
+                del self._entries[token]
+            self.invalidations += len(stale)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+            }
+
+
+principal_cache = PrincipalCache()
+
+
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    # Log token for debugging (first 40 chars)
-    try:
-        logger.info(f"get_current_user token={token[:40]}...")
-    except Exception:
-        pass
+
+
+def _decode(token: str) -> dict:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id = int(payload.get("sub"))
-        logger.info(f"decoded payload sub={user_id}")
-        if user_id is None:
-            raise credentials_exception
-    except JWTError:
-        logger.warning("JWTError during token decode")
-        raise credentials_exception
-
-    user = db.query(User).filter(User.id == user_id).first()
+        int(payload["sub"])
+        return payload
+    except (JWTError, KeyError, TypeError, ValueError):
+        logger.warning("Rejected an invalid or expired token")
+        raise _credentials_exception()
+
+
+def get_current_principal(token: str = Depends(oauth2_scheme)) -> Principal:
+    """Resolve the bearer token, hitting the database only on a cache miss."""
+    principal = principal_cache.get(token)
+    if principal is not None:
+        return principal
+
+    payload = _decode(token)
+    db = SessionLocal()
+    try:
+        row = (
+            db.query(User.id, User.email, User.full_name, User.token_version)
+            .filter(User.id == int(payload["sub"]))
+            .first()
+        )
+    finally:
+        db.close()
+    if row is None or (row.token_version or 0) != payload.get("ver", 0):
+        raise _credentials_exception()
+
+    principal = Principal(id=row.id, email=row.email, full_name=row.full_name or "", token_version=row.token_version or 0)
+    principal_cache.put(token, principal, float(payload["exp"]))
+    return principal
+
+
+def get_current_user(principal: Principal = Depends(get_current_principal), db: Session = Depends(get_db)) -> User:
+    """The full ORM row, for handlers that modify the user itself."""
+    user = db.query(User).filter(User.id == principal.id).first()
     if user is None:
-        raise credentials_exception
+        raise _credentials_exception()
     return user
+
+
+def require_metrics_access(request: Request, x_metrics_token: Optional[str] = Header(None)):
+    """Guard for operational endpoints such as /metrics.
+
+    With METRICS_TOKEN set, callers must send it in X-Metrics-Token;
+    without one, only loopback clients (a scraper on the same host or in the
+    same container) are let in.
+    """
+    if METRICS_TOKEN:
+        if x_metrics_token and hmac.compare_digest(x_metrics_token.encode(), METRICS_TOKEN.encode()):
+            return
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not allowed")
+    try:
+        loopback = request.client is not None and ipaddress.ip_address(request.client.host).is_loopback
+    except ValueError:
+        loopback = False
+    if not loopback:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not allowed")
@@ -0,0 +1,41 @@
+"""Multi-row inserts in fixed-size batches, and upserts."""
+import os
+from sqlalchemy import insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+BULK_INSERT_BATCH_SIZE = int(os.getenv("BULK_INSERT_BATCH_SIZE", "500"))
+
+_UPSERT_DIALECTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def upsert(db: Session, model):
+    """INSERT for the session's database that supports .on_conflict_do_update().
+
+    Lets concurrent writers create-or-update a row keyed by a unique
+    constraint without a read-then-insert race.
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect not in _UPSERT_DIALECTS:
+        raise NotImplementedError(f"No upsert support for {dialect} databases")
+    return _UPSERT_DIALECTS[dialect](model)
+
+
+def insert_in_batches(db: Session, model, rows: list, returning: tuple = (), batch_size: int = BULK_INSERT_BATCH_SIZE,
+                      stmt=None) -> list:
+    """Insert dict rows as executemany batches; returns the `returning` columns in input order.
+
+    `stmt` replaces the plain insert(model), e.g. with an upsert(). Bypasses
+    the unit of work, so ORM defaults computed in Python (e.g.
+    datetime.utcnow) must already be filled in. The caller commits.
+    """
+    stmt = insert(model) if stmt is None else stmt
+    if returning:
+        stmt = stmt.returning(*returning, sort_by_parameter_order=True)
+    out = []
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        result = db.execute(stmt, batch)
+        if returning:
+            out.extend(result.all())
+    return out
@@ -0,0 +1,91 @@
+"""Conditional GET for per-user data, keyed by the data version counters.
+
+A GET route that declares `dependencies=[Depends(conditional_get("logs"))]`
+gets a strong ETag built from the caller, the request URL and the current
+versions of the listed domains. A matching If-None-Match is answered with
+304 before the handler runs, so none of its queries or analytics execute.
+Writes bump the counters (see version_service), which changes the ETag.
+"""
+import hashlib
+import threading
+from fastapi import Depends, HTTPException, Request, Response
+from sqlalchemy.orm import Session
+from app.database import get_db
+from app.services.version_service import get_data_versions
+from app.utils.auth import get_current_principal, Principal
+
+# Bump when the JSON shape of these responses changes, so clients don't
+# keep revalidating an old representation as current.
+REPRESENTATION_VERSION = "1"
+
+CACHE_CONTROL = "private, no-cache"  # browsers store it but revalidate every time
+
+
+class ConditionalStats:
+    """Revalidation counters per endpoint."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}  # endpoint -> [requests, not_modified]
+
+    def record(self, route: str, not_modified: bool):
+        with self._lock:
+            counts = self._routes.setdefault(route, [0, 0])
+            counts[0] += 1
+            counts[1] += not_modified
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = sum(c[0] for c in self._routes.values())
+            skipped = sum(c[1] for c in self._routes.values())
+            return {
+                "requests": total,
+                "not_modified": skipped,
+                "hit_rate": round(skipped / total, 4) if total else None,
+                "routes": {
+                    route: {"requests": c[0], "not_modified": c[1], "hit_rate": round(c[1] / c[0], 4)}
+                    for route, c in sorted(self._routes.items())
+                },
+            }
+
+
+conditional_stats = ConditionalStats()
+
+
+def make_etag(user_id: int, url: str, domains: tuple, versions: tuple) -> str:
+    key = f"{REPRESENTATION_VERSION}|{user_id}|{url}|{','.join(domains)}|{','.join(map(str, versions))}"
+    return '"' + hashlib.sha256(key.encode()).hexdigest()[:32] + '"'
+
+
+def _matches(if_none_match: str, etag: str) -> bool:
+    """If-None-Match uses weak comparison: a W/ prefix doesn't matter."""
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return etag in (tag[2:] if tag.startswith("W/") else tag for tag in candidates)
+
+
+def conditional_get(*domains: str):
+    """Route dependency: set the ETag, or short-circuit with 304 when the client's copy is current."""
+
+    def dependency(
+        request: Request,
+        response: Response,
+        db: Session = Depends(get_db),
+        current_user: Principal = Depends(get_current_principal),
+    ):
+        versions = get_data_versions(db, current_user.id, domains)
+        url = request.url.path + ("?" + request.url.query if request.url.query else "")
+        etag = make_etag(current_user.id, url, domains, versions)
+        headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL, "Vary": "Authorization"}
+        endpoint = request.scope.get("endpoint")
+        route = f"{endpoint.__module__.rsplit('.', 1)[-1]}.{endpoint.__name__}" if endpoint else request.url.path
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and _matches(if_none_match, etag):
+            conditional_stats.record(route, not_modified=True)
+            raise HTTPException(status_code=304, headers=headers)
+        conditional_stats.record(route, not_modified=False)
+        response.headers.update(headers)
+
+    return dependency
@@ -0,0 +1,95 @@
+import base64
+import json
+from datetime import date, datetime
+from typing import Callable, Optional
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy import tuple_
+from app.database import SessionLocal
+
+MAX_PAGE_SIZE = 1000
+STREAM_BATCH_SIZE = 500
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(ts: datetime, row_id: int) -> str:
+    raw = f"{ts.isoformat() if ts else ''}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        ts, row_id = base64.urlsafe_b64decode(padded.encode()).decode().split("|")
+        return (datetime.fromisoformat(ts) if ts else None), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def paginate(query, ts_col, id_col, cursor: Optional[str], limit: int, descending: bool = False):
+    """Keyset page over (ts_col, id_col).
+
+    Seeks past the cursor with a row-value comparison, which the
+    (user_id, ts, id) composite indexes serve directly, so deep pages cost
+    the same as the first. Rows with a NULL timestamp can't take part in
+    that comparison, so they are paged separately, by id, after every
+    timestamped row; their cursors carry an empty timestamp. Returns
+    (rows, next_cursor or None).
+    """
+    ts, row_id = decode_cursor(cursor) if cursor else (None, None)
+    untimed_only = cursor is not None and ts is None
+    id_order = id_col.desc() if descending else id_col.asc()
+
+    rows = []
+    if not untimed_only:
+        timed = query.filter(ts_col.isnot(None))
+        if cursor:
+            key = tuple_(ts_col, id_col)
+            timed = timed.filter(key < tuple_(ts, row_id) if descending else key > tuple_(ts, row_id))
+        rows = timed.order_by(ts_col.desc() if descending else ts_col.asc(), id_order).limit(limit + 1).all()
+    if len(rows) <= limit:
+        untimed = query.filter(ts_col.is_(None))
+        if untimed_only:
+            untimed = untimed.filter(id_col < row_id if descending else id_col > row_id)
+        rows += untimed.order_by(id_order).limit(limit + 1 - len(rows)).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, ts_col.key), getattr(last, id_col.key))
+    return rows, next_cursor
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def stream_rows(build_query: Callable, serialize: Callable, fmt: str = "ndjson") -> StreamingResponse:
+    """Stream a query's rows as NDJSON or a chunked JSON array.
+
+    The generator owns its own session because request-scoped dependencies
+    are torn down before a streaming body finishes. Rows are fetched in
+    batches with yield_per so memory stays flat regardless of history size.
+    """
+    def generate():
+        db = SessionLocal()
+        try:
+            rows = build_query(db).yield_per(STREAM_BATCH_SIZE)
+            if fmt == "ndjson":
+                for row in rows:
+                    yield json.dumps(serialize(row), default=_json_default) + "\n"
+                return
+            yield "["
+            first = True
+            for row in rows:
+                yield ("" if first else ",") + json.dumps(serialize(row), default=_json_default)
+                first = False
+            yield "]"
+        finally:
+            db.close()
+
+    media_type = "application/x-ndjson" if fmt == "ndjson" else "application/json"
+    return StreamingResponse(generate(), media_type=media_type)
@@ -0,0 +1,101 @@
+"""Password hashing off the request threadpool.
+
+bcrypt is deliberately slow, so hashing and verification run in a small
+dedicated process pool instead of the threadpool that sync routes share.
+At most PASSWORD_HASH_MAX_PENDING operations may be queued or running; past
+that, callers get PasswordHasherBusy straight away (the auth routes turn it
+into a 429) rather than piling up behind a login burst.
+
+Hashes made with a different cost than BCRYPT_ROUNDS are replaced on the
+next successful login.
+"""
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from passlib.context import CryptContext
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_PROCESSES = int(os.getenv("PASSWORD_HASH_PROCESSES", "2"))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "32"))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify_and_update(password: str, hashed: str):
+    """(matches, new_hash); new_hash is set when the stored hash uses an outdated cost."""
+    return pwd_context.verify_and_update(password, hashed)
+
+
+class PasswordHasherBusy(Exception):
+    """Too many hashing operations are already queued."""
+
+
+class PasswordHasher:
+    def __init__(self, processes: int = PASSWORD_HASH_PROCESSES, max_pending: int = PASSWORD_HASH_MAX_PENDING):
+        self.processes = processes
+        self.max_pending = max_pending
+        self.executor = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.peak_pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_seconds = 0.0
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(max_workers=self.processes)
+            return self.executor
+
+    def shutdown(self):
+        with self._lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait=False, cancel_futures=True)
+                self.executor = None
+
+    async def _submit(self, fn, *args):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise PasswordHasherBusy()
+            self.pending += 1
+            self.peak_pending = max(self.peak_pending, self.pending)
+        started = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor(), fn, *args)
+        finally:
+            with self._lock:
+                self.pending -= 1
+                self.completed += 1
+                self.total_seconds += time.perf_counter() - started
+
+    async def hash(self, password: str) -> str:
+        return await self._submit(_hash, password)
+
+    async def verify(self, password: str, hashed: str) -> tuple:
+        """Returns (matches, new_hash or None)."""
+        return await self._submit(_verify_and_update, password, hashed)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "processes": self.processes,
+                "max_pending": self.max_pending,
+                "pending": self.pending,
+                "queued": max(self.pending - self.processes, 0),
+                "peak_pending": self.peak_pending,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "avg_ms": round(self.total_seconds / self.completed * 1000, 1) if self.completed else None,
+                "bcrypt_rounds": BCRYPT_ROUNDS,
+            }
+
+
+password_hasher = PasswordHasher()
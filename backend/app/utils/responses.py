@@ -0,0 +1,51 @@
+"""Response encoding: fast JSON for trusted rows and size-gated compression.
+
+The app's default response class is ORJSONResponse, which serializes
+datetimes natively. FastAPI still runs a route's return value through
+response_model validation (or jsonable_encoder) first. For large listings
+built by our own serializers from database columns, that pass costs more
+than the encoding itself, so those routes return trusted_json(...) and hand
+orjson the rows directly. Their response_model stays on the route as the
+documented contract.
+"""
+import os
+from fastapi import Response
+from fastapi.responses import ORJSONResponse
+from starlette.middleware.gzip import GZipMiddleware
+
+try:
+    from brotli_asgi import BrotliMiddleware
+except ImportError:  # optional: gzip only without brotli-asgi
+    BrotliMiddleware = None
+
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+# Streams that must reach the client event by event; a compressor would buffer them.
+COMPRESSION_EXCLUDED_PATHS = ("/chat/stream",)
+
+
+def trusted_json(content, response: Response = None) -> ORJSONResponse:
+    """Encode already-serialized rows without validation, keeping headers set on `response`."""
+    headers = dict(response.headers) if response is not None else None
+    return ORJSONResponse(content, headers=headers)
+
+
+class CompressionMiddleware:
+    """Brotli (with gzip fallback) when brotli-asgi is installed, else gzip.
+
+    Only bodies of at least `minimum_size` bytes are compressed, and only
+    for clients that accept the encoding.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_BYTES, excluded_paths: tuple = COMPRESSION_EXCLUDED_PATHS):
+        self.app = app
+        self.excluded_paths = excluded_paths
+        if BrotliMiddleware is not None:
+            self.compressed = BrotliMiddleware(app, minimum_size=minimum_size, gzip_fallback=True)
+        else:
+            self.compressed = GZipMiddleware(app, minimum_size=minimum_size)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(self.excluded_paths):
+            await self.app(scope, receive, send)
+            return
+        await self.compressed(scope, receive, send)
@@ -0,0 +1,85 @@
+"""Bring an existing database up to the current models at startup.
+
+Base.metadata.create_all() only creates missing tables (and their indexes).
+ensure_schema() also adds nullable columns and indexes that were introduced
+after a table was first created. upgrade_database() then fills in the data
+those additions need: canonical codes for biomarker rows stored before
+biomarkers.code existed, and the derived stats and rollup tables when they
+are new or out of step. Each step is a no-op on an up-to-date database.
+"""
+import logging
+
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal, engine, Base
+from app.models.models import Biomarker, BiomarkerStats, LogRollup
+from app.services.biomarker_codes import biomarker_code
+from app.services.rollup_service import rebuild_rollups
+from app.services.stats_service import rebuild_stats
+
+logger = logging.getLogger(__name__)
+
+
+def ensure_schema() -> list:
+    """Create missing tables, nullable columns and indexes. Returns what was added."""
+    created = set(Base.metadata.tables) - set(inspect(engine).get_table_names())
+    Base.metadata.create_all(bind=engine)
+    inspector = inspect(engine)
+    added = sorted(created)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name in created:
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                col_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}"))
+                added.append(f"{table.name}.{column.name}")
+    for table in Base.metadata.sorted_tables:
+        existing = {i["name"] for i in inspect(engine).get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind=engine)
+                added.append(index.name)
+    return added
+
+
+def backfill_biomarker_codes(db: Session, recompute: bool = False) -> tuple:
+    """Set Biomarker.code from the name, one distinct name at a time.
+
+    Only rows without a code are touched unless `recompute` is set (e.g.
+    after extending the alias dictionary). Returns (rows updated, names seen).
+    """
+    query = db.query(Biomarker.name).distinct()
+    if not recompute:
+        query = query.filter(Biomarker.code.is_(None))
+    names = [row[0] for row in query.all()]
+    updated = 0
+    for name in names:
+        rows = db.query(Biomarker).filter(Biomarker.name == name)
+        if not recompute:
+            rows = rows.filter(Biomarker.code.is_(None))
+        updated += rows.update({Biomarker.code: biomarker_code(name)}, synchronize_session=False)
+    db.commit()
+    return updated, len(names)
+
+
+def upgrade_database():
+    """Schema changes, then the data backfills they call for."""
+    added = ensure_schema()
+    if added:
+        logger.info("Schema upgraded: %s", ", ".join(added))
+    db = SessionLocal()
+    try:
+        coded, _ = backfill_biomarker_codes(db)
+        if coded or BiomarkerStats.__tablename__ in added:
+            written = rebuild_stats(db)
+            logger.info("Coded %d biomarker rows; rebuilt %d stats rows", coded, written)
+        if LogRollup.__tablename__ in added:
+            written = rebuild_rollups(db, full=True)
+            logger.info("Built %d log rollup rows", written)
+    finally:
+        db.close()
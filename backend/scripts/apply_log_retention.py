@@ -0,0 +1,33 @@
+"""Delete raw manual logs older than the retention window, keeping their rollups.
+
+The window comes from LOG_RAW_RETENTION_DAYS (0, the default, keeps raw
+logs forever) or --days. The cut-off is rounded down to the start of a
+week so no rollup bucket is left partly backed by raw rows. Run it
+periodically, e.g. from cron:
+
+    python -m scripts.apply_log_retention [--days 365]
+"""
+import argparse
+
+from app.database import SessionLocal
+from app.services.rollup_service import apply_retention, retention_cutoff, LOG_RAW_RETENTION_DAYS
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=LOG_RAW_RETENTION_DAYS)
+    args = parser.parse_args()
+
+    if args.days <= 0:
+        print("Raw log retention is disabled; nothing to do")
+        return
+    db = SessionLocal()
+    try:
+        deleted = apply_retention(db, days=args.days)
+    finally:
+        db.close()
+    print(f"Deleted {deleted} raw logs from before {retention_cutoff(args.days).date()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+"""Assign canonical codes to existing biomarker rows.
+
+Brings the schema up to date, fills in codes one distinct name at a time,
+then rebuilds the biomarker_stats table (keyed by code). The API backfills
+rows without a code at startup; run this by hand with --all to recompute
+codes that are already set, e.g. after extending the alias dictionary.
+
+    python -m scripts.backfill_biomarker_codes [--all]
+"""
+import argparse
+
+from app.database import SessionLocal
+from app.services.stats_service import rebuild_stats
+from app.utils.schema import backfill_biomarker_codes, ensure_schema
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--all", action="store_true", help="recompute codes that are already set")
+    args = parser.parse_args()
+
+    ensure_schema()
+    db = SessionLocal()
+    try:
+        updated, names = backfill_biomarker_codes(db, recompute=args.all)
+        stats_rows = rebuild_stats(db)
+    finally:
+        db.close()
+    print(f"Coded {updated} biomarker rows across {names} distinct names; rebuilt {stats_rows} stats rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Micro-benchmark of per-request authentication overhead.
+
+Compares the old resolution (JWT decode plus a users SELECT on every request)
+with the principal cache on a miss and on a hit. It creates a throwaway
+user, so point DATABASE_URL at a scratch database:
+
+    DATABASE_URL=sqlite:///./bench_auth.db python -m scripts.bench_auth --iterations 2000
+"""
+import argparse
+import time
+
+from jose import jwt
+
+from app.database import SessionLocal, engine, Base
+from app.models.models import User
+from app.utils.auth import (
+    ALGORITHM,
+    SECRET_KEY,
+    create_user_token,
+    get_current_principal,
+    principal_cache,
+)
+
+BENCH_EMAIL = "bench-auth@example.com"
+
+
+def bench_user() -> User:
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.email == BENCH_EMAIL).first()
+        if user is None:
+            user = User(email=BENCH_EMAIL, hashed_password="!", full_name="Bench")
+            db.add(user)
+            db.commit()
+            db.refresh(user)
+        db.expunge(user)
+        return user
+    finally:
+        db.close()
+
+
+def uncached(token: str):
+    """What get_current_user did before: decode, then load the ORM row."""
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    db = SessionLocal()
+    try:
+        return db.query(User).filter(User.id == int(payload["sub"])).first()
+    finally:
+        db.close()
+
+
+def per_call_us(fn, iterations: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - t0) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    token = create_user_token(bench_user())
+
+    def miss():
+        principal_cache.invalidate_user(principal.id)
+        get_current_principal(token)
+
+    principal = get_current_principal(token)
+    t_uncached = per_call_us(lambda: uncached(token), args.iterations)
+    t_miss = per_call_us(miss, args.iterations)
+    get_current_principal(token)
+    t_hit = per_call_us(lambda: get_current_principal(token), args.iterations)
+
+    print(f"{args.iterations} iterations against {engine.url.drivername}")
+    print(f"  decode + ORM load (old):   {t_uncached:9.1f} us/request")
+    print(f"  principal cache miss:      {t_miss:9.1f} us/request")
+    print(f"  principal cache hit:       {t_hit:9.1f} us/request  ({t_uncached / t_hit:.0f}x faster than old)")
+
+
+if __name__ == "__main__":
+    main()
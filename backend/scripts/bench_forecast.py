@@ -0,0 +1,83 @@
+"""Benchmark batch forecasting against one forecast_biomarker call per series.
+
+Run from the backend directory:
+
+    python -m scripts.bench_forecast --markers 60 --points 24
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from app.services.analytics_service import (
+    forecast_all_biomarkers,
+    forecast_biomarker,
+    group_by_code,
+)
+
+
+def synthetic_history(markers: int, points: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    start = datetime(2015, 1, 1)
+    rows = []
+    next_id = 1
+    for i in range(points):
+        recorded_at = start + timedelta(days=90 * i + rng.randint(0, 20))
+        for m in range(markers):
+            base = 50.0 + m
+            rows.append(SimpleNamespace(
+                id=next_id,
+                name=f"Marker {m}",
+                code=f"marker_{m}",
+                value=round(base + 0.3 * i + rng.gauss(0, 2), 2),
+                ref_min=base - 10,
+                ref_max=base + 10,
+                recorded_at=recorded_at,
+            ))
+            next_id += 1
+    return rows
+
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--markers", type=int, default=60)
+    parser.add_argument("--points", type=int, default=24)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rows = synthetic_history(args.markers, args.points)
+    grouped = group_by_code(rows)
+
+    def per_series():
+        return {items[-1].name: forecast_biomarker(items) for items in grouped.values()}
+
+    def batch():
+        return forecast_all_biomarkers(rows)
+
+    expected, actual = per_series(), batch()
+    mismatches = [
+        name for name in expected
+        if expected[name]["forecast"] != actual[name]["forecast"]
+        or expected[name]["warning"] != actual[name]["warning"]
+    ]
+
+    t_single = best_of(per_series, args.repeat)
+    t_batch = best_of(batch, args.repeat)
+    print(f"{args.markers} series x {args.points} points ({len(rows)} rows)")
+    print(f"  {args.markers} x forecast_biomarker: {t_single * 1000:8.2f} ms")
+    print(f"  forecast_all_biomarkers:  {t_batch * 1000:8.2f} ms  ({t_single / t_batch:.1f}x)")
+    print(f"  series with differing output: {len(mismatches)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Benchmark summary-prompt compaction on synthetic 10-year histories.
+
+Compares the old prompt section (pretty-printed JSON of raw readings) with
+the compacted, budgeted text, and checks the vectorised features against a
+plain per-series computation. Run from the backend directory:
+
+    python -m scripts.bench_history_compaction --markers 40 --years 10 --per-year 12
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import numpy as np
+
+from app.services.analytics_service import group_by_code
+from app.services.history_compaction import (
+    SECONDS_PER_YEAR,
+    SUMMARY_TOKEN_BUDGET,
+    compute_series_features,
+    estimate_tokens,
+    pack_history,
+)
+
+
+def synthetic_history(markers: int, years: int, per_year: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    start = datetime(2015, 1, 1)
+    gap_days = 365.25 / per_year
+    rows = []
+    next_id = 1
+    for i in range(years * per_year):
+        recorded_at = start + timedelta(days=gap_days * i + rng.uniform(0, gap_days / 3))
+        for m in range(markers):
+            base = 50.0 + m
+            drift = (m % 5 - 2) * 0.1  # some series rise, some fall, some stay flat
+            rows.append(SimpleNamespace(
+                id=next_id,
+                name=f"Marker {m}",
+                code=f"marker_{m}",
+                value=round(base + drift * i + rng.gauss(0, 2), 2),
+                unit="mg/dL",
+                ref_min=base - 8,
+                ref_max=base + 8,
+                recorded_at=recorded_at,
+            ))
+            next_id += 1
+    rows.sort(key=lambda b: b.recorded_at)
+    return rows
+
+
+def reference_features(rows: list) -> dict:
+    out = {}
+    for code, items in group_by_code(rows).items():
+        x = np.array([b.recorded_at.timestamp() for b in items]) / SECONDS_PER_YEAR
+        y = np.array([b.value for b in items])
+        slope = np.polyfit(x - x.mean(), y, 1)[0] if len(items) > 1 else 0.0
+        oor = sum(1 for b in items if b.value < b.ref_min or b.value > b.ref_max)
+        out[code] = (min(y), max(y), slope, oor)
+    return out
+
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--markers", type=int, default=40)
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--per-year", type=int, default=12)
+    parser.add_argument("--budget", type=int, default=SUMMARY_TOKEN_BUDGET)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rows = synthetic_history(args.markers, args.years, args.per_year)
+    raw = [
+        {"name": b.name, "value": b.value, "unit": b.unit, "ref_min": b.ref_min,
+         "ref_max": b.ref_max, "recorded_at": b.recorded_at.isoformat()}
+        for b in rows
+    ]
+    old_full = json.dumps(raw, indent=2)
+    old_first_80 = json.dumps(raw[:80], indent=2)
+
+    features = compute_series_features(rows)
+    expected = reference_features(rows)
+    mismatches = [
+        f["code"] for f in features
+        if not np.allclose((f["min"], f["max"], f["slope_per_year"], f["out_of_range"]), expected[f["code"]])
+    ]
+    packed = pack_history(features, args.budget)
+
+    t_features = best_of(lambda: compute_series_features(rows), args.repeat)
+    t_reference = best_of(lambda: reference_features(rows), args.repeat)
+    t_pack = best_of(lambda: pack_history(features, args.budget), args.repeat)
+
+    print(f"{args.markers} series x {args.years} years x {args.per_year}/year ({len(rows)} rows)")
+    print(f"  all readings as JSON:        ~{estimate_tokens(old_full):>8} tokens")
+    print(f"  old prompt (first 80 rows):  ~{estimate_tokens(old_first_80):>8} tokens, "
+          f"covers {len({r['name'] for r in raw[:80]})} series up to {raw[79]['recorded_at'][:10]}")
+    print(f"  compacted (budget {args.budget}):    ~{estimate_tokens(packed):>8} tokens, "
+          f"covers {packed.count(chr(10)) + 1} lines up to {rows[-1].recorded_at:%Y-%m-%d}")
+    print(f"  features (vectorised): {t_features * 1000:8.2f} ms")
+    print(f"  features (per series): {t_reference * 1000:8.2f} ms  ({t_reference / t_features:.1f}x)")
+    print(f"  packing:               {t_pack * 1000:8.2f} ms")
+    print(f"  series with differing features: {len(mismatches)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Serialization benchmark for large /biomarkers/ listings.
+
+Seeds --rows biomarkers for a throwaway user, then times the encoding of
+the listing three ways:
+- the old path: jsonable_encoder plus stdlib json
+- response_model validation plus orjson
+- the trusted path the route now takes: orjson on the serialized rows
+
+It also times an in-process GET /biomarkers/ end to end and reports its
+size with and without gzip. It writes data, so point DATABASE_URL at a
+scratch database:
+
+    DATABASE_URL=sqlite:///./bench_serialization.db python -m scripts.bench_serialization --rows 50000
+"""
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+import httpx
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import ORJSONResponse
+from pydantic import TypeAdapter
+
+from app.database import SessionLocal, engine, async_engine, Base
+from app.main import app
+from app.models.models import Biomarker, Report, User
+from app.routers.biomarkers import BiomarkerOut, LISTING_COLUMNS, _serialize_biomarker
+from app.utils.auth import create_user_token
+from app.utils.bulk import insert_in_batches
+
+BENCH_EMAIL = "bench-serialization@example.com"
+
+
+def seed(rows: int) -> User:
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.email == BENCH_EMAIL).first()
+        if user is None:
+            user = User(email=BENCH_EMAIL, hashed_password="!", full_name="Bench")
+            db.add(user)
+            db.flush()
+        have = db.query(Biomarker).filter(Biomarker.user_id == user.id).count()
+        if have < rows:
+            report = Report(user_id=user.id, filename="bench.pdf", file_path="/dev/null")
+            db.add(report)
+            db.flush()
+            start = datetime(2015, 1, 1)
+            insert_in_batches(db, Biomarker, [
+                {
+                    "report_id": report.id,
+                    "user_id": user.id,
+                    "name": "LDL Cholesterol",
+                    "code": "ldl",
+                    "value": 90.0 + (i % 60),
+                    "unit": "mg/dL",
+                    "ref_min": 0.0,
+                    "ref_max": 130.0,
+                    "recorded_at": start + timedelta(hours=i),
+                }
+                for i in range(have, rows)
+            ])
+        db.commit()
+        db.refresh(user)
+        db.expunge(user)
+        return user
+    finally:
+        db.close()
+
+
+def best_ms(fn, repeat: int) -> tuple:
+    best, out = float("inf"), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000, out
+
+
+async def end_to_end(token: str, repeat: int) -> dict:
+    headers = {"Authorization": f"Bearer {token}"}
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=120) as client:
+        for label, encoding in (("identity", "identity"), ("gzip", "gzip")):
+            best, size = float("inf"), 0
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                r = await client.get("/biomarkers/", headers={**headers, "Accept-Encoding": encoding})
+                best = min(best, time.perf_counter() - t0)
+                size = int(r.headers.get("content-length") or len(r.content))
+            results[label] = (best * 1000, size)
+    await async_engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    user = seed(args.rows)
+
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(*LISTING_COLUMNS)
+            .filter(Biomarker.user_id == user.id)
+            .order_by(Biomarker.recorded_at.asc(), Biomarker.id.asc())
+            .limit(args.rows)
+            .all()
+        )
+    finally:
+        db.close()
+    content = [_serialize_biomarker(b) for b in rows]
+    adapter = TypeAdapter(List[BiomarkerOut])
+
+    legacy_ms, legacy = best_ms(lambda: json.dumps(jsonable_encoder(content)).encode(), args.repeat)
+    validated_ms, _ = best_ms(
+        lambda: ORJSONResponse(adapter.dump_python(adapter.validate_python(content), mode="json")).body, args.repeat
+    )
+    trusted_ms, trusted = best_ms(lambda: ORJSONResponse(content).body, args.repeat)
+
+    print(f"{len(content)} biomarker rows, {len(trusted) / 1e6:.1f} MB of JSON")
+    print(f"  jsonable_encoder + json (old):   {legacy_ms:8.1f} ms")
+    print(f"  response_model + orjson:         {validated_ms:8.1f} ms")
+    print(f"  trusted rows + orjson (now):     {trusted_ms:8.1f} ms  ({legacy_ms / trusted_ms:.0f}x faster than old)")
+
+    for label, (ms, size) in asyncio.run(end_to_end(create_user_token(user), args.repeat)).items():
+        print(f"  GET /biomarkers/ {label:<8}        {ms:8.1f} ms, {size / 1e6:.2f} MB on the wire")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""Accuracy and latency of the table extractor on a synthetic PDF corpus.
+
+The corpus lives in scripts/fixtures/lab_corpus: lab-report PDFs in
+several layouts (ruled tables, text-aligned columns, mixed range styles,
+multi-page panels), each with a ground-truth JSON next to it, plus
+baseline.json holding the expected scores per layout. Precision and recall
+count rows found with the right code and value; unit and range accuracy
+are the share of those rows whose unit, and whose parsed ref_min/ref_max,
+also match. The generator is seeded, so --regenerate rewrites
+byte-identical files. Run from the backend directory:
+
+    python -m scripts.bench_table_extractor                    # score the committed corpus
+    python -m scripts.bench_table_extractor --check            # exit 1 if accuracy fell below the baseline
+    python -m scripts.bench_table_extractor --update-baseline  # after an intended extractor change
+    python -m scripts.bench_table_extractor --regenerate --reports 30
+"""
+import argparse
+import glob
+import json
+import os
+import random
+import sys
+import time
+
+import pdfplumber
+
+from app.services.biomarker_codes import biomarker_code
+from app.services.pdf_service import extract_biomarkers_from_tables, TABLE_CONFIDENCE_THRESHOLD
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "lab_corpus")
+
+PANEL = [
+    # name, unit, low, high, range style
+    ("Hemoglobin", "g/dL", 12.0, 16.0, "span"),
+    ("Hematocrit", "%", 36.0, 46.0, "span"),
+    ("Platelet Count", "10^3/uL", 150, 410, "span"),
+    ("WBC", "10^3/uL", 4.0, 11.0, "span"),
+    ("Fasting Glucose", "mg/dL", 70, 100, "span"),
+    ("HbA1c", "%", None, 5.7, "upper"),
+    ("Total Cholesterol", "mg/dL", None, 200, "upper"),
+    ("LDL Cholesterol", "mg/dL", None, 100, "upper"),
+    ("HDL Cholesterol", "mg/dL", 40, None, "lower"),
+    ("Triglycerides", "mg/dL", None, 150, "upper"),
+    ("Creatinine", "mg/dL", 0.6, 1.2, "to"),
+    ("TSH", "uIU/mL", 0.4, 4.0, "span"),
+    ("Vitamin D", "ng/mL", 30, 100, "span"),
+    ("Vitamin B12", "pg/mL", 200, 900, "span"),
+    ("ALT (SGPT)", "U/L", None, 40, "upto"),
+    ("AST (SGOT)", "U/L", None, 40, "upto"),
+]
+
+
+def _range_text(low, high, style):
+    if style == "upper":
+        return f"<{high}"
+    if style == "lower":
+        return f">{low}"
+    if style == "upto":
+        return f"Up to {high}"
+    if style == "to":
+        return f"{low} to {high}"
+    return f"{low}-{high}"
+
+
+def _escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path, pages):
+    """Minimal PDF writer. Each page is a list of ("text", x, y, str) and ("line", x1, y1, x2, y2)."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for items in pages:
+        ops = ["0.5 w"]
+        for item in items:
+            if item[0] == "text":
+                _, x, y, s = item
+                ops.append(f"BT /F1 9 Tf {x} {y} Td ({_escape(s)}) Tj ET")
+            else:
+                _, x1, y1, x2, y2 = item
+                ops.append(f"{x1} {y1} m {x2} {y2} l S")
+        stream = "\n".join(ops)
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        content_ref = len(objects)
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_ref} 0 R >>"
+        )
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{i} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for off in offsets:
+        out += f"{off:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def _page_items(rows, ruled, header=True):
+    cols = [40, 230, 330, 420, 560]
+    y = 720
+    items = [("text", 40, 760, "CITY DIAGNOSTICS LAB - Patient Report")]
+    table = ([("Test", "Result", "Unit", "Reference Range")] if header else []) + rows
+    top = y + 14
+    for cells in table:
+        for x, cell in zip(cols, cells):
+            items.append(("text", x + 3, y, cell))
+        y -= 18
+    bottom = y + 14
+    if ruled:
+        for i in range(len(table) + 1):
+            yy = top - 18 * i
+            items.append(("line", cols[0], yy, cols[-1], yy))
+        for x in cols:
+            items.append(("line", x, top, x, bottom))
+    return items
+
+
+def make_report(rng, layout):
+    markers = rng.sample(PANEL, rng.randint(6, len(PANEL)))
+    rows, truth = [], []
+    for name, unit, low, high, style in markers:
+        centre = ((low or 0) + (high or (low or 1) * 2)) / 2
+        value = round(centre * rng.uniform(0.6, 1.4), 1)
+        rows.append((name, f"{value}", unit, _range_text(low, high, style)))
+        truth.append({"code": biomarker_code(name), "value": value, "unit": unit, "ref_min": low, "ref_max": high})
+    if layout == "multipage":
+        half = len(rows) // 2
+        pages = [_page_items(rows[:half], ruled=True), _page_items(rows[half:], ruled=True)]
+    else:
+        pages = [_page_items(rows, ruled=(layout == "ruled"))]
+    return pages, truth
+
+
+def build_corpus(out_dir, count, seed=0):
+    rng = random.Random(seed)
+    layouts = ["ruled", "unruled", "multipage"]
+    os.makedirs(out_dir, exist_ok=True)
+    corpus = []
+    for i in range(count):
+        layout = layouts[i % len(layouts)]
+        pages, truth = make_report(rng, layout)
+        path = os.path.join(out_dir, f"report_{i:03d}_{layout}.pdf")
+        write_pdf(path, pages)
+        with open(path[:-4] + ".json", "w") as f:
+            json.dump(truth, f)
+        corpus.append((path, layout, truth))
+    return corpus
+
+
+def load_corpus(corpus_dir):
+    corpus = []
+    for path in sorted(glob.glob(os.path.join(corpus_dir, "report_*.pdf"))):
+        layout = os.path.basename(path)[:-4].split("_", 2)[2]
+        with open(path[:-4] + ".json") as f:
+            corpus.append((path, layout, json.load(f)))
+    return corpus
+
+
+def _bound(text):
+    """A parsed range bound as a float, None when the range is open on that side."""
+    if text in (None, ""):
+        return None
+    try:
+        return round(float(text), 2)
+    except ValueError:
+        return text
+
+
+METRICS = ("precision", "recall", "unit_accuracy", "range_accuracy")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", default=FIXTURE_DIR, help="corpus directory")
+    parser.add_argument("--regenerate", action="store_true", help="rewrite the corpus from the seeded generator")
+    parser.add_argument("--reports", type=int, default=30, help="corpus size with --regenerate")
+    parser.add_argument("--check", action="store_true", help="fail if any score fell below the baseline")
+    parser.add_argument("--update-baseline", action="store_true", help="record these scores as the baseline")
+    args = parser.parse_args()
+
+    if args.regenerate:
+        for path in glob.glob(os.path.join(args.corpus, "report_*")):
+            os.remove(path)
+        build_corpus(args.corpus, args.reports)
+    corpus = load_corpus(args.corpus)
+    if not corpus:
+        sys.exit(f"No corpus in {args.corpus}; run with --regenerate")
+
+    by_layout = {}
+    for path, layout, truth in corpus:
+        t0 = time.perf_counter()
+        with pdfplumber.open(path) as pdf:
+            found, confidence = extract_biomarkers_from_tables(pdf)
+        elapsed = time.perf_counter() - t0
+
+        expected = {(t["code"], round(t["value"], 2)): t for t in truth}
+        got = {}
+        for b in found:
+            try:
+                got[(biomarker_code(b["name"]), round(float(b["value"]), 2))] = b
+            except ValueError:
+                continue
+        matched = expected.keys() & got.keys()
+        s = by_layout.setdefault(layout, {"n": 0, "tp": 0, "fp": 0, "fn": 0, "unit": 0, "range": 0, "ms": [], "trusted": 0})
+        s["n"] += 1
+        s["tp"] += len(matched)
+        s["fp"] += len(got) - len(matched)
+        s["fn"] += len(expected) - len(matched)
+        for key in matched:
+            t, b = expected[key], got[key]
+            s["unit"] += (b.get("unit") or "").strip() == t["unit"]
+            s["range"] += (_bound(b.get("ref_min")), _bound(b.get("ref_max"))) == (_bound(t["ref_min"]), _bound(t["ref_max"]))
+        s["ms"].append(elapsed * 1000)
+        s["trusted"] += confidence >= TABLE_CONFIDENCE_THRESHOLD
+
+    print(f"corpus: {args.corpus}  (confidence threshold {TABLE_CONFIDENCE_THRESHOLD})")
+    print(f"{'layout':<10} {'reports':>7} {'precision':>9} {'recall':>7} {'unit':>6} {'range':>6} {'LLM skipped':>11} {'median ms':>9}")
+    scores = {}
+    for layout, s in sorted(by_layout.items()):
+        precision = s["tp"] / max(s["tp"] + s["fp"], 1)
+        recall = s["tp"] / max(s["tp"] + s["fn"], 1)
+        unit_accuracy = s["unit"] / max(s["tp"], 1)
+        range_accuracy = s["range"] / max(s["tp"], 1)
+        median = sorted(s["ms"])[len(s["ms"]) // 2]
+        scores[layout] = {"reports": s["n"], "precision": round(precision, 3), "recall": round(recall, 3),
+                          "unit_accuracy": round(unit_accuracy, 3), "range_accuracy": round(range_accuracy, 3),
+                          "llm_skipped": s["trusted"]}
+        print(f"{layout:<10} {s['n']:>7} {precision:>9.3f} {recall:>7.3f} {unit_accuracy:>6.3f} {range_accuracy:>6.3f} "
+              f"{s['trusted']:>5}/{s['n']:<5} {median:>9.1f}")
+
+    baseline_path = os.path.join(args.corpus, "baseline.json")
+    if args.update_baseline:
+        with open(baseline_path, "w") as f:
+            json.dump(scores, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"baseline written to {baseline_path}")
+    elif args.check:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        regressions = [
+            f"{layout} {metric}: {scores.get(layout, {}).get(metric, 0):.3f} < {expected[metric]:.3f}"
+            for layout, expected in baseline.items()
+            for metric in METRICS
+            if scores.get(layout, {}).get(metric, 0) < expected.get(metric, 0)
+        ]
+        if regressions:
+            sys.exit("Below baseline:\n  " + "\n  ".join(regressions))
+        print("matches or beats the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+"""Bring an existing database up to the current models.
+
+The API does this itself at startup (app.utils.schema.upgrade_database);
+run it by hand to upgrade before starting the server, or to see what
+changed:
+
+    python -m scripts.ensure_schema
+"""
+from app.utils.schema import ensure_schema
+
+
+def main():
+    added = ensure_schema()
+    print("Added: " + ", ".join(added) if added else "Schema is up to date")
+
+
+if __name__ == "__main__":
+    main()
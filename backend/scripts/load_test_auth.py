@@ -0,0 +1,112 @@
+"""Login-storm load test: do other endpoints keep their latency?
+
+Fires --logins concurrent logins at the app in-process while a prober keeps
+calling GET /biomarkers/, and reports prober latency before and during the
+storm along with how the logins fared. It runs twice: once with the
+dedicated password-hashing pool, and once with bcrypt running in the shared
+request threadpool (as login used to) for comparison. It creates users, so
+point DATABASE_URL at a scratch database:
+
+    DATABASE_URL=sqlite:///./load_auth.db python -m scripts.load_test_auth --logins 200
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+from starlette.concurrency import run_in_threadpool
+
+from app.database import engine, async_engine, Base
+from app.main import app
+from app.utils.passwords import PasswordHasher, password_hasher
+
+EMAIL = "storm@example.com"
+PASSWORD = "storm-password"
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)] if values else float("nan")
+
+
+async def probe(client, headers, stop: asyncio.Event, latencies: list):
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        await client.get("/biomarkers/", headers=headers)
+        latencies.append(time.perf_counter() - t0)
+        await asyncio.sleep(0.01)
+
+
+async def run(logins: int, probes: int) -> dict:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=120) as client:
+        r = await client.post("/auth/register", json={"email": EMAIL, "password": PASSWORD})
+        if r.status_code == 400:
+            r = await client.post("/auth/login", data={"username": EMAIL, "password": PASSWORD})
+        headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+        baseline = []
+        for _ in range(probes):
+            t0 = time.perf_counter()
+            await client.get("/biomarkers/", headers=headers)
+            baseline.append(time.perf_counter() - t0)
+
+        stop, during = asyncio.Event(), []
+        prober = asyncio.create_task(probe(client, headers, stop, during))
+        t0 = time.perf_counter()
+        results = await asyncio.gather(*(
+            client.post("/auth/login", data={"username": EMAIL, "password": PASSWORD}) for _ in range(logins)
+        ))
+        elapsed = time.perf_counter() - t0
+        stop.set()
+        await prober
+    # Pooled async connections belong to this event loop; the next run gets its own.
+    await async_engine.dispose()
+
+    codes = [r.status_code for r in results]
+    return {
+        "baseline_p50": percentile(baseline, 0.5),
+        "baseline_p95": percentile(baseline, 0.95),
+        "during_p50": percentile(during, 0.5),
+        "during_p95": percentile(during, 0.95),
+        "during_max": max(during) if during else float("nan"),
+        "ok": codes.count(200),
+        "rejected": codes.count(429),
+        "elapsed": elapsed,
+    }
+
+
+def report(label: str, stats: dict):
+    ms = lambda s: f"{s * 1000:8.1f} ms"
+    print(label)
+    print(f"  /biomarkers/ before storm: p50 {ms(stats['baseline_p50'])}  p95 {ms(stats['baseline_p95'])}")
+    print(f"  /biomarkers/ during storm: p50 {ms(stats['during_p50'])}  p95 {ms(stats['during_p95'])}  max {ms(stats['during_max'])}")
+    print(f"  logins: {stats['ok']} ok, {stats['rejected']} rejected with 429, storm lasted {stats['elapsed']:.2f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--probes", type=int, default=20)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+
+    report("dedicated hashing pool", asyncio.run(run(args.logins, args.probes)))
+    print(f"  hasher: {password_hasher.stats()}")
+    password_hasher.shutdown()
+
+    original = PasswordHasher._submit
+
+    async def in_threadpool(self, fn, *args):
+        return await run_in_threadpool(fn, *args)
+
+    PasswordHasher._submit = in_threadpool
+    try:
+        report("shared request threadpool (old behaviour)", asyncio.run(run(args.logins, args.probes)))
+    finally:
+        PasswordHasher._submit = original
+
+
+if __name__ == "__main__":
+    main()
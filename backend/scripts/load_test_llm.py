@@ -0,0 +1,85 @@
+"""Offline load test of the shared LLM client against the fake backend.
+
+Fires --requests concurrent generations and reports throughput, latency
+percentiles and peak in-flight calls. A ticker measures how late the event
+loop wakes up during the run, and the same load is repeated with a
+blocking client (the old sync generate_content inside async def) for
+comparison:
+
+    python -m scripts.load_test_llm --requests 200 --latency-ms 200 --max-in-flight 16
+"""
+import argparse
+import asyncio
+import time
+
+from app.ai.llm_client import FakeBackend, LLMClient, LLMResponse
+
+
+class BlockingBackend(FakeBackend):
+    """A sync SDK call inside async def: the wait blocks the event loop."""
+
+    async def generate(self, prompt):
+        time.sleep(self.latency)
+        return LLMResponse(text=self.responder(prompt))
+
+
+async def ticker(stop: asyncio.Event, lags: list, interval: float = 0.01):
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - t0 - interval)
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+async def run(client: LLMClient, requests: int) -> dict:
+    latencies, lags = [], []
+    stop = asyncio.Event()
+    tick = asyncio.create_task(ticker(stop, lags))
+
+    async def one(i):
+        t0 = time.perf_counter()
+        await client.generate(f"question {i}")
+        latencies.append(time.perf_counter() - t0)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await tick
+    return {
+        "elapsed": elapsed,
+        "throughput": requests / elapsed,
+        "p50": percentile(latencies, 0.5),
+        "p95": percentile(latencies, 0.95),
+        "loop_lag_max": max(lags) if lags else elapsed,
+        "peak_in_flight": client.counters["peak_in_flight"],
+    }
+
+
+def report(label, r):
+    print(f"{label:<10} {r['elapsed']:7.2f}s  {r['throughput']:7.1f} req/s  "
+          f"p50 {r['p50'] * 1000:7.0f} ms  p95 {r['p95'] * 1000:7.0f} ms  "
+          f"max loop lag {r['loop_lag_max'] * 1000:7.0f} ms  peak in-flight {r['peak_in_flight']}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument("--max-in-flight", type=int, default=16)
+    parser.add_argument("--blocking-requests", type=int, default=20, help="the blocking run is serial; keep it small")
+    args = parser.parse_args()
+
+    client = LLMClient(FakeBackend(latency_ms=args.latency_ms), max_in_flight=args.max_in_flight)
+    report("async", asyncio.run(run(client, args.requests)))
+
+    blocking = LLMClient(BlockingBackend(latency_ms=args.latency_ms), max_in_flight=args.max_in_flight)
+    report("blocking", asyncio.run(run(blocking, args.blocking_requests)))
+
+
+if __name__ == "__main__":
+    main()
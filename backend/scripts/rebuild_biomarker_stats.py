@@ -0,0 +1,30 @@
+"""Rebuild the biomarker_stats table from raw biomarker rows.
+
+Run from the backend directory after deploying, or whenever the running
+statistics need to be reconciled:
+
+    python -m scripts.rebuild_biomarker_stats [--user-id N]
+"""
+import argparse
+
+from app.database import SessionLocal, engine, Base
+from app.models import models  # noqa: F401  (register tables)
+from app.services.stats_service import rebuild_stats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--user-id", type=int, default=None)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        written = rebuild_stats(db, user_id=args.user_id)
+    finally:
+        db.close()
+    print(f"Rebuilt {written} biomarker stats rows")
+
+
+if __name__ == "__main__":
+    main()
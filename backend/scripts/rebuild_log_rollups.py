@@ -0,0 +1,32 @@
+"""Rebuild the log_rollups table from raw manual logs.
+
+Run from the backend directory once after deploying (before enabling
+LOG_RAW_RETENTION_DAYS), or whenever the rollups need to be reconciled.
+Buckets before the retention cut-off, whose raw logs may already be gone,
+are left untouched:
+
+    python -m scripts.rebuild_log_rollups [--user-id N]
+"""
+import argparse
+
+from app.database import SessionLocal, engine, Base
+from app.models import models  # noqa: F401  (register tables)
+from app.services.rollup_service import rebuild_rollups
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--user-id", type=int, default=None)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        written = rebuild_rollups(db, user_id=args.user_id)
+    finally:
+        db.close()
+    print(f"Rebuilt {written} log rollup rows")
+
+
+if __name__ == "__main__":
+    main()
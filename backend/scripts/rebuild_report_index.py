@@ -0,0 +1,36 @@
+"""Rebuild the per-user report retrieval index from stored report text.
+
+Needed once for reports uploaded before the index existed, or if the index
+directory (CHROMA_PATH) is lost:
+
+    python -m scripts.rebuild_report_index [--user-id N]
+"""
+import argparse
+
+from app.database import SessionLocal
+from app.models.models import Report
+from app.ai.report_index import report_index
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--user-id", type=int, default=None)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        query = db.query(Report.id, Report.user_id, Report.extracted_text).filter(Report.extracted_text.isnot(None))
+        if args.user_id is not None:
+            query = query.filter(Report.user_id == args.user_id)
+        rows = query.order_by(Report.user_id, Report.id).all()
+    finally:
+        db.close()
+
+    for user_id in {r.user_id for r in rows}:
+        report_index.drop_user(user_id)
+    chunks = sum(report_index.add_report(r.user_id, r.id, r.extracted_text) for r in rows)
+    print(f"Indexed {len(rows)} reports into {chunks} chunks")
+
+
+if __name__ == "__main__":
+    main()
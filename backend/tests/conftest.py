@@ -0,0 +1,70 @@
+"""Shared fixtures: a throwaway SQLite database, the offline LLM backend
+and temporary upload/index/cache directories.
+
+The environment is set before any app module is imported, since settings
+are read at import time.
+"""
+import os
+import tempfile
+
+_TMP = tempfile.mkdtemp(prefix="healthapp-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_TMP, 'test.db')}"
+os.environ["UPLOAD_DIR"] = os.path.join(_TMP, "uploads")
+os.environ["CHROMA_PATH"] = os.path.join(_TMP, "index")
+os.environ["LLM_CACHE_PATH"] = os.path.join(_TMP, "llm_cache.sqlite3")
+os.environ["LLM_BACKEND"] = "fake"
+os.environ["LLM_FAKE_LATENCY_MS"] = "0"
+
+import pytest  # noqa: E402
+
+from app.database import Base, SessionLocal, engine  # noqa: E402
+from app.models.models import User  # noqa: E402
+from app.utils.auth import create_access_token, principal_cache  # noqa: E402
+
+
+@pytest.fixture
+def db():
+    """A session on freshly created tables."""
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    principal_cache._entries.clear()
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def make_user(db):
+    def make(email="user@example.com"):
+        user = User(email=email, hashed_password="not-used", full_name="Test User")
+        db.add(user)
+        db.commit()
+        return user
+
+    return make
+
+
+@pytest.fixture
+def user(make_user):
+    return make_user()
+
+
+@pytest.fixture
+def auth_headers():
+    def headers(user) -> dict:
+        token = create_access_token({"sub": str(user.id), "ver": user.token_version or 0})
+        return {"Authorization": f"Bearer {token}"}
+
+    return headers
+
+
+@pytest.fixture
+def client(db):
+    """The app with its lifespan (schema upgrade, ingestion workers) running."""
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    with TestClient(app) as test_client:
+        yield test_client
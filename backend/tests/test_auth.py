@@ -0,0 +1,77 @@
+import time
+
+from app.models.models import User
+from app.utils.auth import Principal, PrincipalCache, create_access_token, principal_cache
+
+
+def _principal(user_id=1):
+    return Principal(id=user_id, email=f"u{user_id}@example.com", full_name="", token_version=0)
+
+
+def test_cache_entries_never_outlive_the_token():
+    cache = PrincipalCache(ttl_seconds=60)
+    cache.put("expired", _principal(), time.time() - 1)
+    cache.put("valid", _principal(), time.time() + 3600)
+    assert cache.get("expired") is None
+    assert cache.get("valid") == _principal()
+
+
+def test_cache_evicts_least_recently_used():
+    cache = PrincipalCache(ttl_seconds=60, max_entries=2)
+    later = time.time() + 3600
+    cache.put("a", _principal(1), later)
+    cache.put("b", _principal(2), later)
+    cache.get("a")
+    cache.put("c", _principal(3), later)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+
+
+def test_invalidate_user_drops_only_that_users_tokens():
+    cache = PrincipalCache(ttl_seconds=60)
+    later = time.time() + 3600
+    cache.put("a1", _principal(1), later)
+    cache.put("a2", _principal(1), later)
+    cache.put("b1", _principal(2), later)
+    cache.invalidate_user(1)
+    assert cache.get("a1") is None and cache.get("a2") is None
+    assert cache.get("b1") is not None
+    assert cache.stats()["invalidations"] == 2
+
+
+def _register(client, email="owner@example.com", password="first-password"):
+    res = client.post("/auth/register", json={"email": email, "password": password, "full_name": "Owner"})
+    assert res.status_code == 200
+    return res.json()["access_token"]
+
+
+def test_change_password_revokes_cached_tokens(client):
+    old = _register(client)
+    assert client.get("/auth/validate", headers={"Authorization": f"Bearer {old}"}).status_code == 200
+    assert principal_cache.get(old) is not None
+
+    res = client.post(
+        "/auth/change-password",
+        json={"current_password": "first-password", "new_password": "second-password"},
+        headers={"Authorization": f"Bearer {old}"},
+    )
+    assert res.status_code == 200
+    new = res.json()["access_token"]
+
+    assert client.get("/auth/validate", headers={"Authorization": f"Bearer {old}"}).status_code == 401
+    assert client.get("/auth/validate", headers={"Authorization": f"Bearer {new}"}).status_code == 200
+
+
+def test_token_with_a_stale_version_is_rejected(client, db, user):
+    user.token_version = 3
+    db.commit()
+    stale = create_access_token({"sub": str(user.id), "ver": 2})
+    current = create_access_token({"sub": str(user.id), "ver": 3})
+    assert client.get("/auth/validate", headers={"Authorization": f"Bearer {stale}"}).status_code == 401
+    assert client.get("/auth/validate", headers={"Authorization": f"Bearer {current}"}).status_code == 200
+
+
+def test_unknown_user_is_rejected(client, db):
+    token = create_access_token({"sub": "999", "ver": 0})
+    assert db.query(User).count() == 0
+    assert client.get("/auth/validate", headers={"Authorization": f"Bearer {token}"}).status_code == 401
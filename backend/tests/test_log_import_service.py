@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from app.models.models import ManualLog
+from app.services.log_import_service import MAX_RECORD_LINES, LogImportError, _records
+
+
+def _parse(body: str, chunk_size: int = 7, fmt: str = "csv") -> list:
+    data = body.encode()
+
+    async def chunks():
+        for i in range(0, len(data), chunk_size):
+            yield data[i:i + chunk_size]
+
+    async def collect():
+        return [r async for r in _records(chunks(), fmt)]
+
+    return asyncio.run(collect())
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 4096])
+def test_multibyte_text_and_quoted_newlines_survive_chunking(chunk_size):
+    body = '﻿log_type,value,notes\npulse,60,"café µ"\r\npulse,61,"line one\nline two, with comma"\npulse,62,"say ""hi"""\n'
+    records = _parse(body, chunk_size)
+    assert records == [
+        (2, {"log_type": "pulse", "value": "60", "notes": "café µ"}),
+        (3, {"log_type": "pulse", "value": "61", "notes": "line one\nline two, with comma"}),
+        (5, {"log_type": "pulse", "value": "62", "notes": 'say "hi"'}),
+    ]
+
+
+def test_stray_quote_rejects_only_its_row():
+    rows = [f"glucose,{100 + i},ok" for i in range(3 * MAX_RECORD_LINES)]
+    rows[3] = 'glucose,99,5" tall'
+    rows[-1] = 'glucose,98,oops "'
+    records = _parse("log_type,value,notes\n" + "\n".join(rows) + "\n")
+
+    errors = [(line, r) for line, r in records if isinstance(r, str)]
+    assert errors == [(5, "unterminated quoted field"), (len(rows) + 1, "unterminated quoted field")]
+    assert len(records) - len(errors) == len(rows) - 2
+
+
+def test_bad_header_fails_the_import():
+    with pytest.raises(LogImportError):
+        _parse("type,amount\nglucose,100\n")
+
+
+def test_ndjson_reports_bad_lines():
+    records = _parse('{"log_type": "weight", "value": 70}\nnot json\n[1]\n', fmt="ndjson")
+    assert records[0] == (1, {"log_type": "weight", "value": 70})
+    assert records[1][0] == 2 and records[1][1].startswith("invalid JSON")
+    assert records[2] == (3, "expected a JSON object")
+
+
+def test_bulk_import_is_replay_safe(client, db, user, auth_headers):
+    body = "log_type,value,logged_at,idempotency_key\n" + "".join(
+        f"glucose,{90 + i},2024-01-0{1 + i % 9}T08:00:00,key-{i}\n" for i in range(20)
+    ) + "glucose,not-a-number,,key-x\n"
+    headers = {**auth_headers(user), "Content-Type": "text/csv"}
+
+    first = client.post("/logs/bulk", content=body, headers=headers).json()
+    assert (first["inserted"], first["duplicates"], first["rejected"]) == (20, 0, 1)
+    replay = client.post("/logs/bulk", content=body, headers=headers).json()
+    assert (replay["inserted"], replay["duplicates"], replay["rejected"]) == (0, 20, 1)
+    assert db.query(ManualLog).count() == 20
@@ -0,0 +1,96 @@
+from datetime import date, datetime, time, timedelta
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from app.services.medication_effects import (
+    DAYS_PER_YEAR, _window_index, annotate_active_medicines, medication_effects,
+)
+
+
+def _point(i, code, day, value):
+    return SimpleNamespace(id=i, code=code, name=code.upper(), unit="u", value=value,
+                           recorded_at=datetime.combine(day, time(8)))
+
+
+def _medicine(i, start, end=None):
+    return SimpleNamespace(id=i, start_date=start, end_date=end)
+
+
+@pytest.fixture
+def history():
+    rng = np.random.default_rng(7)
+    first = date(2023, 1, 1)
+    points = []
+    for code, step, base in (("hba1c", 9, 6.5), ("ldl", 23, 140.0), ("tsh", 61, 2.0)):
+        for offset in range(0, 700, step):
+            points.append(_point(len(points) + 1, code, first + timedelta(days=offset), base + rng.normal(0, base / 20)))
+    points.sort(key=lambda b: b.recorded_at)
+    medicines = [
+        _medicine(1, date(2023, 6, 1)),
+        _medicine(2, date(2023, 9, 15), date(2023, 11, 30)),
+        _medicine(3, date(2025, 3, 1)),  # after the last point: no "after" window
+    ]
+    return points, medicines
+
+
+def _slope(x, y):
+    if len(x) < 2 or np.var(x) < 1e-12:
+        return None
+    return float(np.polyfit(x, y, 1)[0])
+
+
+def test_window_index():
+    idx, owner = _window_index(np.array([2, 5, 5]), np.array([4, 8, 5]))
+    assert idx.tolist() == [2, 3, 5, 6, 7]
+    assert owner.tolist() == [0, 0, 1, 1, 1]
+
+
+def test_effects_match_a_per_window_scan(history):
+    points, medicines = history
+    window = 120
+    results = medication_effects(points, medicines, window_days=window)
+
+    for m in medicines:
+        start = datetime.combine(m.start_date, time.min)
+        end = datetime.combine(m.end_date, time.max) if m.end_date else datetime.max
+        after_end = min(start + timedelta(days=window), end)
+        expected = {}
+        for code in {b.code for b in points}:
+            series = [b for b in points if b.code == code]
+            before = [b for b in series if start - timedelta(days=window) <= b.recorded_at < start]
+            after = [b for b in series if start <= b.recorded_at <= after_end]
+            if before and after:
+                expected[code] = (before, after)
+
+        got = {e["code"]: e for e in results[m.id]}
+        assert got.keys() == expected.keys()
+        for code, (before, after) in expected.items():
+            e = got[code]
+            for side, rows in (("before", before), ("after", after)):
+                x = np.array([(b.recorded_at - start).total_seconds() / 86400 / DAYS_PER_YEAR for b in rows])
+                y = np.array([b.value for b in rows])
+                assert e[side]["n"] == len(rows)
+                assert e[side]["mean"] == pytest.approx(y.mean(), abs=1e-4)
+                slope = _slope(x, y)
+                assert e[side]["slope_per_year"] == (None if slope is None else pytest.approx(slope, rel=1e-3, abs=1e-3))
+            assert e["mean_change"] == pytest.approx(np.mean([b.value for b in after]) - np.mean([b.value for b in before]), abs=1e-4)
+
+    assert results[3] == []
+
+
+def test_end_date_closes_the_after_window(history):
+    points, _ = history
+    short = _medicine(1, date(2023, 6, 1), date(2023, 6, 20))
+    (effects,) = medication_effects(points, [short], window_days=180).values()
+    for e in effects:
+        in_window = [b for b in points if b.code == e["code"]
+                     and datetime(2023, 6, 1) <= b.recorded_at <= datetime(2023, 6, 20, 23, 59, 59)]
+        assert e["after"]["n"] == len(in_window)
+
+
+def test_annotate_active_medicines():
+    points = [_point(i, "x", date(2024, 1, d), 1.0) for i, d in enumerate((1, 5, 10, 20), start=1)]
+    medicines = [_medicine(1, date(2024, 1, 5), date(2024, 1, 10)), _medicine(2, date(2024, 1, 10))]
+    assert annotate_active_medicines(points, medicines) == [[], [1], [1, 2], [2]]
@@ -0,0 +1,71 @@
+import asyncio
+import json
+import re
+
+import pytest
+
+from app.ai.llm_client import FakeBackend, LLMClient, set_llm_client
+from app.ai.openai_service import chunk_report_text, extract_biomarkers_with_stats, merge_biomarkers
+
+
+def test_merge_drops_overlap_repeats_and_fills_missing_fields():
+    first = [
+        {"name": "Hemoglobin", "value": "14.2", "unit": "g/dL", "ref_min": "12", "ref_max": "16"},
+        {"name": "HbA1c", "value": "6.1", "unit": "", "ref_min": "", "ref_max": ""},
+    ]
+    second = [
+        {"name": "Glycated Hemoglobin", "value": "6.10", "unit": "%", "ref_min": "", "ref_max": "5.7"},
+        {"name": "LDL", "value": "130", "unit": "mg/dL", "ref_min": "", "ref_max": "100"},
+    ]
+    merged = merge_biomarkers([first, second])
+
+    assert [b["name"] for b in merged] == ["Hemoglobin", "HbA1c", "LDL"]
+    hba1c = merged[1]
+    assert (hba1c["unit"], hba1c["ref_max"]) == ("%", "5.7")
+
+
+def test_merge_keeps_distinct_values_of_the_same_code():
+    merged = merge_biomarkers([
+        [{"name": "Glucose", "value": "98"}],
+        [{"name": "Glucose", "value": "140"}],
+    ])
+    assert [b["value"] for b in merged] == ["98", "140"]
+
+
+def test_merge_skips_malformed_items():
+    merged = merge_biomarkers([None, ["junk", {"name": "TSH", "value": "n/a"}]])
+    assert merged == [{"name": "TSH", "value": "n/a"}]
+
+
+def test_chunks_respect_the_size_and_overlap():
+    lines = [f"Marker {i:03d}   {i}.0   mg/dL   0-{i + 10}" for i in range(200)]
+    chunks = chunk_report_text("\n".join(lines), max_chars=1000, overlap=100)
+
+    assert len(chunks) > 1
+    assert all(len(c) <= 1000 + 100 for c in chunks)
+    for previous, current in zip(chunks, chunks[1:]):
+        assert previous.splitlines()[-1] in current  # the boundary row is seen whole
+    covered = {line for c in chunks for line in c.splitlines()}
+    assert covered == set(lines)
+
+
+@pytest.fixture
+def echo_backend():
+    """Replies with every "name value" row found in the prompt's report text."""
+    def respond(prompt):
+        text = prompt.split("Report text:")[1].split("Return format:")[0]
+        rows = re.findall(r"^(\w[\w ]*?)\s{3}([\d.]+)", text, flags=re.M)
+        return json.dumps([{"name": n, "value": v, "unit": "", "ref_min": "", "ref_max": ""} for n, v in rows])
+
+    set_llm_client(LLMClient(FakeBackend(latency_ms=0, responder=respond)))
+    yield
+    set_llm_client(None)
+
+
+def test_extraction_across_chunks_reports_each_row_once(echo_backend):
+    names = [f"Marker {i:03d}" for i in range(300)]
+    text = "\n".join(f"{n}   {i + 1}.5   mg/dL   0-100" for i, n in enumerate(names))
+
+    biomarkers, chunk_stats = asyncio.run(extract_biomarkers_with_stats(text, use_cache=False))
+    assert len(chunk_stats) > 1
+    assert [b["name"] for b in biomarkers] == names
@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from app.models.models import ManualLog
+from app.utils.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor, paginate
+
+
+@pytest.fixture
+def logs(db, user):
+    """Ten timestamped logs (two sharing a timestamp) and three without one."""
+    start = datetime(2024, 1, 1)
+    rows = [ManualLog(user_id=user.id, log_type="glucose", value=100 + i,
+                      logged_at=start + timedelta(hours=i if i != 5 else 4)) for i in range(10)]
+    rows += [ManualLog(user_id=user.id, log_type="glucose", value=200 + i) for i in range(3)]
+    db.add_all(rows)
+    db.flush()
+    # logged_at has a column default, so NULLs have to be written explicitly.
+    untimed = [r.id for r in rows[10:]]
+    db.query(ManualLog).filter(ManualLog.id.in_(untimed)).update({ManualLog.logged_at: None}, synchronize_session=False)
+    db.commit()
+    timed = sorted(rows[:10], key=lambda r: (r.logged_at, r.id))
+    return [r.id for r in timed], untimed
+
+
+def _walk(db, user, limit, descending):
+    query = db.query(ManualLog).filter(ManualLog.user_id == user.id)
+    ids, cursor, pages = [], None, 0
+    while True:
+        rows, cursor = paginate(query, ManualLog.logged_at, ManualLog.id, cursor, limit, descending=descending)
+        assert len(rows) <= limit
+        ids += [r.id for r in rows]
+        pages += 1
+        if cursor is None:
+            return ids, pages
+
+
+@pytest.mark.parametrize("limit", [1, 3, 4, 13, 50])
+def test_ascending_pages_cover_every_row_once(db, user, logs, limit):
+    timed, untimed = logs
+    ids, _ = _walk(db, user, limit, descending=False)
+    assert ids == timed + untimed
+
+
+@pytest.mark.parametrize("limit", [1, 3, 4, 13, 50])
+def test_descending_pages_cover_every_row_once(db, user, logs, limit):
+    timed, untimed = logs
+    ids, _ = _walk(db, user, limit, descending=True)
+    assert ids == timed[::-1] + untimed[::-1]
+
+
+def test_cursor_round_trip():
+    ts = datetime(2024, 3, 1, 12, 30)
+    assert decode_cursor(encode_cursor(ts, 42)) == (ts, 42)
+    assert decode_cursor(encode_cursor(None, 7)) == (None, 7)
+    with pytest.raises(HTTPException):
+        decode_cursor("not-a-cursor")
+
+
+def test_logs_endpoint_follows_cursors(client, db, user, logs, auth_headers):
+    timed, untimed = logs
+    ids, cursor = [], None
+    while True:
+        params = {"limit": 4, **({"cursor": cursor} if cursor else {})}
+        res = client.get("/logs/", params=params, headers=auth_headers(user))
+        assert res.status_code == 200
+        ids += [row["id"] for row in res.json()]
+        cursor = res.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            break
+    assert ids == timed + untimed
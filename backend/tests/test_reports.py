@@ -0,0 +1,123 @@
+import os
+import time
+
+import pytest
+
+from app.models.models import Biomarker, Report
+from app.services import storage_service
+from app.services.storage_service import blob_path, place_upload, release_file
+
+CORPUS = os.path.join(os.path.dirname(__file__), "..", "scripts", "fixtures", "lab_corpus")
+PDF = os.path.join(CORPUS, "report_000_ruled.pdf")
+
+
+def _upload(client, headers, path=PDF):
+    with open(path, "rb") as f:
+        res = client.post("/reports/upload", files={"file": (os.path.basename(path), f, "application/pdf")}, headers=headers)
+    assert res.status_code == 200, res.text
+    return res.json()
+
+
+def _wait_for_job(client, headers, job_id, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = client.get(f"/reports/jobs/{job_id}", headers=headers).json()
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.05)
+    pytest.fail(f"job {job_id} did not finish")
+
+
+def _ingest(client, headers):
+    first = _upload(client, headers)
+    assert first["deduplicated"] is False
+    job = _wait_for_job(client, headers, first["job_id"])
+    assert job["status"] == "done", job["error"]
+    return first, job
+
+
+def test_reupload_reuses_the_earlier_ingestion(client, db, user, auth_headers):
+    headers = auth_headers(user)
+    first, job = _ingest(client, headers)
+
+    again = _upload(client, headers)
+    assert again["deduplicated"] is True and again["job_id"] is None
+    assert again["biomarkers_extracted"] == job["result"]["biomarkers_extracted"] > 0
+
+    def values(report_id):
+        rows = db.query(Biomarker.code, Biomarker.value).filter(Biomarker.report_id == report_id).order_by(Biomarker.id)
+        return [tuple(r) for r in rows]
+
+    assert values(again["report_id"]) == values(first["report_id"])
+    paths = {r.file_path for r in db.query(Report)}
+    assert len(paths) == 1 and os.path.exists(paths.pop())
+
+
+def test_dedup_is_scoped_to_the_user(client, make_user, auth_headers):
+    owner, other = make_user("owner@example.com"), make_user("other@example.com")
+    _ingest(client, auth_headers(owner))
+
+    theirs = _upload(client, auth_headers(other))
+    assert theirs["deduplicated"] is False
+    assert theirs["job_id"] is not None
+
+
+def test_blob_is_removed_with_its_last_report(client, db, make_user, auth_headers):
+    owner, other = make_user("owner@example.com"), make_user("other@example.com")
+    first, _ = _ingest(client, auth_headers(owner))
+    second = _upload(client, auth_headers(owner))
+    theirs = _upload(client, auth_headers(other))
+    _wait_for_job(client, auth_headers(other), theirs["job_id"])
+    path = db.query(Report.file_path).filter(Report.id == first["report_id"]).scalar()
+
+    for report_id, account in ((first["report_id"], owner), (second["report_id"], owner)):
+        assert client.delete(f"/reports/{report_id}", headers=auth_headers(account)).status_code == 200
+        assert os.path.exists(path)  # the other account still references it
+    assert client.delete(f"/reports/{theirs['report_id']}", headers=auth_headers(other)).status_code == 200
+    assert not os.path.exists(path)
+
+
+def _blob(digest, content=b"%PDF-1.4 test"):
+    path = blob_path(digest)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(content)
+    return path
+
+
+def test_release_file_keeps_a_referenced_blob(db, user):
+    digest = "ab" * 32
+    path = _blob(digest)
+    db.add(Report(user_id=user.id, filename="a.pdf", file_path=path, content_hash=digest))
+    db.commit()
+    release_file(db, digest, path)
+    assert os.path.exists(path)
+
+
+def test_release_file_restores_a_blob_referenced_meanwhile(db, user, monkeypatch):
+    """A report committed between the first reference check and the rename keeps its blob."""
+    digest = "cd" * 32
+    path = _blob(digest)
+    rename = os.rename
+
+    def rename_then_commit(src, dst):
+        rename(src, dst)
+        db.add(Report(user_id=user.id, filename="b.pdf", file_path=path, content_hash=digest))
+        db.commit()
+
+    monkeypatch.setattr(storage_service.os, "rename", rename_then_commit)
+    release_file(db, digest, path)
+    assert os.path.exists(path)
+    assert not [n for n in os.listdir(os.path.dirname(path)) if n.endswith(".deleting")]
+
+
+def test_place_upload_puts_back_a_released_blob(db, tmp_path):
+    digest = "ef" * 32
+    path = _blob(digest)
+    release_file(db, digest, path)
+    assert not os.path.exists(path)
+
+    staged = tmp_path / "upload.part"
+    staged.write_bytes(b"%PDF-1.4 test")
+    assert place_upload(digest, str(staged)) == path
+    assert os.path.exists(path) and not staged.exists()
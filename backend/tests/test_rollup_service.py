@@ -0,0 +1,123 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models.models import LogRollup, ManualLog
+from app.services import rollup_service
+from app.services.rollup_service import (
+    add_to_rollups, apply_retention, bucket_start, rebuild_rollups, remove_from_rollups, retention_cutoff,
+)
+
+FIELDS = ("count", "sum", "sumsq", "min_value", "max_value", "count2", "sum2", "sumsq2", "min_value2", "max_value2")
+
+
+def _add(db, user, when, value, value2=None, log_type="blood_pressure"):
+    log = ManualLog(user_id=user.id, log_type=log_type, value=value, value2=value2, logged_at=when)
+    db.add(log)
+    add_to_rollups(db, [(user.id, log_type, when, value, value2)])
+    db.commit()
+    return log
+
+
+def _snapshot(db):
+    return {
+        (r.user_id, r.log_type, r.granularity, r.bucket_start): tuple(
+            round(v, 9) if isinstance(v, float) else v for v in (getattr(r, f) for f in FIELDS)
+        )
+        for r in db.query(LogRollup)
+    }
+
+
+def test_bucket_start():
+    ts = datetime(2024, 5, 16, 13, 45, 12)  # a Thursday
+    assert bucket_start(ts, "hour") == datetime(2024, 5, 16, 13)
+    assert bucket_start(ts, "day") == datetime(2024, 5, 16)
+    assert bucket_start(ts, "week") == datetime(2024, 5, 13)
+
+
+def test_incremental_upserts_match_a_rebuild(db, user):
+    start = datetime(2024, 1, 1, 8)
+    for i in range(40):
+        _add(db, user, start + timedelta(hours=7 * i), 120 + i % 9, None if i % 4 == 0 else 80 - i % 5)
+    incremental = _snapshot(db)
+
+    rebuild_rollups(db)
+    assert _snapshot(db) == incremental
+
+
+def test_same_bucket_accumulates_in_one_row(db, user):
+    when = datetime(2024, 1, 1, 8)
+    _add(db, user, when, 120, 80)
+    _add(db, user, when + timedelta(minutes=5), 140, None)
+
+    hour = db.query(LogRollup).filter_by(granularity="hour").one()
+    assert (hour.count, hour.sum, hour.min_value, hour.max_value) == (2, 260, 120, 140)
+    assert (hour.count2, hour.sum2, hour.min_value2, hour.max_value2) == (1, 80, 80, 80)
+
+
+def test_remove_recomputes_min_and_max(db, user):
+    when = datetime(2024, 1, 1, 8)
+    low = _add(db, user, when, 100)
+    _add(db, user, when + timedelta(minutes=1), 130)
+    _add(db, user, when + timedelta(minutes=2), 160)
+
+    db.delete(low)
+    db.flush()
+    remove_from_rollups(db, user.id, low.log_type, low.logged_at)
+    db.commit()
+    for row in db.query(LogRollup):
+        assert (row.count, row.sum, row.min_value, row.max_value) == (2, 290, 130, 160)
+
+
+def test_removing_the_last_log_deletes_its_buckets(db, user):
+    log = _add(db, user, datetime(2024, 1, 1, 8), 100)
+    db.delete(log)
+    db.flush()
+    remove_from_rollups(db, user.id, log.log_type, log.logged_at)
+    db.commit()
+    assert db.query(LogRollup).count() == 0
+
+
+def test_query_rollups_moments(db, user):
+    day = datetime(2024, 1, 1)
+    for v in (100, 110, 120):
+        _add(db, user, day + timedelta(hours=v - 99), v, log_type="glucose")
+    (bucket,) = rollup_service.query_rollups(db, user.id, "glucose", "day")
+    assert bucket["count"] == 3
+    assert bucket["mean"] == pytest.approx(110)
+    assert bucket["std"] == pytest.approx((200 / 3) ** 0.5)
+
+
+@pytest.fixture
+def retention(monkeypatch):
+    monkeypatch.setattr(rollup_service, "LOG_RAW_RETENTION_DAYS", 30)
+    return retention_cutoff(30)
+
+
+def test_rebuild_keeps_buckets_before_the_retention_cutoff(db, user, retention):
+    now = datetime.utcnow()
+    for days in (60, 59, 5):
+        _add(db, user, now - timedelta(days=days), 100 + days, log_type="glucose")
+    assert apply_retention(db, 30) == 2
+    before = {k: v for k, v in _snapshot(db).items() if k[3] < retention}
+    assert before
+
+    rebuild_rollups(db)
+    assert {k: v for k, v in _snapshot(db).items() if k[3] < retention} == before
+
+
+def test_remove_leaves_buckets_before_the_retention_cutoff(db, user, retention):
+    old = _add(db, user, retention - timedelta(days=2), 100, log_type="glucose")
+    snapshot = _snapshot(db)
+    db.delete(old)
+    db.flush()
+    remove_from_rollups(db, user.id, old.log_type, old.logged_at)
+    db.commit()
+    assert _snapshot(db) == snapshot
+
+
+def test_create_log_rejects_rows_before_the_retention_cutoff(client, user, auth_headers, retention):
+    stale = {"log_type": "glucose", "value": 90, "logged_at": (retention - timedelta(days=1)).isoformat()}
+    assert client.post("/logs/", json=stale, headers=auth_headers(user)).status_code == 422
+    fresh = {"log_type": "glucose", "value": 90}
+    assert client.post("/logs/", json=fresh, headers=auth_headers(user)).status_code == 200
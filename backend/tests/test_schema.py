@@ -0,0 +1,39 @@
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+
+from app.database import engine
+from app.models.models import Biomarker, BiomarkerStats, LogRollup, ManualLog, Report
+from app.utils.schema import ensure_schema, upgrade_database
+
+
+def test_upgrade_adds_columns_and_backfills(db, user):
+    report = Report(user_id=user.id, filename="r.pdf", file_path="r.pdf")
+    db.add(report)
+    db.flush()
+    db.add_all([
+        Biomarker(report_id=report.id, user_id=user.id, name="Glycated Hemoglobin", value=v, recorded_at=datetime(2024, 1, d))
+        for d, v in ((1, 6.1), (2, 6.4))
+    ])
+    db.add(ManualLog(user_id=user.id, log_type="glucose", value=100, logged_at=datetime(2024, 1, 1, 8)))
+    db.commit()
+    db.close()
+
+    # Roll the database back to before these additions.
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX IF EXISTS uq_manual_logs_user_idempotency"))
+        conn.execute(text("ALTER TABLE manual_logs DROP COLUMN idempotency_key"))
+        conn.execute(text("ALTER TABLE users DROP COLUMN token_version"))
+        conn.execute(text("DROP TABLE biomarker_stats"))
+        conn.execute(text("DROP TABLE log_rollups"))
+
+    upgrade_database()
+
+    inspector = inspect(engine)
+    assert "token_version" in {c["name"] for c in inspector.get_columns("users")}
+    assert "idempotency_key" in {c["name"] for c in inspector.get_columns("manual_logs")}
+    assert [code for (code,) in db.query(Biomarker.code)] == ["hba1c", "hba1c"]
+    stats = db.query(BiomarkerStats).one()
+    assert (stats.code, stats.count) == ("hba1c", 2)
+    assert db.query(LogRollup).count() == 3  # hour, day, week
+    assert ensure_schema() == []
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from app.services.series_service import bucket_series, lttb_indices, lttb_series
+
+
+def _lttb_reference(x, y, threshold):
+    """Straightforward single-series LTTB, one bucket at a time."""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+    every = (n - 2) / (threshold - 2)
+    kept, a = [0], 0
+    for i in range(threshold - 2):
+        lo, hi = int(i * every) + 1, int((i + 1) * every) + 1
+        nlo, nhi = hi, min(int((i + 2) * every) + 1, n - 1)
+        if nlo >= nhi:
+            cx, cy = x[n - 1], y[n - 1]
+        else:
+            cx, cy = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = [abs((x[a] - cx) * (y[j] - y[a]) - (x[a] - x[j]) * (cy - y[a])) for j in range(lo, hi)]
+        a = lo + int(np.argmax(area))
+        kept.append(a)
+    kept.append(n - 1)
+    return kept
+
+
+@pytest.mark.parametrize("n,threshold", [(10, 5), (101, 12), (1000, 50), (997, 333)])
+def test_lttb_matches_the_reference(n, threshold):
+    rng = np.random.default_rng(n)
+    x = np.cumsum(rng.uniform(0.5, 2.0, n))
+    y = np.sin(x / 7) + rng.normal(0, 0.2, n)
+    kept = lttb_indices(x, y[None, :], threshold)
+    assert kept.tolist() == _lttb_reference(x, y, threshold)
+
+
+def test_lttb_keeps_the_ends_and_a_spike():
+    x = np.arange(500, dtype=float)
+    y = np.zeros(500)
+    y[250] = 100.0
+    kept = lttb_indices(x, y[None, :], 20)
+    assert len(kept) == 20
+    assert kept[0] == 0 and kept[-1] == 499
+    assert 250 in kept
+    assert np.all(np.diff(kept) > 0)
+
+
+def test_lttb_returns_everything_below_the_threshold():
+    x = np.arange(5, dtype=float)
+    assert lttb_indices(x, x[None, :], 10).tolist() == [0, 1, 2, 3, 4]
+
+
+def test_lttb_series_keeps_pairs_together():
+    ts = np.arange(0, 86400 * 100, 86400, dtype=float)
+    value = 120 + 10 * np.sin(ts / 1e6)
+    value2 = value - 40
+    value2[7] = np.nan
+    points = lttb_series(ts, value, value2, 30)
+    assert len(points) == 30
+    for p in points:
+        assert p["value2"] is None or p["value2"] == pytest.approx(p["value"] - 40)
+
+
+def test_bucket_series_stats():
+    ts = np.array([0.0, 1.0, 2.0, 10.0, 11.0])
+    value = np.array([1.0, 3.0, 5.0, 7.0, 9.0])
+    buckets = bucket_series(ts, value, None, 0.0, 12.0, 2)
+    assert [(b["count"], b["min"], b["mean"], b["max"]) for b in buckets] == [(3, 1.0, 3.0, 5.0), (2, 7.0, 8.0, 9.0)]
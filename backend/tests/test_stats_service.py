@@ -0,0 +1,111 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from app.models.models import Biomarker, BiomarkerStats, Report
+from app.services.stats_service import (
+    Z_THRESHOLD, add_to_stats, query_anomalies, rebuild_stats, remove_from_stats, std_of,
+)
+
+
+def _insert(db, user, values, code="hba1c", name="HbA1c", start=datetime(2024, 1, 1)):
+    report = Report(user_id=user.id, filename="r.pdf", file_path="r.pdf")
+    db.add(report)
+    db.flush()
+    rows = [
+        Biomarker(report_id=report.id, user_id=user.id, name=name, code=code, value=v,
+                  recorded_at=start + timedelta(days=i))
+        for i, v in enumerate(values)
+    ]
+    db.add_all(rows)
+    db.flush()
+    add_to_stats(db, user.id, rows)
+    db.commit()
+    return rows
+
+
+def _stats(db, user, code="hba1c"):
+    return db.query(BiomarkerStats).filter_by(user_id=user.id, code=code).one_or_none()
+
+
+def test_add_matches_numpy(db, user):
+    values = [5.2, 6.1, 5.8, 7.4, 5.9, 6.3]
+    _insert(db, user, values[:2])
+    _insert(db, user, values[2:], start=datetime(2024, 2, 1))
+
+    s = _stats(db, user)
+    assert s.count == len(values)
+    assert s.mean == pytest.approx(np.mean(values))
+    assert std_of(s) == pytest.approx(np.std(values))
+    assert (s.min_value, s.max_value) == (min(values), max(values))
+    assert s.last_value == values[-1]
+
+
+def test_remove_reverses_add(db, user):
+    values = [5.2, 6.1, 5.8, 7.4, 5.9, 6.3]
+    rows = _insert(db, user, values)
+    removed = rows[1::2]
+    for b in removed:
+        db.delete(b)
+    db.flush()
+    remove_from_stats(db, user.id, [(b.code, b.value) for b in removed])
+    db.commit()
+
+    kept = values[0::2]
+    s = _stats(db, user)
+    assert s.count == len(kept)
+    assert s.mean == pytest.approx(np.mean(kept))
+    assert std_of(s) == pytest.approx(np.std(kept))
+    assert (s.min_value, s.max_value) == (min(kept), max(kept))
+    assert s.last_value == kept[-1]
+
+
+def test_removing_every_row_drops_the_stats(db, user):
+    rows = _insert(db, user, [5.0, 6.0])
+    for b in rows:
+        db.delete(b)
+    db.flush()
+    remove_from_stats(db, user.id, [(b.code, b.value) for b in rows])
+    db.commit()
+    assert _stats(db, user) is None
+
+
+def test_rebuild_matches_incremental(db, user):
+    _insert(db, user, [5.2, 6.1, 5.8])
+    _insert(db, user, [120.0, 95.0, 101.0], code="ldl", name="LDL")
+    incremental = {s.code: (s.count, s.mean, s.m2) for s in db.query(BiomarkerStats)}
+
+    assert rebuild_stats(db) == 2
+    for s in db.query(BiomarkerStats):
+        count, mean, m2 = incremental[s.code]
+        assert s.count == count
+        assert s.mean == pytest.approx(mean)
+        assert s.m2 == pytest.approx(m2)
+
+
+def test_query_anomalies_matches_full_scan(db, user):
+    values = [5.0, 5.1, 4.9, 5.0, 5.05, 4.95, 5.0, 9.0]
+    rows = _insert(db, user, values)
+
+    mean, std = np.mean(values), np.std(values)
+    expected = [b.id for b, v in zip(rows, values) if abs(v - mean) / std > Z_THRESHOLD]
+    anomalies = query_anomalies(db, user.id)
+    assert [a["biomarker_id"] for a in anomalies] == expected == [rows[-1].id]
+    assert anomalies[0]["z_score"] == round(abs(9.0 - mean) / std, 2)
+
+
+def test_query_anomalies_is_scoped_to_the_user(db, make_user):
+    owner, other = make_user("a@example.com"), make_user("b@example.com")
+    _insert(db, owner, [5.0, 5.1, 4.9, 5.0, 5.05, 4.95, 5.0, 9.0])
+    assert query_anomalies(db, other.id) == []
+
+
+def test_dashboard_and_anomalies_endpoint_agree(client, db, user, auth_headers):
+    _insert(db, user, [5.0, 5.1, 4.9, 5.0, 5.05, 4.95, 5.0, 9.0])
+    _insert(db, user, [100.0, 101.0, 99.0, 100.0, 160.0], code="ldl", name="LDL")
+    headers = auth_headers(user)
+
+    dashboard = client.get("/biomarkers/dashboard", headers=headers).json()
+    anomalies = client.get("/biomarkers/anomalies", headers=headers).json()
+    assert anomalies and dashboard["anomalies"] == anomalies
@@ -3,6 +3,14 @@ import {
   Tooltip, ReferenceLine, ResponsiveContainer, Legend
 } from 'recharts'
 import { format } from 'date-fns'
+import { useState, useEffect } from 'react'
+import api from '../utils/api'
+
+const CHART_POINTS = 400
+
+// Series timestamps and anomaly recorded_at values are both naive UTC ISO
+// strings; compare them to the second.
+const toSecond = (iso) => Math.round(new Date(iso).getTime() / 1000)
 
 const CustomTooltip = ({ active, payload, label }) => {
   if (!active || !payload?.length) return null
@@ -18,13 +26,27 @@ const CustomTooltip = ({ active, payload, label }) => {
   )
 }
 
-export default function BiomarkerChart({ historical = [], forecast = [], refMin, refMax, unit, anomalyIds = [] }) {
-  const anomalySet = new Set(anomalyIds)
+export default function BiomarkerChart({ name, refreshKey, forecast = [], refMin, refMax, unit, anomalies = [] }) {
+  const [historical, setHistorical] = useState([])
 
-  const histData = historical.map(d => ({
-    date: format(new Date(d.date), 'MMM d yy'),
-    actual: d.value,
-    isAnomaly: anomalySet.has(d.id),
+  // The history comes downsampled from /series, so long histories keep their
+  // shape without shipping every reading. Refetched when refreshKey changes
+  // (the page reloaded); an unchanged series revalidates with a 304.
+  useEffect(() => {
+    if (!name) return
+    let cancelled = false
+    api.get('/series/biomarkers', { params: { name, points: CHART_POINTS } })
+      .then(res => { if (!cancelled) setHistorical(res.data.points) })
+      .catch(() => {})
+    return () => { cancelled = true }
+  }, [name, refreshKey])
+
+  const anomalyTimes = new Set(anomalies.map(a => toSecond(a.recorded_at)))
+
+  const histData = historical.map(p => ({
+    date: format(new Date(p.t), 'MMM d yy'),
+    actual: p.value,
+    isAnomaly: anomalyTimes.has(toSecond(p.t)),
   }))
 
   const forecastData = forecast.map(d => ({
@@ -27,8 +27,7 @@ export default function ChatPage() {
     setMessages(m => [...m, { role: 'user', content: q }])
     setLoading(true)
     try {
-      const res = await api.post('/chat/', { message: q, doctor_mode: doctorMode })
-      setMessages(m => [...m, { role: 'assistant', content: res.data.answer }])
+      await streamAnswer(q)
     } catch (e) {
       setMessages(m => [...m, { role: 'assistant', content: 'Sorry, an error occurred. Please try again.' }])
     } finally {
@@ -36,6 +35,44 @@ export default function ChatPage() {
     }
   }
 
+  // Reads the /chat/stream SSE response and appends tokens to the last message as they arrive.
+  const streamAnswer = async (q) => {
+    const res = await fetch(`${api.defaults.baseURL}/chat/stream`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        Authorization: `Bearer ${localStorage.getItem('token')}`,
+      },
+      body: JSON.stringify({ message: q, doctor_mode: doctorMode }),
+    })
+    if (!res.ok || !res.body) throw new Error(`HTTP ${res.status}`)
+
+    setMessages(m => [...m, { role: 'assistant', content: '' }])
+    setLoading(false)
+    const append = (text) => setMessages(m => {
+      const last = m[m.length - 1]
+      return [...m.slice(0, -1), { ...last, content: last.content + text }]
+    })
+
+    const reader = res.body.getReader()
+    const decoder = new TextDecoder()
+    let buffer = ''
+    while (true) {
+      const { value, done } = await reader.read()
+      if (done) break
+      buffer += decoder.decode(value, { stream: true })
+      const events = buffer.split('\n\n')
+      buffer = events.pop()
+      for (const raw of events) {
+        const event = raw.match(/^event: (.*)$/m)?.[1]
+        const data = raw.match(/^data: (.*)$/m)?.[1]
+        if (!data) continue
+        if (event === 'token') append(JSON.parse(data).text)
+        if (event === 'error') append('\n\nSorry, an error occurred. Please try again.')
+      }
+    }
+  }
+
   return (
     <div className="flex flex-col h-full">
       {/* Header */}
@@ -28,6 +28,7 @@ export default function Dashboard() {
   const [biomarkerNames, setBiomarkerNames] = useState([])
   const [selectedBiomarker, setSelectedBiomarker] = useState('')
   const [biomarkers, setBiomarkers] = useState([])
+  const [latestByName, setLatestByName] = useState({})
   const [forecast, setForecast] = useState(null)
   const [riskScores, setRiskScores] = useState(null)
   const [anomalies, setAnomalies] = useState([])
@@ -39,54 +40,30 @@ export default function Dashboard() {
     if (user)loadData()
   }, [])
 
-  useEffect(() => {
-    if (selectedBiomarker) {
-      loadBiomarkersForName()
-      loadForecast()
-    }
-  }, [selectedBiomarker])
-
-  const loadData = async () => {
-    setLoading(true)
+  // One round trip renders the whole page; the server scans the history once.
+  const loadData = async (name) => {
+    if (!name) setLoading(true)
     try {
-      const [namesRes, riskRes, anomalyRes] = await Promise.all([
-        api.get('/biomarkers/names'),
-        api.get('/biomarkers/risk-scores'),
-        api.get('/biomarkers/anomalies'),
-      ])
-      setBiomarkerNames(namesRes.data)
-      setRiskScores(riskRes.data)
-      setAnomalies(anomalyRes.data)
-      if (namesRes.data.length > 0) setSelectedBiomarker(namesRes.data[0])
+      const res = await api.get('/biomarkers/dashboard', { params: name ? { name } : {} })
+      const d = res.data
+      setBiomarkerNames(d.names)
+      setSelectedBiomarker(d.selected || '')
+      setBiomarkers(d.series)
+      setForecast(d.forecast)
+      setRiskScores(d.risk_scores)
+      setAnomalies(d.anomalies)
+      setLatestByName(d.latest)
     } catch (e) {}
     setLoading(false)
   }
 
-  const loadBiomarkersForName = async () => {
-    try {
-      const res = await api.get('/biomarkers', { params: { name: selectedBiomarker } })
-      setBiomarkers(res.data)
-    } catch (e) {}
-  }
-
-  const loadForecast = async () => {
-    try {
-      const res = await api.get(`/biomarkers/forecast/${encodeURIComponent(selectedBiomarker)}`)
-      setForecast(res.data)
-    } catch (e) {
-      setForecast(null)
-    }
+  const selectBiomarker = (name) => {
+    setSelectedBiomarker(name)
+    loadData(name)
   }
 
-  const latestByName = {}
-  biomarkers.forEach(b => {
-    if (!latestByName[b.name] || new Date(b.recorded_at) > new Date(latestByName[b.name].recorded_at)) {
-      latestByName[b.name] = b
-    }
-  })
-
-  const anomalyIds = new Set(anomalies.filter(a => a.name === selectedBiomarker).map(a => a.biomarker_id))
-  const chartHistorical = (forecast?.historical || [])
+  const selectedCode = biomarkers[0]?.code
+  const chartAnomalies = anomalies.filter(a => a.code === selectedCode)
   const refMin = biomarkers[0]?.ref_min
   const refMax = biomarkers[0]?.ref_max
   const unit = biomarkers[0]?.unit
@@ -108,7 +85,7 @@ export default function Dashboard() {
           >
             👨‍⚕️ Doctor Mode {doctorMode ? 'ON' : 'OFF'}
           </button>
-          <button onClick={loadData} className="btn-ghost flex items-center gap-2">
+          <button onClick={() => loadData()} className="btn-ghost flex items-center gap-2">
             <RefreshCw size={14} /> Refresh
           </button>
         </div>
@@ -174,7 +151,7 @@ export default function Dashboard() {
               <h2 className="text-sm font-semibold text-white">Biomarker Trend</h2>
               <select
                 value={selectedBiomarker}
-                onChange={e => setSelectedBiomarker(e.target.value)}
+                onChange={e => selectBiomarker(e.target.value)}
                 className="bg-slate-800 border border-slate-700 text-sm text-white rounded-lg px-2 py-1.5 focus:outline-none focus:ring-2 focus:ring-brand-500"
               >
                 {biomarkerNames.map(n => <option key={n} value={n}>{n}</option>)}
@@ -182,12 +159,13 @@ export default function Dashboard() {
             </div>
 
             <BiomarkerChart
-              historical={chartHistorical}
+              name={selectedBiomarker}
+              refreshKey={forecast}
               forecast={forecast?.forecast || []}
               refMin={refMin}
               refMax={refMax}
               unit={unit}
-              anomalyIds={[...anomalyIds]}
+              anomalies={chartAnomalies}
             />
 
             {forecast?.warning && (
@@ -212,8 +190,7 @@ export default function Dashboard() {
               </thead>
               <tbody>
                 {biomarkerNames.map(name => {
-                  const bm = biomarkers.filter(b => b.name === name)
-                  const latest = bm[bm.length - 1]
+                  const latest = latestByName[name]
                   if (!latest) return null
                   const sc = statusColor(latest.value, latest.ref_min, latest.ref_max)
                   return (
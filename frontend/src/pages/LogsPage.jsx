@@ -11,13 +11,26 @@ const LOG_TYPES = [
   { value: 'pulse', label: 'Pulse', unit: 'bpm' },
 ]
 
+const CHART_POINTS = 400
+
 export default function LogsPage() {
   const [form, setForm] = useState({ log_type: 'glucose', value: '', value2: '' })
   const [logs, setLogs] = useState([])
   const [activeType, setActiveType] = useState('glucose')
+  const [series, setSeries] = useState([])
   const [saving, setSaving] = useState(false)
 
   useEffect(() => { loadLogs() }, [])
+  useEffect(() => { loadSeries() }, [activeType])
+
+  // The chart gets a downsampled series; dense logs (e.g. CGM glucose) can
+  // have far more points than the chart has pixels.
+  const loadSeries = async () => {
+    try {
+      const res = await api.get('/series/logs', { params: { log_type: activeType, points: CHART_POINTS } })
+      setSeries(res.data.points)
+    } catch (e) {}
+  }
 
   const loadLogs = async () => {
     try {
@@ -38,6 +51,7 @@ export default function LogsPage() {
       })
       setForm(f => ({ ...f, value: '', value2: '' }))
       loadLogs()
+      loadSeries()
     } catch (e) {}
     setSaving(false)
   }
@@ -46,11 +60,12 @@ export default function LogsPage() {
     try {
       await api.delete(`/logs/${id}`)
       loadLogs()
+      loadSeries()
     } catch (e) {}
   }
 
   const typeLogs = logs.filter(l => l.log_type === activeType).sort((a, b) => new Date(a.logged_at) - new Date(b.logged_at))
-  const chartData = typeLogs.map(l => ({ date: format(new Date(l.logged_at), 'MMM d'), value: l.value, value2: l.value2 }))
+  const chartData = series.map(p => ({ date: format(new Date(p.t), 'MMM d'), value: p.value, value2: p.value2 }))
   const selectedType = LOG_TYPES.find(t => t.value === form.log_type)
 
   return (
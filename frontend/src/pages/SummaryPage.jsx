@@ -1,17 +1,22 @@
-import { useState } from 'react'
+import { useState, useEffect } from 'react'
 import api from '../utils/api'
-import { FileText, Loader, TrendingUp, TrendingDown, AlertTriangle, CheckCircle, Info } from 'lucide-react'
+import { FileText, Loader, TrendingUp, TrendingDown, AlertTriangle, CheckCircle, Info, RefreshCw } from 'lucide-react'
 
 export default function SummaryPage() {
   const [summary, setSummary] = useState(null)
   const [loading, setLoading] = useState(false)
   const [error, setError] = useState('')
 
-  const generateSummary = async () => {
+  // Show the last stored summary right away; 404 just means none yet.
+  useEffect(() => {
+    api.get('/summary/').then(res => setSummary(res.data)).catch(() => {})
+  }, [])
+
+  const generateSummary = async (force = false) => {
     setLoading(true)
     setError('')
     try {
-      const res = await api.post('/summary/generate')
+      const res = await api.post('/summary/generate', null, { params: { force } })
       setSummary(res.data)
     } catch (e) {
       setError(e.response?.data?.detail || 'Failed to generate summary')
@@ -32,9 +37,16 @@ export default function SummaryPage() {
           <p className="text-sm text-slate-300 font-medium">Generate AI Summary</p>
           <p className="text-xs text-slate-400 mt-0.5">Analyzes all your biomarker history and highlights key trends</p>
         </div>
-        <button onClick={generateSummary} disabled={loading} className="btn-primary flex items-center gap-2 shrink-0">
-          {loading ? <><Loader size={14} className="animate-spin" /> Generating…</> : <><FileText size={14} /> Generate</>}
-        </button>
+        <div className="flex items-center gap-2 shrink-0">
+          {summary && (
+            <button onClick={() => generateSummary(true)} disabled={loading} title="Rebuild from the full history" className="text-slate-400 hover:text-white disabled:opacity-50 p-2">
+              <RefreshCw size={14} />
+            </button>
+          )}
+          <button onClick={() => generateSummary()} disabled={loading} className="btn-primary flex items-center gap-2">
+            {loading ? <><Loader size={14} className="animate-spin" /> Generating…</> : <><FileText size={14} /> Generate</>}
+          </button>
+        </div>
       </div>
 
       {error && (
@@ -45,6 +57,12 @@ export default function SummaryPage() {
 
       {summary && (
         <div className="space-y-4">
+          {summary.generated_at && (
+            <p className="text-xs text-slate-500">
+              Generated {new Date(summary.generated_at + 'Z').toLocaleString()}
+              {summary.cached ? ' · no new data since' : summary.mode === 'incremental' ? ' · updated with new readings' : ''}
+            </p>
+          )}
           {/* Overall */}
           {summary.overall_assessment && (
             <div className="card border-brand-500/30 bg-brand-500/5">
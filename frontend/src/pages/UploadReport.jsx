@@ -29,9 +29,17 @@ export default function UploadReport() {
       const res = await api.post('/reports/upload', fd, {
         headers: { 'Content-Type': 'multipart/form-data' },
       })
-      setMessage({ type: 'success', text: `Uploaded! ${res.data.biomarkers_extracted} biomarkers extracted.` })
       setFile(null)
       loadReports()
+      setMessage({ type: 'success', text: 'Uploaded! Extracting biomarkers…' })
+      // Re-uploads of an already processed PDF complete immediately without a job.
+      const job = res.data.job_id ? await waitForJob(res.data.job_id) : { status: 'done', result: res.data }
+      if (job.status === 'done') {
+        setMessage({ type: 'success', text: `Uploaded! ${job.result?.biomarkers_extracted ?? 0} biomarkers extracted.` })
+      } else {
+        setMessage({ type: 'error', text: job.error || 'Biomarker extraction failed' })
+      }
+      loadReports()
     } catch (e) {
       setMessage({ type: 'error', text: e.response?.data?.detail || 'Upload failed' })
     } finally {
@@ -39,6 +47,15 @@ export default function UploadReport() {
     }
   }
 
+  // Ingestion runs in the background; poll the job until it settles.
+  const waitForJob = async (jobId) => {
+    while (true) {
+      const { data } = await api.get(`/reports/jobs/${jobId}`)
+      if (data.status === 'done' || data.status === 'failed') return data
+      await new Promise(r => setTimeout(r, 1500))
+    }
+  }
+
   const handleDelete = async (id) => {
     try {
       await api.delete(`/reports/${id}`)